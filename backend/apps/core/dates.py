@@ -0,0 +1,37 @@
+"""
+Date helpers for sargable timestamp filters
+
+Filtering `created_at__date=day` casts every row's timestamp to a date in
+the database, so the created_at indexes cannot be used. These helpers turn
+calendar days (in TIME_ZONE) into half-open timestamp ranges instead:
+
+    start, end = day_range()
+    Order.objects.filter(created_at__gte=start, created_at__lt=end)
+"""
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+
+
+def start_of_day(day):
+    """Local midnight of a date as an aware datetime"""
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def day_range(day=None):
+    """
+    [start, end) of one local calendar day
+    Args: day: date (default: today in TIME_ZONE)
+    """
+    day = day or timezone.localdate()
+    return start_of_day(day), start_of_day(day + timedelta(days=1))
+
+
+def date_span_range(start_date=None, end_date=None):
+    """
+    [start, end) covering whole local days from start_date to end_date inclusive
+    Either bound may be None (open range)
+    """
+    start = start_of_day(start_date) if start_date else None
+    end = start_of_day(end_date + timedelta(days=1)) if end_date else None
+    return start, end
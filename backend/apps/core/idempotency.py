@@ -0,0 +1,271 @@
+"""
+Idempotency keys for retried POST requests
+
+Kiosks on flaky networks resend requests they never got an answer for.
+A client sends the same `Idempotency-Key` header on every retry; the first
+request runs normally and its 2xx response is stored in Redis, retries get
+the stored response back without running the view again.
+
+Keys are scoped per endpoint and per device (X-Device-ID header or
+device_id in the body), so two kiosks can never collide on a key.
+
+The in-flight lock is kept alive while the request runs (every third of
+IDEMPOTENCY_LOCK_TTL), so a slow checkout cannot lose its lock to a retry
+that would then run it a second time. The TTL only bounds how long a key
+stays locked after its worker died.
+"""
+import hashlib
+import json
+import logging
+import threading
+import uuid
+from functools import wraps
+
+from django.conf import settings
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'pos:idem'
+METRICS_KEY = f'{KEY_PREFIX}:metrics'
+MAX_KEY_LENGTH = 255
+
+STATE_IN_FLIGHT = 'in_flight'
+STATE_COMPLETED = 'completed'
+
+# Extend / drop the in-flight lock only while this request still holds it
+EXTEND_LOCK_LUA = """
+    if redis.call('GET', KEYS[1]) == ARGV[1] then
+        return redis.call('EXPIRE', KEYS[1], ARGV[2])
+    end
+    return 0
+"""
+RELEASE_LOCK_LUA = """
+    if redis.call('GET', KEYS[1]) == ARGV[1] then
+        return redis.call('DEL', KEYS[1])
+    end
+    return 0
+"""
+
+# begin() result -> metrics counter
+METRIC_OUTCOMES = {
+    'new': 'processed',
+    'replay': 'replayed',
+    'in_flight': 'in_flight',
+    'mismatch': 'mismatch',
+}
+
+
+def _redis():
+    return get_redis_connection('default')
+
+
+def _fingerprint(data):
+    """Hash of the request body, used to reject a key reused for another payload"""
+    payload = json.dumps(data, cls=JSONEncoder, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def record_metric(scope, outcome):
+    """Count an idempotency outcome (processed, replayed, in_flight, mismatch, unavailable)"""
+    try:
+        _redis().hincrby(METRICS_KEY, f'{scope}:{outcome}', 1)
+    except RedisError:
+        pass
+
+
+def get_metrics():
+    """
+    Get idempotency counters grouped by endpoint scope
+    Returns: {'checkout': {'processed': 120, 'replayed': 7, ..., 'replay_rate': 0.0551}, ...}
+    """
+    raw = _redis().hgetall(METRICS_KEY)
+    metrics = {}
+    for field, count in raw.items():
+        scope, outcome = field.decode().rsplit(':', 1)
+        metrics.setdefault(scope, {})[outcome] = int(count)
+    for counters in metrics.values():
+        handled = counters.get('processed', 0) + counters.get('replayed', 0)
+        counters['replay_rate'] = round(counters.get('replayed', 0) / handled, 4) if handled else 0.0
+    return metrics
+
+
+class IdempotencyStore:
+    """
+    Redis-backed store for in-flight locks and completed responses
+
+    One key per (scope, device, idempotency key) holding JSON:
+        {"state": "in_flight", "fingerprint": ...}
+        {"state": "completed", "fingerprint": ..., "status": 201, "body": ...}
+    """
+
+    def __init__(self, scope):
+        self.scope = scope
+        self.ttl = getattr(settings, 'IDEMPOTENCY_KEY_TTL', 60 * 60 * 24)
+        self.lock_ttl = getattr(settings, 'IDEMPOTENCY_LOCK_TTL', 30)
+        self.lock = None  # Value of the in-flight lock this store took
+
+    def _key(self, device_id, key):
+        return f'{KEY_PREFIX}:{self.scope}:{device_id}:{key}'
+
+    def begin(self, device_id, key, fingerprint):
+        """
+        Claim a key for a new request
+        Returns: (state, record) where state is 'new', 'replay', 'in_flight' or 'mismatch'
+        """
+        redis_key = self._key(device_id, key)
+        lock = json.dumps({'state': STATE_IN_FLIGHT, 'fingerprint': fingerprint, 'owner': uuid.uuid4().hex})
+        conn = _redis()
+
+        if conn.set(redis_key, lock, nx=True, ex=self.lock_ttl):
+            self.lock = lock
+            return 'new', None
+
+        raw = conn.get(redis_key)
+        if raw is None:
+            # Lock expired between SET and GET; the original is still settling
+            return 'in_flight', None
+
+        record = json.loads(raw)
+        if record.get('fingerprint') != fingerprint:
+            return 'mismatch', record
+        if record.get('state') == STATE_COMPLETED:
+            return 'replay', record
+        return 'in_flight', record
+
+    def complete(self, device_id, key, fingerprint, status_code, body):
+        """Store the final response so retries can replay it"""
+        record = json.dumps({
+            'state': STATE_COMPLETED,
+            'fingerprint': fingerprint,
+            'status': status_code,
+            'body': body,
+        }, cls=JSONEncoder)
+        _redis().set(self._key(device_id, key), record, ex=self.ttl)
+
+    def extend(self, device_id, key):
+        """Push back the expiry of this request's in-flight lock"""
+        conn = _redis()
+        conn.eval(EXTEND_LOCK_LUA, 1, self._key(device_id, key), self.lock, self.lock_ttl)
+
+    def release(self, device_id, key):
+        """Drop this request's in-flight lock so the client can retry (request failed)"""
+        conn = _redis()
+        conn.eval(RELEASE_LOCK_LUA, 1, self._key(device_id, key), self.lock)
+
+
+class _LockKeeper(threading.Thread):
+    """Extends a request's in-flight lock until stopped"""
+
+    def __init__(self, store, device_id, key):
+        super().__init__(name=f'idempotency-lock-{store.scope}', daemon=True)
+        self.store = store
+        self.device_id = device_id
+        self.key = key
+        self.interval = max(store.lock_ttl / 3, 1)
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.store.extend(self.device_id, self.key)
+            except RedisError as e:
+                logger.warning(f"Could not extend idempotency lock for key {self.key}: {e}")
+
+    def stop(self):
+        self._stopped.set()
+
+
+def _device_id(request):
+    device_id = request.headers.get('X-Device-ID')
+    if not device_id and hasattr(request.data, 'get'):
+        device_id = request.data.get('device_id')
+    return device_id or 'anonymous'
+
+
+def idempotent(scope):
+    """
+    Decorator for ViewSet methods that create resources
+
+    Usage:
+        @idempotent('checkout')
+        def checkout(self, request): ...
+
+    Requests without an Idempotency-Key header run unchanged. If Redis is
+    unavailable the request also runs unchanged (fail open).
+    """
+    def decorator(view_method):
+        @wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            key = request.headers.get('Idempotency-Key')
+            if not key:
+                return view_method(self, request, *args, **kwargs)
+
+            if len(key) > MAX_KEY_LENGTH:
+                return Response(
+                    {'error': f'Idempotency-Key must be at most {MAX_KEY_LENGTH} characters'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            store = IdempotencyStore(scope)
+            device_id = _device_id(request)
+            fingerprint = _fingerprint(request.data)
+
+            try:
+                state, record = store.begin(device_id, key, fingerprint)
+            except RedisError as e:
+                logger.warning(f"Idempotency store unavailable, processing without key: {e}")
+                record_metric(scope, 'unavailable')
+                return view_method(self, request, *args, **kwargs)
+
+            record_metric(scope, METRIC_OUTCOMES[state])
+
+            if state == 'replay':
+                logger.info(f"Replaying {scope} response for device {device_id} key {key}")
+                response = Response(record['body'], status=record['status'])
+                response['Idempotent-Replayed'] = 'true'
+                return response
+
+            if state == 'in_flight':
+                response = Response(
+                    {'error': 'A request with this Idempotency-Key is still being processed'},
+                    status=status.HTTP_409_CONFLICT
+                )
+                response['Retry-After'] = '1'
+                return response
+
+            if state == 'mismatch':
+                return Response(
+                    {'error': 'Idempotency-Key was already used with a different request body'},
+                    status=status.HTTP_422_UNPROCESSABLE_ENTITY
+                )
+
+            keeper = _LockKeeper(store, device_id, key)
+            keeper.start()
+            try:
+                response = view_method(self, request, *args, **kwargs)
+            except Exception:
+                try:
+                    store.release(device_id, key)
+                except RedisError:
+                    pass
+                raise
+            finally:
+                keeper.stop()
+
+            try:
+                if status.is_success(response.status_code):
+                    store.complete(device_id, key, fingerprint, response.status_code, response.data)
+                else:
+                    # Errors are not stored; the client may fix the request and retry
+                    store.release(device_id, key)
+            except RedisError as e:
+                logger.warning(f"Failed to store idempotent response for key {key}: {e}")
+
+            return response
+        return wrapper
+    return decorator
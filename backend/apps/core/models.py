@@ -4,7 +4,9 @@ Base models for multi-tenant architecture
 Provides base model classes and managers that automatically filter
 queries by the current tenant.
 """
-from django.db import models
+import copy
+
+from django.db import DatabaseError, models
 from django.core.exceptions import ValidationError
 from apps.core.context import get_current_tenant
 
@@ -169,3 +171,132 @@ class TenantTimestampedModel(TenantModel, TimestampedModel):
     
     class Meta:
         abstract = True
+
+
+class TrackedFieldsModel(models.Model):
+    """
+    Abstract base model that remembers the values loaded from the database
+
+    Provides:
+    - changed_fields: names of concrete fields modified since load/save
+    - previous_value(name): value the field had when loaded
+    - save() without update_fields writes only the changed columns
+      (plus auto_now timestamps) instead of every column; fields set by
+      pre_save handlers count, and a row that no longer exists is
+      inserted again as with a plain save
+
+    Tracking starts when a row is loaded (from_db) or saved. Instances
+    written with bulk_create can opt in by calling snapshot_fields().
+    Untracked instances save every column, as plain models do.
+    """
+    
+    class Meta:
+        abstract = True
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.snapshot_fields()
+        return instance
+    
+    def _tracked_value(self, field):
+        value = self.__dict__[field.attname]
+        # JSON fields hold dicts/lists that can be mutated in place
+        if isinstance(value, (dict, list)):
+            return copy.deepcopy(value)
+        return value
+    
+    def snapshot_fields(self, fields=None):
+        """
+        Mark the current values as clean
+        Args: fields: Optional iterable of field names (default: all loaded fields)
+        """
+        if fields is None or not self.is_tracked:
+            self._loaded_values = {}
+        
+        names = set(fields) if fields is not None else None
+        for field in self._meta.concrete_fields:
+            if names is not None and field.name not in names and field.attname not in names:
+                continue
+            if field.attname in self.__dict__:  # Skip deferred fields
+                self._loaded_values[field.attname] = self._tracked_value(field)
+    
+    @property
+    def is_tracked(self):
+        return hasattr(self, '_loaded_values')
+    
+    @property
+    def changed_fields(self):
+        """
+        Names of concrete fields whose value differs from the loaded one
+        Returns: set of field names (empty for untracked instances)
+        """
+        if not self.is_tracked:
+            return set()
+        
+        changed = set()
+        for field in self._meta.concrete_fields:
+            if field.attname not in self.__dict__:
+                continue
+            if field.attname not in self._loaded_values:
+                # Deferred at load time and assigned since
+                changed.add(field.name)
+            elif self.__dict__[field.attname] != self._loaded_values[field.attname]:
+                changed.add(field.name)
+        return changed
+    
+    def has_changed(self, name):
+        return name in self.changed_fields
+    
+    def previous_value(self, name):
+        """
+        Value of a field when it was loaded/saved (None if unknown)
+        Accepts the field name or its attname (e.g. 'outlet' or 'outlet_id')
+        """
+        if not self.is_tracked:
+            return None
+        return self._loaded_values.get(self._meta.get_field(name).attname)
+    
+    def save(self, *args, **kwargs):
+        """
+        Write only the changed columns of tracked rows when the caller did
+        not pass update_fields (worked out in _save_table, after pre_save
+        handlers and subclass save() overrides had their say)
+        """
+        self._partial_save = (
+            not args
+            and self.is_tracked
+            and not self._state.adding
+            and kwargs.get('update_fields') is None
+            and not kwargs.get('force_insert')
+            and not kwargs.get('force_update')
+        )
+        try:
+            super().save(*args, **kwargs)
+        finally:
+            self._partial_save = False
+        
+        update_fields = kwargs.get('update_fields')
+        self.snapshot_fields(update_fields)
+    
+    def _save_table(self, raw=False, cls=None, force_insert=False, force_update=False, using=None, update_fields=None):
+        if getattr(self, '_partial_save', False) and update_fields is None and not raw:
+            changed = self.changed_fields | {
+                field.name for field in self._meta.concrete_fields
+                if getattr(field, 'auto_now', False)
+            }
+            if changed:
+                try:
+                    return super()._save_table(
+                        raw, cls, force_insert, force_update, using, update_fields=changed
+                    )
+                except DatabaseError as e:
+                    if 'did not affect any rows' not in str(e):
+                        raise
+                    # Row is gone: save the whole row, which inserts it again
+                    # like a plain model save would
+        return super()._save_table(raw, cls, force_insert, force_update, using, update_fields)
+    
+    def refresh_from_db(self, using=None, fields=None):
+        super().refresh_from_db(using=using, fields=fields)
+        self.snapshot_fields(fields)
@@ -0,0 +1,60 @@
+"""
+Work collected during a transaction and run once after it commits
+
+Signal handlers that refresh read models (kitchen board, wait times,
+tracking, print jobs) would otherwise register one on_commit callback per
+saved row. collect_on_commit() gathers their ids into a batch registered
+as a single on_commit callback per atomic block:
+
+    collect_on_commit(refresh_orders, [order.id])
+
+The batch lives in Django's own on_commit queue. When an atomic block
+rolls back, Django drops the block's callbacks, and with them the ids
+collected in it; the next block starts a new batch. Outside a transaction
+the callback runs right away.
+"""
+from django.db import transaction
+
+
+class _Batch:
+    """on_commit callback holding the values collected in one atomic block"""
+
+    def __init__(self, callback, values):
+        self.callback = callback
+        self.values = values
+
+    def add(self, values):
+        if isinstance(self.values, set):
+            self.values.update(values)
+        else:
+            self.values.extend(values)
+
+    def __call__(self):
+        self.callback(self.values)
+
+
+def _open_batch(connection, callback):
+    """Batch of `callback` registered in the current atomic block (not an outer one)"""
+    savepoints = set(connection.savepoint_ids)
+    for savepoint_ids, func, _ in connection.run_on_commit:
+        if isinstance(func, _Batch) and func.callback is callback and savepoint_ids == savepoints:
+            return func
+    return None
+
+
+def collect_on_commit(callback, values, ordered=False, using=None):
+    """
+    Add values to the current atomic block's batch for `callback`, which is
+    called with all of them (a set, or a list in order when `ordered`) once
+    the transaction commits. Empty batches are not registered.
+    """
+    values = list(values)
+    if not values:
+        return
+    connection = transaction.get_connection(using)
+    batch = _open_batch(connection, callback) if connection.in_atomic_block else None
+    if batch is not None:
+        batch.add(values)
+        return
+    batch = _Batch(callback, list(values) if ordered else set(values))
+    transaction.on_commit(batch, using=using)
@@ -2,7 +2,8 @@
 Admin configuration for Order models
 """
 from django.contrib import admin
-from .models import Order, OrderItem
+from django.utils import timezone
+from .models import Order, OrderItem, OrderOutboxEvent, OrderStatusEvent, PrintJob
 
 
 class OrderItemInline(admin.TabularInline):
@@ -44,3 +45,53 @@ class OrderItemAdmin(admin.ModelAdmin):
     list_display = ('order', 'product', 'quantity', 'unit_price', 'total_price')
     list_filter = ('order__status', 'product')
     search_fields = ('order__order_number', 'product__name')
+
+
+@admin.register(OrderStatusEvent)
+class OrderStatusEventAdmin(admin.ModelAdmin):
+    list_display = ('order', 'outlet', 'from_status', 'to_status', 'at')
+    list_filter = ('to_status', 'outlet')
+    search_fields = ('order__order_number',)
+    list_select_related = ('order', 'outlet')
+    raw_id_fields = ('order',)
+    
+    # Append-only log
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(OrderOutboxEvent)
+class OrderOutboxEventAdmin(admin.ModelAdmin):
+    list_display = ('id', 'event_type', 'order_id', 'outlet_id', 'status', 'attempts', 'next_attempt_at', 'created_at')
+    list_filter = ('status', 'event_type')
+    search_fields = ('order_id',)
+    readonly_fields = ('created_at', 'delivered_at', 'last_error')
+    actions = ['requeue_events']
+    
+    @admin.action(description='Requeue selected events for delivery')
+    def requeue_events(self, request, queryset):
+        updated = queryset.exclude(status='delivered').update(
+            status='pending', attempts=0, next_attempt_at=timezone.now()
+        )
+        self.message_user(request, f'{updated} event(s) requeued')
+
+
+@admin.register(PrintJob)
+class PrintJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'order', 'outlet', 'station', 'status', 'attempts', 'leased_by', 'created_at', 'printed_at')
+    list_filter = ('status', 'station')
+    search_fields = ('order__order_number',)
+    raw_id_fields = ('order', 'reprint_of')
+    exclude = ('content',)
+    readonly_fields = ('created_at', 'printed_at', 'last_error', 'lease_token')
+    actions = ['requeue_jobs']
+    
+    @admin.action(description='Requeue selected tickets for printing')
+    def requeue_jobs(self, request, queryset):
+        updated = queryset.exclude(status='printed').update(
+            status='pending', attempts=0, lease_token='', available_at=timezone.now()
+        )
+        self.message_user(request, f'{updated} ticket(s) requeued')
@@ -0,0 +1,37 @@
+"""
+Database aggregates used by order statistics
+"""
+from django.db.models import Aggregate, DurationField, ExpressionWrapper, F
+
+
+class PercentileCont(Aggregate):
+    """
+    Continuous percentile (PostgreSQL ordered-set aggregate)
+
+    Usage:
+        Order.objects.aggregate(p90=PercentileCont(prep_time_expression(), 0.9))
+
+    Works on numeric and interval expressions; the output field follows the
+    expression unless given.
+    """
+    function = 'PERCENTILE_CONT'
+    name = 'PercentileCont'
+    template = '%(function)s(%(percentile)s) WITHIN GROUP (ORDER BY %(expressions)s)'
+    allow_distinct = False
+
+    def __init__(self, expression, percentile, **extra):
+        if not 0 <= percentile <= 1:
+            raise ValueError('percentile must be between 0 and 1')
+        super().__init__(expression, percentile=float(percentile), **extra)
+
+
+def prep_time_expression():
+    """completed_at - created_at as an interval"""
+    return ExpressionWrapper(F('completed_at') - F('created_at'), output_field=DurationField())
+
+
+def duration_minutes(value):
+    """timedelta (or None) -> minutes rounded to 2 decimals"""
+    if value is None:
+        return 0.0
+    return round(value.total_seconds() / 60, 2)
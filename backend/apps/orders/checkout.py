@@ -0,0 +1,174 @@
+"""
+Bulk checkout pipeline
+
+Builds every order, item and payment of a cart in memory and writes them
+with bulk_create, so a checkout costs a fixed number of queries no matter
+how many lines or tenants the cart has:
+
+    1 x SELECT products (+ tenant, category)
+    1 x INSERT orders
+    1 x INSERT order_items
+    1 x INSERT payments
+"""
+from decimal import Decimal
+
+from rest_framework import serializers
+
+from apps.orders.models import Order, OrderItem
+from apps.orders.numbering import (
+    allocate_order_numbers, allocate_queue_number, allocate_transaction_ids
+)
+from apps.orders import wait_times
+from apps.orders.pressure import check_available
+from apps.orders.routing import route_items
+from apps.orders.signals import notify_orders_created
+from apps.payments.models import Payment
+from apps.products.models import Product
+
+
+def load_cart_products(product_ids):
+    """
+    Fetch cart products with tenant and category in one query
+    Returns: dict of product_id -> Product
+    """
+    products = Product.all_objects.select_related('tenant', 'category').filter(
+        id__in=set(product_ids)
+    )
+    return {product.id: product for product in products}
+
+
+def _cache_items(order, items):
+    """
+    Prime order.items with the in-memory rows, the same way prefetch_related
+    does, so serializing the response does not query again
+    """
+    queryset = OrderItem.objects.filter(order=order)
+    queryset._result_cache = items
+    queryset._prefetch_done = True
+    order._prefetched_objects_cache = {'items': queryset}
+
+
+def create_checkout_orders(items_data, outlet, payment_method, products=None,
+                           customer_name='', customer_phone='', table_number='',
+                           notes='', source='web', device_id=None):
+    """
+    Create one order per tenant for a cart, with items and a payment each
+    Returns: list of (order, payment) tuples
+
+    Args:
+        items_data: Validated cart lines (product_id, quantity, modifiers, notes)
+        outlet: Outlet instance
+        payment_method: Payment method; cash is settled immediately
+        products: Optional dict from load_cart_products (skips the product query)
+        source: Order source ('kiosk', 'web', 'cashier')
+        device_id: Device identifier (optional)
+    """
+    if products is None:
+        products = load_cart_products(item['product_id'] for item in items_data)
+
+    is_cash = payment_method == 'cash'
+
+    # Group lines by tenant, building items in memory
+    tenant_orders = {}
+    tenant_items = {}
+
+    for item_data in items_data:
+        product_id = item_data['product_id']
+
+        # Check if product exists
+        if product_id not in products:
+            raise serializers.ValidationError(f"Product with ID {product_id} not found")
+
+        product = products[product_id]
+        tenant_id = product.tenant_id
+
+        # Check if product has tenant
+        if not tenant_id:
+            raise serializers.ValidationError(f"Product '{product.name}' (ID: {product_id}) does not have a tenant assigned")
+
+        if tenant_id not in tenant_orders:
+            tenant_orders[tenant_id] = Order(
+                tenant=product.tenant,
+                outlet=outlet,
+                customer_name=customer_name,
+                customer_phone=customer_phone,
+                table_number=table_number,
+                notes=notes,
+                status='pending',  # Keep pending for kitchen display
+                payment_status='paid' if is_cash else 'unpaid',
+                source=source,
+                device_id=device_id
+            )
+            tenant_items[tenant_id] = []
+
+        modifiers = item_data.get('modifiers', [])
+        item = OrderItem(
+            product=product,
+            product_name=product.name,
+            product_sku=product.sku,
+            quantity=item_data['quantity'],
+            unit_price=product.price,
+            modifiers=modifiers,
+            modifiers_price=sum(Decimal(str(m.get('price', 0))) for m in modifiers),
+            notes=item_data.get('notes', ''),
+            kitchen_station_code=product.kitchen_station_code  # Station type; routed below
+        )
+        item.calculate_total_price()
+        tenant_items[tenant_id].append(item)
+
+    # Check if we have any items
+    if not tenant_orders:
+        raise serializers.ValidationError("No valid items to checkout")
+
+    # Stations past their pause limit take no new work
+    check_available(outlet.id, [item.product for items in tenant_items.values() for item in items])
+
+    # Spread items over duplicate stations by queue load
+    route_items(outlet.id, [item for items in tenant_items.values() for item in items])
+
+    # Calculate totals in memory; one queue number for the whole cart
+    orders = list(tenant_orders.values())
+    order_numbers = allocate_order_numbers(outlet.id, len(orders))
+    queue_number = allocate_queue_number(outlet_id=outlet.id)
+    for order, order_number in zip(orders, order_numbers):
+        order.order_number = order_number
+        order.queue_number = queue_number
+    for tenant_id, order in tenant_orders.items():
+        order.apply_totals(sum(item.total_price for item in tenant_items[tenant_id]))
+
+    Order.objects.bulk_create(orders)
+    wait_times.quote_orders(outlet.id, [
+        (order, tenant_items[tenant_id]) for tenant_id, order in tenant_orders.items()
+    ])
+
+    all_items = []
+    for tenant_id, order in tenant_orders.items():
+        items = tenant_items[tenant_id]
+        for item in items:
+            item.order = order
+        _cache_items(order, items)
+        all_items.extend(items)
+
+    OrderItem.objects.bulk_create(all_items)
+
+    transaction_ids = allocate_transaction_ids(outlet.id, len(orders))
+    payments = [
+        Payment(
+            order=order,
+            transaction_id=transaction_id,
+            payment_method=payment_method,
+            amount=order.total_amount,
+            status='success' if is_cash else 'pending'
+        )
+        for order, transaction_id in zip(orders, transaction_ids)
+    ]
+    Payment.objects.bulk_create(payments)
+
+    # bulk_create skips save(); start change tracking so later saves stay partial
+    for order, payment in zip(orders, payments):
+        order.snapshot_fields()
+        payment.snapshot_fields()
+
+    notify_orders_created(orders)
+
+    return list(zip(orders, payments))
@@ -0,0 +1,90 @@
+"""
+Minimal ESC/POS ticket builder for kitchen thermal printers
+
+Only the commands every ESC/POS printer understands are used: initialize,
+alignment, bold, character size, feed and cut. Text is reduced to ASCII
+(accents stripped) so it prints the same whatever code page is loaded.
+
+    ticket = Ticket(width=42)
+    ticket.align('center').size(2, 2).line('GRILL')
+    ticket.size().align('left').line('2x Nasi Goreng')
+    data = ticket.cut().render()
+"""
+import textwrap
+import unicodedata
+
+ESC = b'\x1b'
+GS = b'\x1d'
+
+INITIALIZE = ESC + b'@'
+ALIGNMENTS = {'left': 0, 'center': 1, 'right': 2}
+
+
+def _ascii(text):
+    normalized = unicodedata.normalize('NFKD', str(text))
+    return normalized.encode('ascii', 'ignore').replace(b'\t', b' ')
+
+
+class Ticket:
+    """ESC/POS byte buffer with a few layout helpers"""
+
+    def __init__(self, width=42):
+        self.width = width
+        self._scale = 1
+        self._buffer = bytearray(INITIALIZE)
+
+    @property
+    def columns(self):
+        """Characters per line at the current character width"""
+        return self.width // self._scale
+
+    def align(self, alignment='left'):
+        self._buffer += ESC + b'a' + bytes([ALIGNMENTS[alignment]])
+        return self
+
+    def bold(self, on=True):
+        self._buffer += ESC + b'E' + bytes([1 if on else 0])
+        return self
+
+    def size(self, width=1, height=1):
+        """Character magnification, 1-8 in each direction"""
+        self._buffer += GS + b'!' + bytes([((width - 1) << 4) | (height - 1)])
+        self._scale = width
+        return self
+
+    def line(self, text=''):
+        """Print text, wrapped to the paper width"""
+        for part in textwrap.wrap(str(text), self.columns) or ['']:
+            self._buffer += _ascii(part) + b'\n'
+        return self
+
+    def wrapped(self, text, indent='  '):
+        """Print text wrapped with a hanging indent"""
+        for part in textwrap.wrap(
+            str(text), self.columns, initial_indent=indent, subsequent_indent=indent
+        ):
+            self._buffer += _ascii(part) + b'\n'
+        return self
+
+    def pair(self, left, right):
+        """Left text and right-aligned text on one line"""
+        left, right = str(left), str(right)
+        space = max(self.columns - len(left) - len(right), 1)
+        self._buffer += _ascii(left + ' ' * space + right) + b'\n'
+        return self
+
+    def rule(self, char='-'):
+        self._buffer += _ascii(char * self.columns) + b'\n'
+        return self
+
+    def feed(self, lines=1):
+        self._buffer += ESC + b'd' + bytes([lines])
+        return self
+
+    def cut(self):
+        """Feed past the cutter and cut (partial cut where supported)"""
+        self._buffer += GS + b'V' + bytes([66, 3])
+        return self
+
+    def render(self):
+        return bytes(self._buffer)
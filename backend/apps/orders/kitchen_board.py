@@ -0,0 +1,424 @@
+"""
+Live kitchen board materialized in Redis
+
+Kitchen screens poll the same small set of open orders every few seconds.
+Instead of querying Postgres for it on every poll, the board is kept in
+Redis per scope (outlet, store, tenant):
+
+    pos:kboard:<scope>:<id>:<status>   ZSET order id -> created_at (epoch)
+    pos:kboard:<scope>:<id>:built      marker, set when the scope was rebuilt
+    pos:kboard:<scope>:<id>:version    bumped by every refresh (orders rebuilds against them)
+    pos:kboard:tickets                 HASH order id -> kitchen ticket JSON
+    pos:kboard:orders                  HASH order id -> order JSON (kitchen_display)
+    pos:kboard:<scope>:<id>:allday     HASH "<station>|<product>" -> outstanding quantity
+    pos:kboard:allday                  HASH order id -> that order's all-day counts (JSON)
+
+Orders are refreshed from the database after every commit that creates
+an order, saves it or moves its status (see signals.py). A scope is rebuilt
+from Postgres the first time it is read and again once its marker expires,
+which also heals anything written around the ORM (queryset.update()).
+
+The all-day counts (items still to cook per station, for expo screens) are
+kept incrementally: each refresh applies the difference between an order's
+new counts and the counts it contributed before, inside a WATCHed
+transaction so concurrent refreshes of one order cannot both apply it.
+Rebuilding a scope recomputes its counts outright.
+
+Readers return None when the board cannot be used (Redis down, rebuild in
+progress elsewhere); callers then fall back to the database.
+"""
+import json
+import logging
+import time
+
+from django.conf import settings
+from django.utils import timezone
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError, WatchError
+from rest_framework.utils.encoders import JSONEncoder
+
+from apps.core.transactions import collect_on_commit
+from apps.orders.models import Order
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'pos:kboard'
+TICKETS_KEY = f'{KEY_PREFIX}:tickets'
+ORDERS_KEY = f'{KEY_PREFIX}:orders'
+ALL_DAY_CONTRIB_KEY = f'{KEY_PREFIX}:allday'
+
+# Statuses shown on kitchen screens
+BOARD_STATUSES = ('pending', 'confirmed', 'preparing', 'ready')
+
+# Statuses whose items count as outstanding on the all-day view
+# (a subset of OPEN_STATUSES, so the open-order partial indexes apply)
+ALL_DAY_STATUSES = ('pending', 'preparing')
+
+# Scope name -> Order attribute holding its id
+SCOPES = {
+    'outlet': 'outlet_id',
+    'store': 'store_id',
+    'tenant': 'tenant_id',
+}
+
+KEY_TTL = 60 * 60 * 24  # Idle boards disappear after a day
+REBUILD_LOCK_TTL = 10
+REFRESH_ATTEMPTS = 5  # WATCH retries before leaving the counts to the next rebuild
+
+
+def _redis():
+    return get_redis_connection('default')
+
+
+def _status_key(scope, scope_id, status):
+    return f'{KEY_PREFIX}:{scope}:{scope_id}:{status}'
+
+
+def _built_key(scope, scope_id):
+    return f'{KEY_PREFIX}:{scope}:{scope_id}:built'
+
+
+def _lock_key(scope, scope_id):
+    return f'{KEY_PREFIX}:{scope}:{scope_id}:lock'
+
+
+def _version_key(scope, scope_id):
+    return f'{KEY_PREFIX}:{scope}:{scope_id}:version'
+
+
+def _all_day_key(scope, scope_id):
+    return f'{KEY_PREFIX}:{scope}:{scope_id}:allday'
+
+
+def all_day_field(station, product_name):
+    return f'{station}|{product_name}'
+
+
+def all_day_counts(order):
+    """Outstanding quantity per all-day field for one order (prefetched items)"""
+    counts = {}
+    if order.status in ALL_DAY_STATUSES:
+        for item in order.items.all():
+            if item.kitchen_status == 'done':
+                continue
+            field = all_day_field(item.kitchen_station_code, item.product_name)
+            counts[field] = counts.get(field, 0) + item.quantity
+    return counts
+
+
+def _board_queryset():
+    return Order.objects.select_related(
+        'tenant', 'outlet', 'store', 'order_group'
+    ).prefetch_related('items')
+
+
+def _serialize(orders):
+    """
+    Pre-serialize orders for both board representations
+    Returns: (tickets, order_rows) dicts of order id -> JSON string
+    """
+    from apps.orders.serializers import OrderSerializer
+    from apps.orders.serializers_kitchen import KitchenOrderSerializer
+
+    tickets = KitchenOrderSerializer(orders, many=True).data
+    order_rows = OrderSerializer(orders, many=True).data
+    return (
+        {row['id']: json.dumps(row, cls=JSONEncoder) for row in tickets},
+        {row['id']: json.dumps(row, cls=JSONEncoder) for row in order_rows},
+    )
+
+
+def _write_orders(pipe, orders, previous_counts=None):
+    """
+    Queue the commands that put each order where it belongs on the board
+
+    previous_counts: order id -> all-day counts it contributed so far; the
+    difference is applied to every scope's all-day hash. None skips that
+    (rebuild() writes the counts of its scope itself).
+    """
+    tickets, order_rows = _serialize([o for o in orders if o.status in BOARD_STATUSES])
+
+    for order in orders:
+        counts = all_day_counts(order)
+        if previous_counts is not None:
+            old = previous_counts.get(order.id, {})
+            delta = {
+                field: counts.get(field, 0) - old.get(field, 0)
+                for field in set(counts) | set(old)
+            }
+            delta = {field: value for field, value in delta.items() if value}
+            for scope, attr in SCOPES.items():
+                scope_id = getattr(order, attr)
+                if scope_id and delta:
+                    key = _all_day_key(scope, scope_id)
+                    for field, value in delta.items():
+                        pipe.hincrby(key, field, value)
+                    pipe.expire(key, KEY_TTL)
+        if counts:
+            pipe.hset(ALL_DAY_CONTRIB_KEY, order.id, json.dumps(counts))
+        else:
+            pipe.hdel(ALL_DAY_CONTRIB_KEY, order.id)
+
+        score = order.created_at.timestamp()
+        for scope, attr in SCOPES.items():
+            scope_id = getattr(order, attr)
+            if not scope_id:
+                continue
+            for status in BOARD_STATUSES:
+                key = _status_key(scope, scope_id, status)
+                if status == order.status:
+                    pipe.zadd(key, {order.id: score})
+                    pipe.expire(key, KEY_TTL)
+                else:
+                    pipe.zrem(key, order.id)
+
+        if order.status in BOARD_STATUSES:
+            pipe.hset(TICKETS_KEY, order.id, tickets[order.id])
+            pipe.hset(ORDERS_KEY, order.id, order_rows[order.id])
+        else:
+            pipe.hdel(TICKETS_KEY, order.id)
+            pipe.hdel(ORDERS_KEY, order.id)
+
+    pipe.expire(TICKETS_KEY, KEY_TTL)
+    pipe.expire(ORDERS_KEY, KEY_TTL)
+    pipe.expire(ALL_DAY_CONTRIB_KEY, KEY_TTL)
+
+
+def _bump_versions(pipe, orders):
+    """Mark the orders' scopes as written, so a rebuild in progress re-reads"""
+    for scope, attr in SCOPES.items():
+        for scope_id in {getattr(order, attr) for order in orders} - {None}:
+            pipe.incr(_version_key(scope, scope_id))
+            pipe.expire(_version_key(scope, scope_id), KEY_TTL)
+
+
+def _previous_counts(conn, order_ids):
+    if not order_ids:
+        return {}
+    raw = conn.hmget(ALL_DAY_CONTRIB_KEY, list(order_ids))
+    return {
+        order_id: json.loads(value)
+        for order_id, value in zip(order_ids, raw)
+        if value is not None
+    }
+
+
+# ============================================================================
+# Writes
+# ============================================================================
+
+def refresh_orders(order_ids):
+    """Re-read orders from the database and update their board entries"""
+    order_ids = set(order_ids)
+    if not order_ids:
+        return
+    orders = list(_board_queryset().filter(id__in=order_ids))
+    ids = [order.id for order in orders]
+    try:
+        with _redis().pipeline(transaction=True) as pipe:
+            for _ in range(REFRESH_ATTEMPTS):
+                try:
+                    pipe.watch(ALL_DAY_CONTRIB_KEY)
+                    previous = _previous_counts(pipe, ids)
+                    pipe.multi()
+                    _write_orders(pipe, orders, previous)
+                    _bump_versions(pipe, orders)
+                    pipe.execute()
+                    return
+                except WatchError:
+                    continue
+        logger.warning(f"Kitchen board refresh kept conflicting; orders {sorted(ids)} wait for the next rebuild")
+    except RedisError as e:
+        logger.warning(f"Kitchen board refresh failed: {e}")
+
+
+def remove_orders(orders):
+    """Drop deleted orders from the board"""
+    try:
+        conn = _redis()
+        previous = _previous_counts(conn, [order.id for order in orders])
+        pipe = conn.pipeline(transaction=False)
+        for order in orders:
+            for field, value in previous.get(order.id, {}).items():
+                for scope, attr in SCOPES.items():
+                    scope_id = getattr(order, attr)
+                    if scope_id:
+                        pipe.hincrby(_all_day_key(scope, scope_id), field, -value)
+            pipe.hdel(ALL_DAY_CONTRIB_KEY, order.id)
+            for scope, attr in SCOPES.items():
+                scope_id = getattr(order, attr)
+                if scope_id:
+                    for status in BOARD_STATUSES:
+                        pipe.zrem(_status_key(scope, scope_id, status), order.id)
+            pipe.hdel(TICKETS_KEY, order.id)
+            pipe.hdel(ORDERS_KEY, order.id)
+        _bump_versions(pipe, orders)
+        pipe.execute()
+    except RedisError as e:
+        logger.warning(f"Kitchen board removal failed: {e}")
+
+
+def schedule_refresh(order_ids):
+    """
+    Refresh orders on the board once the current transaction commits
+    Ids from the same atomic block are collected and refreshed together
+    """
+    collect_on_commit(refresh_orders, order_ids)
+
+
+def rebuild(scope, scope_id):
+    """
+    Rebuild a scope's board from Postgres
+    Returns: True if rebuilt, False if another process is already rebuilding
+    it (or refreshes kept landing while it read the database)
+
+    Refreshes bump the scope's version key. The rebuild WATCHes it before
+    reading the database, so a refresh written in between aborts the
+    rebuild's write (older state) and the rebuild reads again.
+    """
+    conn = _redis()
+    if not conn.set(_lock_key(scope, scope_id), 1, nx=True, ex=REBUILD_LOCK_TTL):
+        return False
+
+    try:
+        with conn.pipeline(transaction=True) as pipe:
+            for _ in range(REFRESH_ATTEMPTS):
+                try:
+                    pipe.watch(_version_key(scope, scope_id))
+                    orders = list(_board_queryset().filter(
+                        **{SCOPES[scope]: scope_id, 'status__in': BOARD_STATUSES}
+                    ))
+                    totals = {}
+                    for order in orders:
+                        for field, value in all_day_counts(order).items():
+                            totals[field] = totals.get(field, 0) + value
+
+                    pipe.multi()
+                    for status in BOARD_STATUSES:
+                        pipe.delete(_status_key(scope, scope_id, status))
+                    pipe.delete(_all_day_key(scope, scope_id))
+                    if totals:
+                        pipe.hset(_all_day_key(scope, scope_id), mapping=totals)
+                        pipe.expire(_all_day_key(scope, scope_id), KEY_TTL)
+                    _write_orders(pipe, orders)
+                    pipe.set(_built_key(scope, scope_id), int(time.time()), ex=settings.KITCHEN_BOARD_REBUILD_INTERVAL)
+                    pipe.execute()
+                    break
+                except WatchError:
+                    continue
+            else:
+                logger.warning(f"Kitchen board rebuild of {scope} {scope_id} kept conflicting with refreshes")
+                return False
+    finally:
+        conn.delete(_lock_key(scope, scope_id))
+
+    logger.info(f"🧾 Kitchen board rebuilt: {scope} {scope_id} ({len(orders)} open orders)")
+    return True
+
+
+# ============================================================================
+# Reads
+# ============================================================================
+
+def _ensure_built(conn, scope, scope_id):
+    """False when the scope is not built and cannot be rebuilt right now"""
+    return conn.exists(_built_key(scope, scope_id)) or rebuild(scope, scope_id)
+
+
+def wait_minutes(created_at_ts, now_ts):
+    return int((now_ts - created_at_ts) / 60)
+
+
+def read_board(scope, scope_id, statuses=BOARD_STATUSES, representation='kitchen'):
+    """
+    Read open orders of a scope from the board, oldest first
+
+    Args:
+        scope: 'outlet', 'store' or 'tenant'
+        scope_id: Id of the outlet/store/tenant
+        statuses: Statuses to include
+        representation: 'kitchen' (KitchenOrderSerializer) or 'order' (OrderSerializer)
+
+    Returns: list of dicts, or None if the board is unavailable
+    """
+    from apps.orders.serializers_kitchen import URGENT_AFTER_MINUTES
+
+    try:
+        scope_id = int(scope_id)
+    except (TypeError, ValueError):
+        return None
+
+    try:
+        conn = _redis()
+        if not _ensure_built(conn, scope, scope_id):
+            return None
+
+        pipe = conn.pipeline(transaction=False)
+        for status in statuses:
+            pipe.zrange(_status_key(scope, scope_id, status), 0, -1, withscores=True)
+        entries = sorted(
+            (score, int(order_id))
+            for members in pipe.execute()
+            for order_id, score in members
+        )
+        if not entries:
+            return []
+
+        hash_key = TICKETS_KEY if representation == 'kitchen' else ORDERS_KEY
+        raw = conn.hmget(hash_key, [order_id for _, order_id in entries])
+    except RedisError as e:
+        logger.warning(f"Kitchen board unavailable, reading from database: {e}")
+        return None
+
+    if any(value is None for value in raw):
+        # Entry lost (evicted or half-written); let the next read rebuild it
+        try:
+            conn.delete(_built_key(scope, scope_id))
+        except RedisError:
+            pass
+        return None
+
+    now_ts = timezone.now().timestamp()
+    rows = []
+    for (created_ts, _), value in zip(entries, raw):
+        row = json.loads(value)
+        if representation == 'kitchen':
+            # Time-dependent fields are computed at read time
+            row['wait_time'] = wait_minutes(created_ts, now_ts)
+            row['is_urgent'] = row['wait_time'] > URGENT_AFTER_MINUTES
+        rows.append(row)
+    return rows
+
+
+def read_all_day(scope, scope_id, station=None):
+    """
+    Outstanding item quantities of a scope, per station and product
+
+    Returns: list of {'station', 'product_name', 'quantity'} sorted by
+    station then quantity (largest first), or None if the board is unavailable
+    """
+    try:
+        scope_id = int(scope_id)
+    except (TypeError, ValueError):
+        return None
+
+    try:
+        conn = _redis()
+        if not _ensure_built(conn, scope, scope_id):
+            return None
+        raw = conn.hgetall(_all_day_key(scope, scope_id))
+    except RedisError as e:
+        logger.warning(f"Kitchen board unavailable, reading all-day counts from database: {e}")
+        return None
+
+    rows = []
+    for field, quantity in raw.items():
+        quantity = int(quantity)
+        if quantity <= 0:
+            continue  # Fully cooked items linger as zero until the next rebuild
+        item_station, product_name = field.decode().split('|', 1)
+        if station and item_station != station:
+            continue
+        rows.append({'station': item_station, 'product_name': product_name, 'quantity': quantity})
+    rows.sort(key=lambda row: (row['station'], -row['quantity'], row['product_name']))
+    return rows
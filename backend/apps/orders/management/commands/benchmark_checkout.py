@@ -0,0 +1,179 @@
+"""
+Management command to compare the bulk checkout pipeline with the legacy
+per-row checkout path (query count and latency)
+Usage: python manage.py benchmark_checkout --lines 10 --tenants 3 --runs 20
+
+Every run happens inside a transaction that is rolled back, so the command
+is safe to run against a database with real data.
+"""
+import statistics
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from apps.orders.checkout import create_checkout_orders, load_cart_products
+from apps.orders.models import Order, OrderItem
+from apps.payments.models import Payment
+from apps.products.models import Product
+from apps.tenants.models import Tenant, Outlet
+
+
+def legacy_create_orders(items_data, outlet, payment_method):
+    """
+    The checkout path before the bulk pipeline: one Tenant lookup per tenant,
+    one INSERT per line, calculate_totals() re-reading items and saving the
+    order again, then the view saving every payment and order once more
+    """
+    product_ids = [item['product_id'] for item in items_data]
+    all_products = Product.all_objects.filter(id__in=set(product_ids))
+    available_products = all_products.filter(is_available=True)
+    all_products.count()
+    available_products.count()
+
+    products = {p.id: p for p in Product.all_objects.filter(id__in=product_ids)}
+    tenant_items = {}
+    for item_data in items_data:
+        product = products[item_data['product_id']]
+        tenant_items.setdefault(product.tenant_id, []).append((product, item_data))
+
+    orders_and_payments = []
+    for tenant_id, items in tenant_items.items():
+        tenant = Tenant.objects.get(id=tenant_id)
+        order = Order.objects.create(
+            tenant=tenant, outlet=outlet, status='pending',
+            payment_status='unpaid', source='kiosk'
+        )
+        for product, item_data in items:
+            OrderItem.objects.create(
+                order=order,
+                product=product,
+                product_name=product.name,
+                product_sku=product.sku,
+                quantity=item_data['quantity'],
+                unit_price=product.price,
+                modifiers=[],
+                modifiers_price=Decimal('0'),
+                kitchen_station_code=product.kitchen_station_code
+            )
+        order.calculate_totals()
+        payment = Payment.objects.create(
+            order=order, payment_method=payment_method,
+            amount=order.total_amount, status='pending'
+        )
+        orders_and_payments.append((order, payment))
+
+    if payment_method == 'cash':
+        for order, payment in orders_and_payments:
+            payment.status = 'success'
+            payment.save()
+        for order, payment in orders_and_payments:
+            order.payment_status = 'paid'
+            order.save()
+
+    return orders_and_payments
+
+
+def bulk_create_orders(items_data, outlet, payment_method):
+    """The bulk pipeline, including the single validation query"""
+    products = load_cart_products(item['product_id'] for item in items_data)
+    return create_checkout_orders(
+        items_data, outlet, payment_method, products=products, source='kiosk'
+    )
+
+
+class Command(BaseCommand):
+    help = 'Compare query count and latency of the bulk checkout pipeline against the legacy path'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lines', type=int, default=10, help='Cart lines per checkout')
+        parser.add_argument('--tenants', type=int, default=3, help='Tenants spread across the cart')
+        parser.add_argument('--runs', type=int, default=20, help='Checkouts per path')
+        parser.add_argument('--payment-method', default='cash')
+
+    def handle(self, *args, **options):
+        outlet = Outlet.objects.filter(is_active=True).first()
+        if not outlet:
+            raise CommandError('No active outlet found. Seed data first.')
+
+        items_data = self._build_cart(options['lines'], options['tenants'])
+        tenant_count = len(set(
+            Product.all_objects.filter(id__in=[i['product_id'] for i in items_data])
+            .values_list('tenant_id', flat=True)
+        ))
+
+        self.stdout.write(
+            f"🛒 Cart: {len(items_data)} lines across {tenant_count} tenant(s), "
+            f"{options['runs']} runs per path"
+        )
+
+        paths = [
+            ('legacy', legacy_create_orders),
+            ('bulk', bulk_create_orders),
+        ]
+        results = {}
+        for name, create in paths:
+            results[name] = self._measure(create, items_data, outlet, options)
+
+        for name, (queries, timings) in results.items():
+            self.stdout.write(
+                f"  {name:<7} queries={queries:<4} "
+                f"median={statistics.median(timings):7.2f}ms "
+                f"p90={self._p90(timings):7.2f}ms"
+            )
+
+        legacy_queries, legacy_timings = results['legacy']
+        bulk_queries, bulk_timings = results['bulk']
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ {legacy_queries - bulk_queries} fewer queries per checkout, "
+            f"{statistics.median(legacy_timings) / statistics.median(bulk_timings):.1f}x faster (median)"
+        ))
+
+    def _build_cart(self, lines, tenants):
+        tenant_ids = list(
+            Product.all_objects.filter(is_active=True, is_available=True)
+            .order_by('tenant_id').values_list('tenant_id', flat=True).distinct()[:tenants]
+        )
+        products = list(
+            Product.all_objects.filter(tenant_id__in=tenant_ids, is_active=True, is_available=True)
+            .order_by('tenant_id', 'id')
+        )
+        if not products:
+            raise CommandError('No available products found. Seed data first.')
+
+        # Round-robin across tenants so every tenant gets an order
+        by_tenant = {}
+        for product in products:
+            by_tenant.setdefault(product.tenant_id, []).append(product)
+        pools = list(by_tenant.values())
+
+        cart = []
+        for i in range(lines):
+            pool = pools[i % len(pools)]
+            cart.append({
+                'product_id': pool[(i // len(pools)) % len(pool)].id,
+                'quantity': 1 + i % 3,
+                'modifiers': [],
+                'notes': '',
+            })
+        return cart
+
+    def _measure(self, create, items_data, outlet, options):
+        timings = []
+        queries = 0
+        for _ in range(options['runs']):
+            with transaction.atomic():
+                with CaptureQueriesContext(connection) as ctx:
+                    started = time.perf_counter()
+                    create(items_data, outlet, options['payment_method'])
+                    timings.append((time.perf_counter() - started) * 1000)
+                queries = len(ctx.captured_queries)
+                transaction.set_rollback(True)
+        return queries, timings
+
+    @staticmethod
+    def _p90(values):
+        ordered = sorted(values)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.9))]
@@ -0,0 +1,146 @@
+"""
+Management command that EXPLAINs the hot order queries (kitchen, order
+admin, dashboard) and checks that each one is served by its index
+Usage: python manage.py explain_order_queries [--check] [--analyze] [--verbose]
+
+On PostgreSQL the plans are taken with enable_seqscan off inside a rolled
+back transaction: development tables are small enough that the planner
+would pick a sequential scan anyway, so this shows whether an index *can*
+serve the query. Exit status is non-zero with --check when one cannot.
+"""
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from apps.core.dates import day_range
+from apps.orders.models import OPEN_STATUSES, Order, OrderItem
+
+
+def index_name(fields):
+    """Name of the Order index over exactly these fields"""
+    for index in Order._meta.indexes:
+        if list(index.fields) == list(fields):
+            return index.name
+    raise CommandError(f"Order has no index on {fields}")
+
+
+class Command(BaseCommand):
+    help = 'EXPLAIN kitchen, order admin and dashboard queries and check their indexes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--outlet', type=int, help='Outlet id to plan for (default: any)')
+        parser.add_argument('--store', type=int, help='Store id to plan for (default: any)')
+        parser.add_argument('--tenant', type=int, help='Tenant id to plan for (default: any)')
+        parser.add_argument('--check', action='store_true', help='Fail if a query does not use its index')
+        parser.add_argument('--analyze', action='store_true', help='Run EXPLAIN ANALYZE (executes the queries)')
+        parser.add_argument('--verbose', action='store_true', help='Print full plans')
+
+    def cases(self, outlet_id, store_id, tenant_id):
+        """
+        (name, queryset, expected index, index-only expected)
+        Querysets mirror the filters used by the views
+        """
+        day_start, day_end = day_range()
+        since = timezone.now() - timedelta(minutes=5)
+        return [
+            (
+                'kitchen pending (outlet)',
+                Order.objects.filter(outlet_id=outlet_id, status='pending').order_by('created_at'),
+                'orders_outlet_open_idx', False,
+            ),
+            (
+                'kitchen board (store)',
+                Order.objects.filter(store_id=store_id, status__in=OPEN_STATUSES).order_by('created_at'),
+                'orders_store_open_idx', False,
+            ),
+            (
+                'kitchen display (tenant)',
+                Order.objects.filter(
+                    tenant_id=tenant_id, status__in=['pending', 'preparing', 'ready']
+                ).order_by('created_at'),
+                'orders_tenant_open_idx', False,
+            ),
+            (
+                'kitchen all-day (store)',
+                OrderItem.objects.filter(
+                    order__store_id=store_id, order__status__in=['pending', 'preparing']
+                ).values('kitchen_station_code', 'product_name').annotate(quantity=Sum('quantity')),
+                'orders_store_open_idx', False,
+            ),
+            (
+                'kitchen today_only (outlet)',
+                Order.objects.filter(
+                    outlet_id=outlet_id, created_at__gte=day_start, created_at__lt=day_end
+                ).exclude(status__in=['draft', 'cancelled']).order_by('created_at'),
+                index_name(['outlet', '-created_at']), False,
+            ),
+            (
+                'kitchen changes feed (outlet)',
+                Order.objects.filter(outlet_id=outlet_id, updated_at__gt=since).order_by('updated_at', 'id'),
+                index_name(['outlet', 'updated_at']), False,
+            ),
+            (
+                'order admin date range (outlet)',
+                Order.objects.filter(
+                    outlet_id=outlet_id, created_at__gte=day_start - timedelta(days=6), created_at__lt=day_end
+                ).order_by('-created_at'),
+                index_name(['outlet', '-created_at']), False,
+            ),
+            (
+                'dashboard open count (tenant)',
+                Order.objects.filter(
+                    tenant_id=tenant_id, status__in=['pending', 'preparing'],
+                    created_at__gte=day_start, created_at__lt=day_end
+                ).order_by().values('status'),
+                'orders_tenant_open_idx', True,
+            ),
+        ]
+
+    def handle(self, *args, **options):
+        sample = Order.objects.order_by('-id').values('outlet_id', 'store_id', 'tenant_id').first() or {}
+        outlet_id = options['outlet'] or sample.get('outlet_id') or 1
+        store_id = options['store'] or sample.get('store_id') or 1
+        tenant_id = options['tenant'] or sample.get('tenant_id') or 1
+        is_postgres = connection.vendor == 'postgresql'
+
+        self.stdout.write(
+            f"🔍 Planning order queries on {connection.vendor} "
+            f"(outlet={outlet_id}, store={store_id}, tenant={tenant_id})"
+        )
+
+        failures = []
+        with transaction.atomic():
+            if is_postgres:
+                with connection.cursor() as cursor:
+                    cursor.execute('SET LOCAL enable_seqscan = off')
+
+            for name, queryset, expected, index_only in self.cases(outlet_id, store_id, tenant_id):
+                plan = queryset.explain(analyze=options['analyze']) if is_postgres else queryset.explain()
+                used = expected in plan
+                # Index-only scans need Postgres and a vacuumed table; report, never fail on it
+                only = 'Index Only Scan' in plan
+                marker = self.style.SUCCESS('✓') if used else self.style.ERROR('✗')
+                note = ''
+                if index_only and is_postgres:
+                    note = ' (index-only)' if only else ' (index scan; VACUUM for index-only)'
+                self.stdout.write(f"  {marker} {name:<34} {expected}{note}")
+                if options['verbose'] or not used:
+                    for line in plan.splitlines():
+                        self.stdout.write(f"      {line}")
+                if not used:
+                    failures.append(name)
+
+            transaction.set_rollback(True)
+
+        if failures and not is_postgres:
+            self.stdout.write(self.style.WARNING(
+                f"⚠ Partial index matching differs on {connection.vendor}; run against PostgreSQL to check"
+            ))
+            return
+        if failures and options['check']:
+            raise CommandError(f"Queries not using their index: {', '.join(failures)}")
+        if not failures:
+            self.stdout.write(self.style.SUCCESS('✓ All order queries use their indexes'))
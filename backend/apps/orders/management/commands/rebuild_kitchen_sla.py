@@ -0,0 +1,30 @@
+"""
+Management command that recomputes kitchen SLA sketches from the order
+status event log (after a backfill, or when samples were lost while the
+Celery broker was down)
+Usage: python manage.py rebuild_kitchen_sla [--days 7] [--outlet ID]
+"""
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apps.orders import sla
+
+
+class Command(BaseCommand):
+    help = 'Recompute kitchen SLA percentile sketches from order status events'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=7, help='Rebuild this many days back (default: 7)')
+        parser.add_argument('--outlet', type=int, help='Only rebuild this outlet')
+
+    def handle(self, *args, **options):
+        # Through the end of the current hour, so in-progress buckets are included
+        end = sla.hour_of(timezone.now()) + timedelta(hours=1)
+        start = end - timedelta(days=options['days'])
+        total = sla.rebuild(start, end, outlet_id=options['outlet'])
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ Kitchen SLA rebuilt from {timezone.localtime(start):%Y-%m-%d %H:%M} "
+            f"({total} transitions)"
+        ))
@@ -0,0 +1,40 @@
+# Generated by Django 4.2.9 on 2026-10-16 23:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("orders", "0007_order_store"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="order",
+            name="queue_number",
+            field=models.CharField(
+                blank=True,
+                help_text="Short pickup number called out to the customer (shared by orders of a group)",
+                max_length=10,
+            ),
+        ),
+        migrations.AddField(
+            model_name="ordergroup",
+            name="queue_number",
+            field=models.CharField(
+                blank=True,
+                help_text="Short pickup number called out to the customer (e.g., 042)",
+                max_length=10,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="ordergroup",
+            name="group_number",
+            field=models.CharField(
+                db_index=True,
+                help_text="Unique identifier for this order group (e.g., GRP-20260106-3-0042)",
+                max_length=50,
+                unique=True,
+            ),
+        ),
+    ]
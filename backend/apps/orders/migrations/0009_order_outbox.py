@@ -0,0 +1,87 @@
+# Generated by Django 4.2.9 on 2026-10-16 23:02
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("orders", "0008_order_queue_number"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="OrderOutboxEvent",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "event_type",
+                    models.CharField(
+                        help_text="Event name (e.g., new_order, order_updated)",
+                        max_length=50,
+                    ),
+                ),
+                (
+                    "order_id",
+                    models.BigIntegerField(
+                        blank=True,
+                        help_text="Order the event is about (no FK, survives deletes)",
+                        null=True,
+                    ),
+                ),
+                ("outlet_id", models.BigIntegerField(blank=True, null=True)),
+                ("payload", models.JSONField(default=dict)),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "Pending"),
+                            ("delivered", "Delivered"),
+                            ("dead", "Dead Letter"),
+                        ],
+                        default="pending",
+                        max_length=20,
+                    ),
+                ),
+                (
+                    "delivered_to",
+                    models.JSONField(
+                        blank=True,
+                        default=list,
+                        help_text="Targets that already accepted the event",
+                    ),
+                ),
+                ("attempts", models.IntegerField(default=0)),
+                (
+                    "next_attempt_at",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                ("last_error", models.TextField(blank=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("delivered_at", models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                "db_table": "order_outbox",
+                "ordering": ["id"],
+                "indexes": [
+                    models.Index(
+                        condition=models.Q(("status", "pending")),
+                        fields=["next_attempt_at", "id"],
+                        name="order_outbox_pending_idx",
+                    ),
+                    models.Index(
+                        fields=["status", "created_at"],
+                        name="order_outbo_status_019369_idx",
+                    ),
+                ],
+            },
+        ),
+    ]
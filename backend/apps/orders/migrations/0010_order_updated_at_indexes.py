@@ -0,0 +1,24 @@
+# Generated by Django 4.2.9 on 2026-10-16 23:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("orders", "0009_order_outbox"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(
+                fields=["outlet", "updated_at"], name="orders_outlet__ba7e4d_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(
+                fields=["store", "updated_at"], name="orders_store_i_81d567_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.9 on 2026-10-16 23:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("orders", "0010_order_updated_at_indexes"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(
+                condition=models.Q(("status__in", ("pending", "preparing", "ready"))),
+                fields=["outlet", "status", "created_at"],
+                name="orders_outlet_open_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(
+                condition=models.Q(("status__in", ("pending", "preparing", "ready"))),
+                fields=["store", "status", "created_at"],
+                name="orders_store_open_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(
+                condition=models.Q(("status__in", ("pending", "preparing", "ready"))),
+                fields=["tenant", "status", "created_at"],
+                name="orders_tenant_open_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,83 @@
+# Generated by Django 4.2.9 on 2026-10-16 23:13
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("tenants", "0014_storeoutlet_alter_outlet_options_and_more"),
+        ("orders", "0011_open_order_partial_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="OrderStatusEvent",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "from_status",
+                    models.CharField(
+                        blank=True,
+                        help_text="Empty for the creation event",
+                        max_length=20,
+                    ),
+                ),
+                (
+                    "to_status",
+                    models.CharField(
+                        choices=[
+                            ("draft", "Draft"),
+                            ("pending", "Pending"),
+                            ("confirmed", "Confirmed"),
+                            ("preparing", "Preparing"),
+                            ("ready", "Ready"),
+                            ("served", "Served"),
+                            ("completed", "Completed"),
+                            ("cancelled", "Cancelled"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("at", models.DateTimeField(default=django.utils.timezone.now)),
+                (
+                    "order",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="status_events",
+                        to="orders.order",
+                    ),
+                ),
+                (
+                    "outlet",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="order_status_events",
+                        to="tenants.outlet",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "order_status_events",
+                "ordering": ["at", "id"],
+                "indexes": [
+                    models.Index(
+                        fields=["outlet", "to_status", "at"],
+                        name="order_statu_outlet__eb1a3a_idx",
+                    ),
+                    models.Index(
+                        fields=["order", "at"], name="order_statu_order_i_fd2496_idx"
+                    ),
+                ],
+            },
+        ),
+    ]
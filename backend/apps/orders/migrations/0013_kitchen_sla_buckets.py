@@ -0,0 +1,69 @@
+# Generated by Django 4.2.9 on 2026-10-16 23:16
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("tenants", "0014_storeoutlet_alter_outlet_options_and_more"),
+        ("orders", "0012_order_status_events"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="KitchenSLABucket",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "station",
+                    models.CharField(
+                        blank=True,
+                        help_text="Kitchen station code; empty for whole orders",
+                        max_length=20,
+                    ),
+                ),
+                (
+                    "metric",
+                    models.CharField(
+                        choices=[
+                            ("wait", "Queue Wait"),
+                            ("prep", "Preparation"),
+                            ("total", "Placed to Ready"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                (
+                    "hour",
+                    models.DateTimeField(
+                        help_text="Start of the hour the samples ended in"
+                    ),
+                ),
+                ("count", models.PositiveIntegerField(default=0)),
+                ("sketch", models.JSONField(default=dict)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "outlet",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="kitchen_sla_buckets",
+                        to="tenants.outlet",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "kitchen_sla_buckets",
+                "ordering": ["hour"],
+                "unique_together": {("outlet", "metric", "hour", "station")},
+            },
+        ),
+    ]
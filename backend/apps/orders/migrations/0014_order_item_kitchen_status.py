@@ -0,0 +1,30 @@
+# Generated by Django 4.2.9 on 2026-10-16 23:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("orders", "0013_kitchen_sla_buckets"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="orderitem",
+            name="kitchen_status",
+            field=models.CharField(
+                choices=[
+                    ("queued", "Queued"),
+                    ("cooking", "Cooking"),
+                    ("done", "Done"),
+                ],
+                default="queued",
+                max_length=10,
+            ),
+        ),
+        migrations.AddField(
+            model_name="orderitem",
+            name="kitchen_status_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
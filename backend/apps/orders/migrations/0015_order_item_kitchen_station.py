@@ -0,0 +1,25 @@
+# Generated by Django 4.2.9 on 2026-10-16 23:21
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("tenants", "0015_kitchen_station_type_code"),
+        ("orders", "0014_order_item_kitchen_status"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="orderitem",
+            name="kitchen_station",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="order_items",
+                to="tenants.kitchenstation",
+            ),
+        ),
+    ]
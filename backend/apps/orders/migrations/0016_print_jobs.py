@@ -0,0 +1,115 @@
+# Generated by Django 4.2.9 on 2026-10-16 23:29
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("tenants", "0016_kitchen_station_thresholds"),
+        ("orders", "0015_order_item_kitchen_station"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PrintJob",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "station",
+                    models.CharField(
+                        help_text="Kitchen station code the ticket prints at",
+                        max_length=20,
+                    ),
+                ),
+                ("content", models.BinaryField(help_text="Rendered ESC/POS ticket")),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "Pending"),
+                            ("leased", "Leased"),
+                            ("printed", "Printed"),
+                            ("failed", "Failed"),
+                        ],
+                        default="pending",
+                        max_length=20,
+                    ),
+                ),
+                ("attempts", models.IntegerField(default=0)),
+                (
+                    "available_at",
+                    models.DateTimeField(
+                        default=django.utils.timezone.now,
+                        help_text="Due time; end of the lease while leased",
+                    ),
+                ),
+                ("lease_token", models.CharField(blank=True, max_length=32)),
+                (
+                    "leased_by",
+                    models.CharField(
+                        blank=True,
+                        help_text="Print agent holding the lease",
+                        max_length=50,
+                    ),
+                ),
+                ("last_error", models.TextField(blank=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("printed_at", models.DateTimeField(blank=True, null=True)),
+                (
+                    "order",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="print_jobs",
+                        to="orders.order",
+                    ),
+                ),
+                (
+                    "outlet",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="print_jobs",
+                        to="tenants.outlet",
+                    ),
+                ),
+                (
+                    "reprint_of",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="reprints",
+                        to="orders.printjob",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "kitchen_print_jobs",
+                "ordering": ["id"],
+                "indexes": [
+                    models.Index(
+                        condition=models.Q(("status__in", ("pending", "leased"))),
+                        fields=["outlet", "station", "available_at", "id"],
+                        name="print_jobs_due_idx",
+                    )
+                ],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="printjob",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("reprint_of__isnull", True)),
+                fields=("order", "station"),
+                name="print_jobs_one_ticket",
+            ),
+        ),
+    ]
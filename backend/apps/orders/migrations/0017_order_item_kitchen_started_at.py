@@ -0,0 +1,17 @@
+# Generated by Django 4.2.9 on 2026-10-17 00:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("orders", "0016_print_jobs"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="orderitem",
+            name="kitchen_started_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -3,13 +3,22 @@ Order models untuk transaksi management
 """
 from django.db import models
 from django.conf import settings
-from apps.tenants.models import Tenant, Outlet, Store
+from django.utils import timezone
+from apps.core.models import TrackedFieldsModel
+from apps.tenants.models import KitchenStation, Tenant, Outlet, Store
 from apps.products.models import Product
-import uuid
+from apps.orders.numbering import allocate_group_number, allocate_order_numbers, allocate_queue_number
 from datetime import datetime
+from decimal import Decimal, ROUND_HALF_UP
 
+# Money columns are numeric(x, 2); round in memory the same way Postgres does
+CENTS = Decimal('0.01')
 
-class OrderGroup(models.Model):
+# Statuses of orders still being worked on (covered by the partial indexes)
+OPEN_STATUSES = ('pending', 'preparing', 'ready')
+
+
+class OrderGroup(TrackedFieldsModel):
     """
     Order Group - Groups multiple orders from different outlets in one payment transaction
     Used for kiosk where customer orders from multiple brands at a store
@@ -18,7 +27,12 @@ class OrderGroup(models.Model):
         max_length=50, 
         unique=True, 
         db_index=True,
-        help_text='Unique identifier for this order group (e.g., GRP-20260106-ABCD)'
+        help_text='Unique identifier for this order group (e.g., GRP-20260106-3-0042)'
+    )
+    queue_number = models.CharField(
+        max_length=10,
+        blank=True,
+        help_text='Short pickup number called out to the customer (e.g., 042)'
     )
     
     store = models.ForeignKey(
@@ -105,10 +119,10 @@ class OrderGroup(models.Model):
     
     def save(self, *args, **kwargs):
         if not self.group_number:
-            # Generate group number: GRP-YYYYMMDD-XXXX
-            date_str = datetime.now().strftime('%Y%m%d')
-            random_str = str(uuid.uuid4().hex[:4]).upper()
-            self.group_number = f"GRP-{date_str}-{random_str}"
+            # Generate group number: GRP-YYYYMMDD-<store>-NNNN
+            self.group_number = allocate_group_number(self.store_id)
+        if not self.queue_number and self._state.adding:
+            self.queue_number = allocate_queue_number(store_id=self.store_id)
         super().save(*args, **kwargs)
     
     def calculate_total(self):
@@ -131,8 +145,13 @@ class OrderGroup(models.Model):
         self.orders.update(
             payment_status='paid',
             paid_amount=models.F('total_amount'),
-            status='pending'  # Keep pending for kitchen processing
+            status='pending',  # Keep pending for kitchen processing
+            updated_at=timezone.now()  # update() skips auto_now; kitchen sync keys on it
         )
+        
+        # update() sends no signals; print kitchen tickets explicitly
+        from apps.orders.printing import schedule_tickets
+        schedule_tickets(self.orders.values_list('id', flat=True))
     
     def get_outlet_breakdown(self):
         """Get payment breakdown per outlet"""
@@ -149,7 +168,7 @@ class OrderGroup(models.Model):
         return breakdown
 
 
-class Order(models.Model):
+class Order(TrackedFieldsModel):
     """
     Order/Transaction - Individual order per outlet/brand
     """
@@ -188,6 +207,11 @@ class Order(models.Model):
     )
     
     order_number = models.CharField(max_length=50, unique=True, db_index=True)
+    queue_number = models.CharField(
+        max_length=10,
+        blank=True,
+        help_text='Short pickup number called out to the customer (shared by orders of a group)'
+    )
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending', db_index=True)
     
     # Customer info (optional for walk-in)
@@ -233,6 +257,25 @@ class Order(models.Model):
         indexes = [
             models.Index(fields=['-created_at', 'status']),
             models.Index(fields=['outlet', '-created_at']),
+            # Kitchen display incremental sync (changes since cursor)
+            models.Index(fields=['outlet', 'updated_at']),
+            models.Index(fields=['store', 'updated_at']),
+            # Open orders only (kitchen boards, dashboards); stays small all day
+            models.Index(
+                fields=['outlet', 'status', 'created_at'],
+                condition=models.Q(status__in=OPEN_STATUSES),
+                name='orders_outlet_open_idx'
+            ),
+            models.Index(
+                fields=['store', 'status', 'created_at'],
+                condition=models.Q(status__in=OPEN_STATUSES),
+                name='orders_store_open_idx'
+            ),
+            models.Index(
+                fields=['tenant', 'status', 'created_at'],
+                condition=models.Q(status__in=OPEN_STATUSES),
+                name='orders_tenant_open_idx'
+            ),
         ]
     
     def __str__(self):
@@ -240,26 +283,41 @@ class Order(models.Model):
     
     def save(self, *args, **kwargs):
         if not self.order_number:
-            # Generate order number: ORD-YYYYMMDD-XXXX
-            from datetime import datetime
-            date_str = datetime.now().strftime('%Y%m%d')
-            random_str = str(uuid.uuid4().hex[:4]).upper()
-            self.order_number = f"ORD-{date_str}-{random_str}"
+            # Generate order number: ORD-YYYYMMDD-<outlet>-NNNN
+            self.order_number = allocate_order_numbers(self.outlet_id)[0]
+        if not self.queue_number and self._state.adding:
+            if self.order_group_id:
+                self.queue_number = self.order_group.queue_number
+            else:
+                self.queue_number = allocate_queue_number(self.store_id, self.outlet_id)
         super().save(*args, **kwargs)
     
     def calculate_totals(self):
         """Calculate order totals"""
-        self.subtotal = sum(item.total_price for item in self.items.all())
-        self.tax_amount = self.subtotal * (self.tenant.tax_rate / 100)
-        self.service_charge_amount = self.subtotal * (self.tenant.service_charge_rate / 100)
-        self.total_amount = self.subtotal + self.tax_amount + self.service_charge_amount - self.discount_amount
+        self.apply_totals(sum(item.total_price for item in self.items.all()))
         self.save()
+    
+    def apply_totals(self, subtotal):
+        """
+        Set subtotal, tax, service charge and total from an items subtotal
+        without touching the database (used by bulk checkout)
+        """
+        self.subtotal = Decimal(subtotal).quantize(CENTS, rounding=ROUND_HALF_UP)
+        self.tax_amount = (self.subtotal * (self.tenant.tax_rate / 100)).quantize(CENTS, rounding=ROUND_HALF_UP)
+        self.service_charge_amount = (self.subtotal * (self.tenant.service_charge_rate / 100)).quantize(CENTS, rounding=ROUND_HALF_UP)
+        self.total_amount = self.subtotal + self.tax_amount + self.service_charge_amount - self.discount_amount
 
 
 class OrderItem(models.Model):
     """
     Order item - individual product in an order
     """
+    KITCHEN_STATUS_CHOICES = (
+        ('queued', 'Queued'),
+        ('cooking', 'Cooking'),
+        ('done', 'Done'),
+    )
+    
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
     product = models.ForeignKey(Product, on_delete=models.PROTECT, related_name='order_items')
     
@@ -277,6 +335,19 @@ class OrderItem(models.Model):
         db_index=True,
         help_text='Kitchen station code for routing (snapshot from product)'
     )
+    # Station chosen by the router (apps.orders.routing); its code is the snapshot above
+    kitchen_station = models.ForeignKey(
+        KitchenStation,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='order_items'
+    )
+    # Per-station progress; the order rolls up to ready when every item is done
+    kitchen_status = models.CharField(max_length=10, choices=KITCHEN_STATUS_CHOICES, default='queued')
+    kitchen_status_at = models.DateTimeField(null=True, blank=True)
+    # First move to cooking; a station's SLA prep time starts here (apps.orders.sla)
+    kitchen_started_at = models.DateTimeField(null=True, blank=True)
     
     # Modifiers (stored as JSON)
     modifiers = models.JSONField(default=list, blank=True)
@@ -295,5 +366,174 @@ class OrderItem(models.Model):
         return f"{self.product_name} x{self.quantity}"
     
     def save(self, *args, **kwargs):
-        self.total_price = (self.unit_price + self.modifiers_price) * self.quantity
+        self.calculate_total_price()
         super().save(*args, **kwargs)
+    
+    def calculate_total_price(self):
+        """Line total including modifiers (bulk_create skips save, so call this first)"""
+        self.total_price = (self.unit_price + self.modifiers_price) * self.quantity
+        return self.total_price
+
+
+class OrderStatusEvent(models.Model):
+    """
+    Append-only log of order status transitions
+    One row per transition (bulk-inserted for bulk kitchen transitions), so
+    timelines and queue-time analytics read this narrow table instead of
+    reconstructing history from updated_at
+    """
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='status_events')
+    outlet = models.ForeignKey(Outlet, on_delete=models.CASCADE, related_name='order_status_events')
+    from_status = models.CharField(max_length=20, blank=True, help_text='Empty for the creation event')
+    to_status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        db_table = 'order_status_events'
+        ordering = ['at', 'id']
+        indexes = [
+            # Queue-time analytics: "when did orders of this outlet enter <status>"
+            models.Index(fields=['outlet', 'to_status', 'at']),
+            # Timeline of one order
+            models.Index(fields=['order', 'at']),
+        ]
+    
+    def __str__(self):
+        return f"Order #{self.order_id}: {self.from_status or '-'} → {self.to_status}"
+
+
+class KitchenSLABucket(models.Model):
+    """
+    Hourly kitchen timing sketch per outlet, station and metric
+    `sketch` holds a DDSketch (apps.orders.sketches) of durations in
+    seconds; buckets merge over any range for percentiles (apps.orders.sla)
+    """
+    METRIC_CHOICES = (
+        ('wait', 'Queue Wait'),       # placed -> preparing
+        ('prep', 'Preparation'),      # preparing -> ready
+        ('total', 'Placed to Ready'), # placed -> ready
+    )
+
+    outlet = models.ForeignKey(Outlet, on_delete=models.CASCADE, related_name='kitchen_sla_buckets')
+    station = models.CharField(max_length=20, blank=True, help_text='Kitchen station code; empty for whole orders')
+    metric = models.CharField(max_length=10, choices=METRIC_CHOICES)
+    hour = models.DateTimeField(help_text='Start of the hour the samples ended in')
+    count = models.PositiveIntegerField(default=0)
+    sketch = models.JSONField(default=dict)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'kitchen_sla_buckets'
+        ordering = ['hour']
+        # Also the index for range reads: outlet + metric, then hour
+        unique_together = [['outlet', 'metric', 'hour', 'station']]
+
+    def __str__(self):
+        return f"{self.outlet_id} {self.station or '*'} {self.metric} @ {self.hour:%Y-%m-%d %H}:00 ({self.count})"
+
+
+class OrderOutboxEvent(models.Model):
+    """
+    Transactional outbox - order events waiting to be delivered
+    Written in the same transaction as the order change, delivered after
+    commit by the outbox dispatcher (apps.orders.outbox) to the Local Sync
+    Server and the Channels layer
+    """
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('delivered', 'Delivered'),
+        ('dead', 'Dead Letter'),
+    )
+    
+    event_type = models.CharField(max_length=50, help_text='Event name (e.g., new_order, order_updated)')
+    order_id = models.BigIntegerField(null=True, blank=True, help_text='Order the event is about (no FK, survives deletes)')
+    outlet_id = models.BigIntegerField(null=True, blank=True)
+    payload = models.JSONField(default=dict)
+    
+    # Delivery state
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    delivered_to = models.JSONField(default=list, blank=True, help_text='Targets that already accepted the event')
+    attempts = models.IntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    delivered_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        db_table = 'order_outbox'
+        ordering = ['id']
+        indexes = [
+            # Dispatcher scan: only pending rows are indexed
+            models.Index(
+                fields=['next_attempt_at', 'id'],
+                condition=models.Q(status='pending'),
+                name='order_outbox_pending_idx'
+            ),
+            models.Index(fields=['status', 'created_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.event_type} #{self.order_id} ({self.status})"
+
+
+class PrintJob(models.Model):
+    """
+    Kitchen ticket for a station printer
+    One job per order and station, created once the order is paid and
+    rendered once into ESC/POS bytes (apps.orders.printing). Print agents
+    lease due jobs, print them and ack; a lease that is never acked expires
+    and the job is handed out again. Reprints copy the stored bytes.
+    """
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('leased', 'Leased'),
+        ('printed', 'Printed'),
+        ('failed', 'Failed'),
+    )
+    
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='print_jobs')
+    outlet = models.ForeignKey(Outlet, on_delete=models.CASCADE, related_name='print_jobs')
+    station = models.CharField(max_length=20, help_text='Kitchen station code the ticket prints at')
+    reprint_of = models.ForeignKey(
+        'self',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='reprints'
+    )
+    content = models.BinaryField(help_text='Rendered ESC/POS ticket')
+    
+    # Delivery state
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.IntegerField(default=0)
+    available_at = models.DateTimeField(default=timezone.now, help_text='Due time; end of the lease while leased')
+    lease_token = models.CharField(max_length=32, blank=True)
+    leased_by = models.CharField(max_length=50, blank=True, help_text='Print agent holding the lease')
+    last_error = models.TextField(blank=True)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    printed_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        db_table = 'kitchen_print_jobs'
+        ordering = ['id']
+        indexes = [
+            # Agent lease scan: only jobs still to print are indexed
+            models.Index(
+                fields=['outlet', 'station', 'available_at', 'id'],
+                condition=models.Q(status__in=('pending', 'leased')),
+                name='print_jobs_due_idx'
+            ),
+        ]
+        constraints = [
+            # One original ticket per order and station (job creation is retried)
+            models.UniqueConstraint(
+                fields=['order', 'station'],
+                condition=models.Q(reprint_of__isnull=True),
+                name='print_jobs_one_ticket'
+            ),
+        ]
+    
+    def __str__(self):
+        return f"Ticket {self.order_id}/{self.station} ({self.status})"
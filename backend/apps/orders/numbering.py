@@ -0,0 +1,148 @@
+"""
+Number allocation for orders, order groups and payments
+
+Numbers come from a per-scope daily counter in Redis (INCRBY), so they
+never collide and never need a retry loop:
+
+    ORD-20260115-12-0042     order #42 of outlet 12 today
+    GRP-20260115-3-0007      group #7 of store 3 today
+    PAY-20260115-12-0042     payment #42 of outlet 12 today
+
+Counters are seeded from the highest number already in the database the
+first time they are used each day, so losing Redis data mid-day does not
+hand out numbers that exist. A batch of numbers costs one Redis call.
+
+Queue numbers are the short numbers customers listen for at pickup
+(001-999, per store per day). They are display numbers only and may wrap.
+"""
+import logging
+import re
+import uuid
+
+from django.apps import apps
+from django.db.models.functions import Length
+from django.utils import timezone
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+
+logger = logging.getLogger(__name__)
+
+SEQUENCE_TTL = 60 * 60 * 48  # Keep yesterday's counters around for late allocations
+QUEUE_NUMBER_MAX = 999
+
+# INCRBY only if the counter exists; -1 tells the caller to seed it first
+_INCR_IF_EXISTS = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return -1
+end
+return redis.call('INCRBY', KEYS[1], ARGV[1])
+"""
+
+# kind -> (model label, number field)
+NUMBER_FIELDS = {
+    'ORD': ('orders.Order', 'order_number'),
+    'GRP': ('orders.OrderGroup', 'group_number'),
+    'PAY': ('payments.Payment', 'transaction_id'),
+}
+
+
+def _sequence_key(kind, scope, day):
+    return f'pos:seq:{kind}:{scope}:{day:%Y%m%d}'
+
+
+def _prefix(kind, scope, day):
+    return f'{kind}-{day:%Y%m%d}-{scope}-'
+
+
+def _seed_value(kind, scope, day):
+    """Highest sequence already stored for this scope and day (0 if none)"""
+    model_label, field = NUMBER_FIELDS[kind]
+    model = apps.get_model(model_label)
+    prefix = _prefix(kind, scope, day)
+
+    # Longer numbers sort after shorter ones once a day passes 9999. Only
+    # numeric suffixes count: random ones (R<hex>, written while Redis was
+    # down) are longer and would always sort first
+    last = (
+        model._base_manager
+        .filter(**{f'{field}__startswith': prefix, f'{field}__regex': rf'^{re.escape(prefix)}\d+$'})
+        .annotate(number_length=Length(field))
+        .order_by('-number_length', f'-{field}')
+        .values_list(field, flat=True)
+        .first()
+    )
+    if not last:
+        return 0
+    return int(last[len(prefix):])
+
+
+def _allocate_sequence(kind, scope, count):
+    """
+    Reserve `count` consecutive values from the daily counter
+    Returns: (day, first_value)
+    """
+    day = timezone.localdate()
+    key = _sequence_key(kind, scope, day)
+    conn = get_redis_connection('default')
+    incr = conn.register_script(_INCR_IF_EXISTS)
+
+    last = incr(keys=[key], args=[count])
+    if last == -1:
+        conn.set(key, _seed_value(kind, scope, day), nx=True, ex=SEQUENCE_TTL)
+        last = incr(keys=[key], args=[count])
+
+    return day, last - count + 1
+
+
+def allocate_numbers(kind, scope, count=1):
+    """
+    Allocate `count` unique numbers of a kind ('ORD', 'GRP', 'PAY') for a scope
+
+    Args:
+        kind: Number prefix
+        scope: Outlet id (orders, payments) or store id (groups)
+        count: How many numbers to reserve in one call
+
+    Returns: list of number strings
+    """
+    scope = scope or 0
+    try:
+        day, first = _allocate_sequence(kind, scope, count)
+    except RedisError as e:
+        # Keep selling if Redis is down; 8 hex chars make collisions negligible
+        logger.warning(f"Number allocator unavailable, using random suffix: {e}")
+        prefix = _prefix(kind, scope, timezone.localdate())
+        return [f"{prefix}R{uuid.uuid4().hex[:8].upper()}" for _ in range(count)]
+
+    prefix = _prefix(kind, scope, day)
+    return [f"{prefix}{value:04d}" for value in range(first, first + count)]
+
+
+def allocate_order_numbers(outlet_id, count=1):
+    return allocate_numbers('ORD', outlet_id, count)
+
+
+def allocate_group_number(store_id):
+    return allocate_numbers('GRP', store_id)[0]
+
+
+def allocate_transaction_ids(outlet_id, count=1):
+    return allocate_numbers('PAY', outlet_id, count)
+
+
+def allocate_queue_number(store_id=None, outlet_id=None):
+    """
+    Next pickup queue number for a store (or outlet when the order has no store)
+    Returns: zero-padded string, e.g. '042'
+    """
+    scope = f'S{store_id}' if store_id else f'O{outlet_id or 0}'
+    key = _sequence_key('QUEUE', scope, timezone.localdate())
+    try:
+        pipe = get_redis_connection('default').pipeline()
+        pipe.incr(key)
+        pipe.expire(key, SEQUENCE_TTL)
+        value, _ = pipe.execute()
+    except RedisError as e:
+        logger.warning(f"Queue number allocator unavailable: {e}")
+        return ''
+    return f'{(value - 1) % QUEUE_NUMBER_MAX + 1:03d}'
@@ -0,0 +1,336 @@
+"""
+Transactional outbox for order events
+
+Order writes record their events in the `order_outbox` table inside the
+same transaction (enqueue_event / enqueue_events). Nothing talks to the
+network on the request path: after commit a Celery task runs the
+dispatcher, which delivers pending events in batches to
+
+    - the Local Sync Server (HTTP POST /emit over a keep-alive session)
+    - the Channels layer (every topic group the event touches, one
+      pipelined batch; see apps.realtime.topics and apps.realtime.utils)
+
+Each batch is claimed with a lease (OUTBOX_LEASE) in a short transaction
+and delivered outside it, so no row locks are held during network calls.
+
+Failed deliveries are retried with exponential backoff; events that keep
+failing are moved to the dead letter state (visible in Django admin).
+"""
+import logging
+from datetime import timedelta
+
+import requests
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from requests.adapters import HTTPAdapter
+
+from apps.orders.models import Order, OrderItem, OrderOutboxEvent
+from apps.realtime.topics import event_groups
+from apps.realtime.utils import send_batch
+
+logger = logging.getLogger(__name__)
+
+TARGET_SYNC_SERVER = 'sync_server'
+TARGET_CHANNELS = 'channels'
+TARGETS = (TARGET_SYNC_SERVER, TARGET_CHANNELS)
+
+_session = None
+
+
+def _sync_session():
+    """One pooled keep-alive HTTP session per worker process"""
+    global _session
+    if _session is None:
+        _session = requests.Session()
+        _session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=4, max_retries=0))
+        _session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=4, max_retries=0))
+    return _session
+
+
+# ============================================================================
+# Enqueue (request path)
+# ============================================================================
+
+def _kick_dispatcher():
+    from apps.orders.tasks import dispatch_order_outbox
+    try:
+        dispatch_order_outbox.delay()
+    except Exception as e:
+        # Broker down: the periodic beat run picks the events up later
+        logger.warning(f"Could not schedule outbox dispatch: {e}")
+
+
+def _schedule_dispatch():
+    """Run the dispatcher once after the current transaction commits"""
+    connection = transaction.get_connection()
+    if connection.in_atomic_block and any(
+        callback[1] is _kick_dispatcher for callback in connection.run_on_commit
+    ):
+        return
+    transaction.on_commit(_kick_dispatcher)
+
+
+def _build_event(event_name, data):
+    return OrderOutboxEvent(
+        event_type=event_name,
+        order_id=data.get('id'),
+        outlet_id=data.get('outlet_id'),
+        payload=data
+    )
+
+
+def enqueue_event(event_name, data):
+    """
+    Record an order event in the outbox (same transaction as the caller)
+
+    Args:
+        event_name: Event name understood by the sync server and consumers
+        data: JSON-serializable payload; must include outlet_id
+    """
+    event = _build_event(event_name, data)
+    event.save()
+    _schedule_dispatch()
+    return event
+
+
+def enqueue_events(events):
+    """
+    Record many events with one INSERT
+    Args: events: iterable of (event_name, data) tuples
+    """
+    rows = [_build_event(event_name, data) for event_name, data in events]
+    if rows:
+        OrderOutboxEvent.objects.bulk_create(rows)
+        _schedule_dispatch()
+    return rows
+
+
+# ============================================================================
+# Dispatcher (background worker)
+# ============================================================================
+
+def _hydrate_new_orders(events):
+    """
+    new_order is recorded when the order row is inserted, before its items
+    and totals exist; rebuild the payload from the committed order
+    """
+    from apps.orders.signals import build_new_order_payload
+
+    order_ids = [e.order_id for e in events if e.event_type == 'new_order' and e.order_id]
+    if not order_ids:
+        return
+
+    orders = Order.objects.select_related('outlet').prefetch_related('items').in_bulk(order_ids)
+    for event in events:
+        order = orders.get(event.order_id) if event.event_type == 'new_order' else None
+        if order:
+            event.payload = build_new_order_payload(order, order.items.all())
+
+
+def _deliver_to_sync_server(events):
+    """
+    POST each event to the sync server over one keep-alive session
+    Stops at the first connection failure so a down server costs one timeout per batch
+    Returns: dict of event id -> error message for failed events
+    """
+    url = f"{settings.SYNC_SERVER_URL}/emit"
+    timeout = settings.OUTBOX_SYNC_TIMEOUT
+    session = _sync_session()
+    errors = {}
+
+    for index, event in enumerate(events):
+        try:
+            response = session.post(url, json={'event': event.event_type, 'data': event.payload}, timeout=timeout)
+        except requests.exceptions.RequestException as e:
+            for pending in events[index:]:
+                errors[pending.id] = f"sync_server: {e}"
+            break
+
+        if response.status_code != 200:
+            errors[event.id] = f"sync_server: HTTP {response.status_code}"
+
+    return errors
+
+
+def channel_groups(events):
+    """
+    Channels groups each event touches (see apps.realtime.topics)
+    Scope comes from the orders: one query for store and tenant, one for
+    the stations their items are at
+    Returns: dict of event id -> list of group names
+    """
+    order_ids = {event.order_id for event in events if event.order_id}
+    scopes = {}
+    stations = {}
+    if order_ids:
+        scopes = {
+            order_id: (store_id, tenant_id)
+            for order_id, store_id, tenant_id in Order.objects.filter(id__in=order_ids)
+            .values_list('id', 'store_id', 'tenant_id')
+        }
+        for order_id, station in (
+            OrderItem.objects.filter(order_id__in=order_ids)
+            .values_list('order_id', 'kitchen_station_code').distinct()
+        ):
+            stations.setdefault(order_id, set()).add(station)
+
+    groups = {}
+    for event in events:
+        store_id, tenant_id = scopes.get(event.order_id, (None, None))
+        groups[event.id] = event_groups(
+            event.event_type, event.payload, event.outlet_id,
+            store_id=store_id, tenant_id=tenant_id,
+            stations=stations.get(event.order_id, ())
+        )
+    return groups
+
+
+def _deliver_to_channels(events):
+    """
+    group_send every event to every group it touches, as one pipelined batch
+    Returns: dict of event id -> error message for failed events
+    """
+    groups = channel_groups(events)
+    targets = [
+        (event, (group, {'type': event.event_type, 'data': event.payload, 'event_id': event.id}))
+        for event in events
+        for group in groups[event.id]
+    ]
+    results = send_batch([message for _, message in targets])
+    errors = {}
+    for (event, _), result in zip(targets, results):
+        if result is not None:
+            errors[event.id] = f"channels: {result}"
+    return errors
+
+
+def _backoff(attempts):
+    delay = settings.OUTBOX_BACKOFF_BASE * (2 ** max(attempts - 1, 0))
+    return timedelta(seconds=min(delay, settings.OUTBOX_BACKOFF_MAX))
+
+
+def _lease():
+    """How long claimed events stay invisible to other workers"""
+    return timedelta(seconds=settings.OUTBOX_LEASE)
+
+
+def claim(batch_size=None):
+    """
+    Claim a batch of due events in one short transaction
+    Claimed rows stay 'pending' with next_attempt_at pushed to the end of
+    the lease, so other workers skip them and a crashed worker's rows come
+    due again once it runs out. The lease end identifies this claim.
+
+    Returns: (events, lease_until)
+    """
+    batch_size = batch_size or settings.OUTBOX_BATCH_SIZE
+    now = timezone.now()
+    lease_until = now + _lease()
+    with transaction.atomic():
+        events = list(
+            OrderOutboxEvent.objects
+            .select_for_update(skip_locked=True)
+            .filter(status='pending', next_attempt_at__lte=now)
+            .order_by('next_attempt_at', 'id')[:batch_size]
+        )
+        if events:
+            OrderOutboxEvent.objects.filter(id__in=[e.id for e in events]).update(
+                next_attempt_at=lease_until, attempts=F('attempts') + 1
+            )
+    for event in events:
+        event.attempts += 1
+        event.next_attempt_at = lease_until
+    return events, lease_until
+
+
+def _settle(events, lease_until):
+    """
+    Record the outcome of a claimed batch in one short transaction
+    Rows whose lease ran out and were claimed again elsewhere are left to
+    that worker
+    """
+    with transaction.atomic():
+        still_ours = set(
+            OrderOutboxEvent.objects.select_for_update()
+            .filter(id__in=[e.id for e in events], next_attempt_at=lease_until)
+            .values_list('id', flat=True)
+        )
+        events = [e for e in events if e.id in still_ours]
+        OrderOutboxEvent.objects.bulk_update(
+            events,
+            ['payload', 'status', 'delivered_to', 'next_attempt_at', 'last_error', 'delivered_at']
+        )
+    return len(events)
+
+
+def dispatch_pending(batch_size=None):
+    """
+    Deliver one batch of due outbox events
+    Events are claimed in a short transaction (SKIP LOCKED, so several
+    workers can run side by side), delivered outside any transaction and
+    settled in a second short transaction; no row lock or open transaction
+    is held while talking to the network
+
+    Returns: dict with delivered / retried / dead counts
+    """
+    counts = {'delivered': 0, 'retried': 0, 'dead': 0}
+    events, lease_until = claim(batch_size)
+    if not events:
+        return counts
+
+    _hydrate_new_orders(events)
+
+    errors = {}
+    for target, deliver in (
+        (TARGET_SYNC_SERVER, _deliver_to_sync_server),
+        (TARGET_CHANNELS, _deliver_to_channels),
+    ):
+        todo = [e for e in events if target not in e.delivered_to and e.outlet_id]
+        if not todo:
+            continue
+        failed = deliver(todo)
+        for event in todo:
+            if event.id in failed:
+                errors.setdefault(event.id, []).append(failed[event.id])
+            else:
+                event.delivered_to = event.delivered_to + [target]
+
+    now = timezone.now()
+    for event in events:
+        if event.id not in errors:
+            event.status = 'delivered'
+            event.delivered_at = now
+            event.last_error = ''
+            counts['delivered'] += 1
+            continue
+
+        event.last_error = '; '.join(errors[event.id])[:1000]
+        if event.attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+            event.status = 'dead'
+            counts['dead'] += 1
+            logger.error(f"Outbox event {event.id} ({event.event_type}) dead-lettered: {event.last_error}")
+        else:
+            event.next_attempt_at = now + _backoff(event.attempts)
+            counts['retried'] += 1
+
+    settled = _settle(events, lease_until)
+    if settled < len(events):
+        logger.warning(
+            f"Outbox dispatch: {len(events) - settled} events outlived their lease and were left to another worker"
+        )
+
+    if counts['retried'] or counts['dead']:
+        logger.warning(f"Outbox dispatch: {counts}")
+    return counts
+
+
+def purge_delivered(older_than=None):
+    """Delete delivered events older than OUTBOX_RETENTION (dead letters are kept)"""
+    older_than = older_than or timedelta(seconds=settings.OUTBOX_RETENTION)
+    deleted, _ = OrderOutboxEvent.objects.filter(
+        status='delivered',
+        created_at__lt=timezone.now() - older_than
+    ).delete()
+    return deleted
@@ -0,0 +1,172 @@
+"""
+Kitchen back-pressure for kiosk menus
+
+Each KitchenStation may set two limits, in minutes of queued work at the
+current kitchen speed (the wait-time backlog times the learnt ratio):
+
+    busy_threshold    products keep selling, menus show the longer wait
+    pause_threshold   products stop selling until the queue drains
+
+A station type is as loose as its least loaded station, since new items are
+routed there. A state is left only once the queue falls below
+RELEASE_FACTOR of the limit that triggered it, so menus do not flicker.
+
+    pos:pressure:outlet:<id>    HASH type code -> {"state": ..., "wait_minutes": ...}
+
+States are re-evaluated whenever wait_times recomputes an outlet. When one
+changes, a kitchen_pressure event goes to the outlet's realtime group so
+kiosks can update their menus without polling.
+"""
+import json
+import logging
+
+from django.utils import timezone
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+from rest_framework import serializers
+
+from apps.orders.routing import station_pools
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'pos:pressure'
+KEY_TTL = 60 * 60 * 24
+
+OPEN = 'open'
+BUSY = 'busy'
+PAUSED = 'paused'
+SEVERITY = {OPEN: 0, BUSY: 1, PAUSED: 2}
+
+# Share of a limit the queue must fall below before the state is released
+RELEASE_FACTOR = 0.8
+
+
+def _redis():
+    return get_redis_connection('default')
+
+
+def _key(outlet_id):
+    return f'{KEY_PREFIX}:outlet:{outlet_id}'
+
+
+def _station_state(wait, busy, pause, previous):
+    if pause is not None and wait >= (pause * RELEASE_FACTOR if previous == PAUSED else pause):
+        return PAUSED
+    if busy is not None and wait >= (busy * RELEASE_FACTOR if previous in (BUSY, PAUSED) else busy):
+        return BUSY
+    return OPEN
+
+
+def _decode(raw):
+    return {key.decode(): json.loads(value) for key, value in raw.items()}
+
+
+def evaluate(outlet_id, backlog, ratio):
+    """
+    Store the pressure state of each station type of an outlet and announce
+    changes; called by wait_times.recompute_outlet
+
+    Args:
+        outlet_id: Outlet whose backlog was recomputed
+        backlog: dict of station code -> nominal minutes of queued work
+        ratio: Observed actual / nominal kitchen speed
+    Returns: dict of type code -> state, for types that are not open
+    """
+    conn = _redis()
+    previous = _decode(conn.hgetall(_key(outlet_id)))
+
+    current = {}
+    for type_code, pool in station_pools(outlet_id).items():
+        if all(busy is None and pause is None for _, _, busy, pause in pool):
+            continue
+        prior = previous.get(type_code, {}).get('state', OPEN)
+        # The least loaded station of the type decides (new items go there)
+        candidates = []
+        for _, code, busy, pause in pool:
+            wait = ratio * backlog.get(code, 0)
+            state = _station_state(wait, busy, pause, prior)
+            candidates.append((SEVERITY[state], wait, state))
+        _, wait, state = min(candidates)
+        if state != OPEN:
+            current[type_code] = {'state': state, 'wait_minutes': round(wait)}
+
+    pipe = conn.pipeline(transaction=False)
+    pipe.delete(_key(outlet_id))
+    if current:
+        pipe.hset(_key(outlet_id), mapping={
+            type_code: json.dumps(value) for type_code, value in current.items()
+        })
+        pipe.expire(_key(outlet_id), KEY_TTL)
+    pipe.execute()
+
+    changed = sorted(
+        type_code for type_code in set(previous) | set(current)
+        if previous.get(type_code, {}).get('state') != current.get(type_code, {}).get('state')
+    )
+    if changed:
+        from apps.orders.outbox import enqueue_event
+        enqueue_event('kitchen_pressure', {
+            'outlet_id': outlet_id,
+            'changed': changed,
+            'stations': current,
+            'at': timezone.now().isoformat(),
+        })
+        logger.info(f"🚦 Kitchen pressure at outlet {outlet_id}: {current or 'all open'}")
+    return {type_code: value['state'] for type_code, value in current.items()}
+
+
+# ============================================================================
+# Reads (menus and checkout)
+# ============================================================================
+
+def states_for(outlet_ids):
+    """
+    Pressure of several outlets in one round trip; empty if Redis is down
+    Returns: dict of outlet id -> {type code: {"state", "wait_minutes"}}
+    """
+    outlet_ids = [outlet_id for outlet_id in dict.fromkeys(outlet_ids) if outlet_id]
+    if not outlet_ids:
+        return {}
+    try:
+        pipe = _redis().pipeline(transaction=False)
+        for outlet_id in outlet_ids:
+            pipe.hgetall(_key(outlet_id))
+        results = pipe.execute()
+    except RedisError as e:
+        logger.warning(f"Kitchen pressure unavailable: {e}")
+        return {}
+    return {outlet_id: _decode(raw) for outlet_id, raw in zip(outlet_ids, results) if raw}
+
+
+def apply_to_menu(rows):
+    """
+    Overlay kitchen pressure on serialized products (dicts with outlet_id
+    and kitchen_station_code): paused products become unavailable, busy
+    ones carry the expected wait
+    """
+    pressure = states_for(row.get('outlet_id') for row in rows)
+    for row in rows:
+        current = pressure.get(row.get('outlet_id'), {}).get(row.get('kitchen_station_code'))
+        row['kitchen_pressure'] = current['state'] if current else OPEN
+        row['kitchen_wait_minutes'] = current['wait_minutes'] if current else None
+        if current and current['state'] == PAUSED:
+            row['is_available'] = False
+    return rows
+
+
+def check_available(outlet_id, products):
+    """
+    Refuse products whose station type is paused at the outlet
+    Raises: serializers.ValidationError naming the first paused product
+    """
+    paused = {
+        type_code for type_code, current in states_for([outlet_id]).get(outlet_id, {}).items()
+        if current['state'] == PAUSED
+    }
+    if not paused:
+        return
+    for product in products:
+        if product.kitchen_station_code in paused:
+            raise serializers.ValidationError(
+                f"Product '{product.name}' is temporarily unavailable: the kitchen is at capacity"
+            )
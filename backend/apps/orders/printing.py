@@ -0,0 +1,255 @@
+"""
+Kitchen ticket printing for station printers
+
+When an order is paid, one PrintJob per kitchen station it has items at is
+created by a Celery task after commit, with the ticket rendered once into
+ESC/POS bytes. Nothing is rendered on the checkout path; a beat sweep
+creates tickets for paid orders whose task never ran.
+
+Print agents (one per printer or per outlet) pull work:
+
+    lease(outlet_id, stations, agent_id)   due jobs, each with a lease token
+    ack(job_id, token, success, error)     printed, or retried with backoff
+
+A lease that is never acked (agent crashed, printer offline) runs out after
+PRINT_LEASE_SECONDS and the job is handed out again, so tickets survive
+printer and agent outages. Reprints copy the stored bytes under a REPRINT
+banner instead of rendering again.
+"""
+import logging
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from apps.core.transactions import collect_on_commit
+from apps.orders.escpos import Ticket
+from apps.orders.models import Order, PrintJob
+from apps.tenants.models import KitchenStation
+
+logger = logging.getLogger(__name__)
+
+# Orders that still get tickets once paid
+PRINTABLE_STATUSES = ('pending', 'confirmed', 'preparing')
+
+DUE_STATUSES = ('pending', 'leased')
+
+
+# ============================================================================
+# Rendering
+# ============================================================================
+
+def render_ticket(order, station_name, items):
+    """
+    ESC/POS bytes of an order's ticket for one station
+    Args:
+        order: Order (created_at, queue_number, table, customer, notes)
+        station_name: Heading printed on the ticket
+        items: The order's OrderItems routed to the station
+    """
+    ticket = Ticket(width=settings.PRINT_TICKET_WIDTH)
+    ticket.align('center').bold().size(2, 2).line(station_name)
+    if order.queue_number:
+        ticket.line(f"#{order.queue_number}")
+    ticket.size().bold(False).align('left').feed()
+
+    created = timezone.localtime(order.created_at) if order.created_at else timezone.localtime()
+    ticket.pair(order.order_number, created.strftime('%H:%M'))
+    if order.table_number:
+        ticket.line(f"Table: {order.table_number}")
+    if order.customer_name:
+        ticket.line(f"Name: {order.customer_name}")
+    ticket.line(f"Source: {order.get_source_display()}")
+    ticket.rule()
+
+    for item in items:
+        ticket.bold().size(1, 2).line(f"{item.quantity}x {item.product_name}").size().bold(False)
+        for modifier in item.modifiers or []:
+            name = modifier.get('name') if isinstance(modifier, dict) else modifier
+            if name:
+                ticket.wrapped(f"+ {name}")
+        if item.notes:
+            ticket.wrapped(f"! {item.notes}")
+    ticket.rule()
+
+    if order.notes:
+        ticket.bold().line('NOTE:').bold(False).wrapped(order.notes)
+    return ticket.feed(3).cut().render()
+
+
+def reprint_content(content, at=None):
+    """Stored ticket bytes under a REPRINT banner"""
+    at = timezone.localtime(at) if at else timezone.localtime()
+    banner = Ticket(width=settings.PRINT_TICKET_WIDTH)
+    banner.align('center').bold().line(f"*** REPRINT {at:%H:%M} ***").bold(False)
+    return banner.render() + bytes(content)
+
+
+# ============================================================================
+# Job creation (Celery, after commit)
+# ============================================================================
+
+def create_jobs(order_ids):
+    """
+    Render and store tickets for paid orders that have none yet
+    Safe to run twice for the same order (one original per station)
+    Returns: number of jobs created
+    """
+    orders = list(
+        Order.objects.filter(
+            id__in=order_ids, payment_status='paid', status__in=PRINTABLE_STATUSES
+        ).exclude(
+            Exists(PrintJob.objects.filter(order=OuterRef('pk'), reprint_of__isnull=True))
+        ).prefetch_related('items')
+    )
+    if not orders:
+        return 0
+
+    names = dict(
+        ((outlet_id, code), name)
+        for outlet_id, code, name in KitchenStation.objects.filter(
+            outlet_id__in={order.outlet_id for order in orders}
+        ).values_list('outlet_id', 'code', 'name')
+    )
+
+    jobs = []
+    for order in orders:
+        stations = {}
+        for item in order.items.all():
+            stations.setdefault(item.kitchen_station_code, []).append(item)
+        for station, items in stations.items():
+            station_name = names.get((order.outlet_id, station), station)
+            jobs.append(PrintJob(
+                order=order,
+                outlet_id=order.outlet_id,
+                station=station,
+                content=render_ticket(order, station_name, items),
+            ))
+
+    PrintJob.objects.bulk_create(jobs, ignore_conflicts=True)
+    logger.info(f"🖨 Rendered {len(jobs)} kitchen tickets for {len(orders)} orders")
+    return len(jobs)
+
+
+def _send_jobs(order_ids):
+    from apps.orders.tasks import create_print_jobs
+    try:
+        create_print_jobs.delay(sorted(order_ids))
+    except Exception as e:
+        # Broker down: the beat sweep picks these orders up
+        logger.warning(f"Could not schedule kitchen tickets: {e}")
+
+
+def schedule_tickets(order_ids):
+    """Create tickets for these (paid) orders once the current transaction commits"""
+    collect_on_commit(_send_jobs, order_ids)
+
+
+def sweep(window=None):
+    """
+    Create missing tickets for orders paid in the last PRINT_SWEEP_WINDOW
+    Returns: number of jobs created
+    """
+    window = window or timedelta(minutes=settings.PRINT_SWEEP_WINDOW_MINUTES)
+    order_ids = list(
+        Order.objects.filter(
+            created_at__gte=timezone.now() - window,
+            payment_status='paid',
+            status__in=PRINTABLE_STATUSES,
+        ).exclude(
+            Exists(PrintJob.objects.filter(order=OuterRef('pk'), reprint_of__isnull=True))
+        ).values_list('id', flat=True)
+    )
+    return create_jobs(order_ids) if order_ids else 0
+
+
+# ============================================================================
+# Print agents (lease / ack) and reprints
+# ============================================================================
+
+def _backoff(attempts):
+    delay = settings.PRINT_RETRY_BASE * (2 ** max(attempts - 1, 0))
+    return timedelta(seconds=min(delay, settings.PRINT_RETRY_MAX))
+
+
+def lease(outlet_id, stations, agent_id='', limit=10, lease_seconds=None):
+    """
+    Hand out due jobs of an outlet's stations, oldest first
+    Rows are locked with SKIP LOCKED so two agents never get the same job
+
+    Returns: list of leased PrintJobs (lease_token set)
+    """
+    now = timezone.now()
+    expires = now + timedelta(seconds=lease_seconds or settings.PRINT_LEASE_SECONDS)
+    with transaction.atomic():
+        jobs = list(
+            PrintJob.objects.select_for_update(skip_locked=True, of=('self',)).select_related('order')
+            .filter(outlet_id=outlet_id, station__in=stations, status__in=DUE_STATUSES, available_at__lte=now)
+            .order_by('available_at', 'id')[:limit]
+        )
+        for job in jobs:
+            job.status = 'leased'
+            job.lease_token = uuid.uuid4().hex
+            job.leased_by = agent_id
+            job.available_at = expires
+            job.attempts += 1
+        PrintJob.objects.bulk_update(jobs, ['status', 'lease_token', 'leased_by', 'available_at', 'attempts'])
+    return jobs
+
+
+def ack(job_id, lease_token, success=True, error=''):
+    """
+    Settle a lease: printed, or back in the queue with backoff
+    Jobs that keep failing are marked failed (reprint to try again)
+
+    Returns: the job, or None if the lease is unknown or was taken over
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        job = PrintJob.objects.select_for_update().filter(
+            id=job_id, status='leased', lease_token=lease_token
+        ).first()
+        if job is None:
+            return None
+
+        job.lease_token = ''
+        if success:
+            job.status = 'printed'
+            job.printed_at = now
+            job.last_error = ''
+        else:
+            job.last_error = (error or 'print failed')[:1000]
+            if job.attempts >= settings.PRINT_MAX_ATTEMPTS:
+                job.status = 'failed'
+                logger.error(f"Kitchen ticket {job.id} ({job.station}) failed: {job.last_error}")
+            else:
+                job.status = 'pending'
+                job.available_at = now + _backoff(job.attempts)
+        job.save(update_fields=['status', 'lease_token', 'printed_at', 'last_error', 'available_at'])
+    return job
+
+
+def reprint(order, station=None):
+    """
+    Queue copies of an order's tickets (all stations, or one)
+    Returns: list of new PrintJobs (empty if the order has no tickets yet)
+    """
+    originals = PrintJob.objects.filter(order=order, reprint_of__isnull=True)
+    if station:
+        originals = originals.filter(station=station)
+
+    now = timezone.now()
+    jobs = [
+        PrintJob(
+            order_id=job.order_id,
+            outlet_id=job.outlet_id,
+            station=job.station,
+            reprint_of=job,
+            content=reprint_content(job.content, now),
+        )
+        for job in originals
+    ]
+    return PrintJob.objects.bulk_create(jobs)
@@ -3,10 +3,8 @@ Order serializers untuk API
 """
 from rest_framework import serializers
 from apps.orders.models import Order, OrderItem, OrderGroup
+from apps.orders.checkout import create_checkout_orders, load_cart_products
 from apps.payments.models import Payment
-from apps.products.models import Product
-from apps.tenants.models import Tenant, Outlet
-from decimal import Decimal
 
 
 class OrderItemSerializer(serializers.ModelSerializer):
@@ -35,7 +33,7 @@ class OrderSerializer(serializers.ModelSerializer):
     class Meta:
         model = Order
         fields = [
-            'id', 'order_number', 'tenant', 'tenant_name', 'tenant_color',
+            'id', 'order_number', 'queue_number', 'tenant', 'tenant_name', 'tenant_color',
             'outlet', 'outlet_name', 'order_group', 'status', 'customer_name', 'customer_phone',
             'table_number', 'notes', 'subtotal', 'tax_amount',
             'service_charge_amount', 'discount_amount', 'total_amount',
@@ -43,7 +41,7 @@ class OrderSerializer(serializers.ModelSerializer):
             'items', 'created_at', 'updated_at', 'completed_at'
         ]
         read_only_fields = [
-            'order_number', 'subtotal', 'tax_amount', 
+            'order_number', 'queue_number', 'subtotal', 'tax_amount', 
             'service_charge_amount', 'total_amount', 'paid_amount'
         ]
 
@@ -58,14 +56,14 @@ class OrderGroupSerializer(serializers.ModelSerializer):
     class Meta:
         model = OrderGroup
         fields = [
-            'id', 'group_number', 'store', 'store_name', 'tenant_name',
+            'id', 'group_number', 'queue_number', 'store', 'store_name', 'tenant_name',
             'customer_name', 'customer_phone', 'customer_email',
             'payment_status', 'payment_method', 'total_amount', 'paid_amount',
             'source', 'device_id', 'session_id',
             'orders', 'outlet_breakdown',
             'created_at', 'updated_at', 'paid_at'
         ]
-        read_only_fields = ['group_number', 'total_amount', 'paid_amount', 'paid_at']
+        read_only_fields = ['group_number', 'queue_number', 'total_amount', 'paid_amount', 'paid_at']
     
     def get_outlet_breakdown(self, obj):
         return obj.get_outlet_breakdown()
@@ -147,23 +145,22 @@ class CheckoutSerializer(serializers.Serializer):
         if not items:
             raise serializers.ValidationError("Cart is empty")
         
-        product_ids = [item['product_id'] for item in items]
-        unique_product_ids = set(product_ids)  # Get unique product IDs to handle duplicates
+        unique_product_ids = {item['product_id'] for item in items}  # Handle duplicates
         
-        # Get all products (including unavailable ones) to check existence
-        all_products = Product.all_objects.filter(id__in=unique_product_ids)
-        available_products = all_products.filter(is_available=True)
+        # Get all products (including unavailable ones) in one query;
+        # kept on the serializer so create_orders does not fetch them again
+        self._cart_products = load_cart_products(unique_product_ids)
         
         # Check if all products exist
-        if all_products.count() != len(unique_product_ids):
-            missing_ids = unique_product_ids - set(all_products.values_list('id', flat=True))
+        missing_ids = unique_product_ids - set(self._cart_products)
+        if missing_ids:
             raise serializers.ValidationError(f"Products not found: {list(missing_ids)}")
         
         # Check if all products are available
-        if available_products.count() != len(unique_product_ids):
-            unavailable_ids = set(all_products.values_list('id', flat=True)) - set(available_products.values_list('id', flat=True))
-            unavailable_products = all_products.filter(id__in=unavailable_ids)
-            unavailable_names = [f"{p.name} (ID: {p.id})" for p in unavailable_products]
+        unavailable_names = [
+            f"{p.name} (ID: {p.id})" for p in self._cart_products.values() if not p.is_available
+        ]
+        if unavailable_names:
             raise serializers.ValidationError(f"Products not available: {', '.join(unavailable_names)}")
         
         return items
@@ -179,102 +176,18 @@ class CheckoutSerializer(serializers.Serializer):
             source: Order source ('kiosk', 'web', 'cashier')
             device_id: Device identifier (optional)
         """
-        items_data = validated_data['items']
-        payment_method = validated_data['payment_method']
-        customer_name = validated_data.get('customer_name', '')
-        customer_phone = validated_data.get('customer_phone', '')
-        table_number = validated_data.get('table_number', '')
-        notes = validated_data.get('notes', '')
-        
-        # Group items by tenant
-        tenant_items = {}
-        product_ids = [item['product_id'] for item in items_data]
-        products = {p.id: p for p in Product.all_objects.filter(id__in=product_ids)}
-        
-        for item_data in items_data:
-            product_id = item_data['product_id']
-            
-            # Check if product exists
-            if product_id not in products:
-                raise serializers.ValidationError(f"Product with ID {product_id} not found")
-            
-            product = products[product_id]
-            tenant_id = product.tenant_id
-            
-            # Check if product has tenant
-            if not tenant_id:
-                raise serializers.ValidationError(f"Product '{product.name}' (ID: {product_id}) does not have a tenant assigned")
-            
-            if tenant_id not in tenant_items:
-                tenant_items[tenant_id] = []
-            
-            tenant_items[tenant_id].append({
-                'product': product,
-                'quantity': item_data['quantity'],
-                'modifiers': item_data.get('modifiers', []),
-                'notes': item_data.get('notes', '')
-            })
-        
-        # Check if we have any items
-        if not tenant_items:
-            raise serializers.ValidationError("No valid items to checkout")
-        
-        # Create orders per tenant
-        orders_and_payments = []
-        
-        for tenant_id, items in tenant_items.items():
-            tenant = Tenant.objects.get(id=tenant_id)
-            
-            # Create order
-            order = Order.objects.create(
-                tenant=tenant,
-                outlet=outlet,
-                customer_name=customer_name,
-                customer_phone=customer_phone,
-                table_number=table_number,
-                notes=notes,
-                status='pending',
-                payment_status='unpaid',
-                source=source,
-                device_id=device_id
-            )
-            
-            # Create order items
-            for item in items:
-                product = item['product']
-                modifiers = item.get('modifiers', [])
-                modifiers_price = sum(Decimal(str(m.get('price', 0))) for m in modifiers)
-                
-                # Get kitchen station code from product (snapshot at order time)
-                kitchen_station_code = getattr(product, 'kitchen_station_code', 'MAIN')
-                
-                OrderItem.objects.create(
-                    order=order,
-                    product=product,
-                    product_name=product.name,
-                    product_sku=product.sku,
-                    quantity=item['quantity'],
-                    unit_price=product.price,
-                    modifiers=modifiers,
-                    modifiers_price=modifiers_price,
-                    notes=item.get('notes', ''),
-                    kitchen_station_code=kitchen_station_code  # Save routing snapshot
-                )
-            
-            # Calculate totals
-            order.calculate_totals()
-            
-            # Create payment
-            payment = Payment.objects.create(
-                order=order,
-                payment_method=payment_method,
-                amount=order.total_amount,
-                status='pending'
-            )
-            
-            orders_and_payments.append((order, payment))
-        
-        return orders_and_payments
+        return create_checkout_orders(
+            validated_data['items'],
+            outlet,
+            validated_data['payment_method'],
+            products=getattr(self, '_cart_products', None),
+            customer_name=validated_data.get('customer_name', ''),
+            customer_phone=validated_data.get('customer_phone', ''),
+            table_number=validated_data.get('table_number', ''),
+            notes=validated_data.get('notes', ''),
+            source=source,
+            device_id=device_id
+        )
 
 
 class MultiTenantCheckoutResponseSerializer(serializers.Serializer):
@@ -1,35 +1,69 @@
+from django.core.files.storage import default_storage
+from django.utils import timezone
 from rest_framework import serializers
-from apps.orders.models import Order, OrderItem
-from apps.tenants.serializers import OutletSerializer, StoreSerializer
-from apps.products.serializers import ProductSerializer
+from apps.orders.models import PrintJob
+from apps.orders.state_machine import ACTION_CHOICES, ITEM_ACTION_CHOICES
+from apps.products.models import Product
 
 
-class KitchenOrderItemSerializer(serializers.ModelSerializer):
-    """Serializer for order items in kitchen display"""
-    product_name = serializers.CharField(source='product.name', read_only=True)
-    product_image = serializers.SerializerMethodField()
-    modifiers_display = serializers.SerializerMethodField()
-    
-    class Meta:
-        model = OrderItem
-        fields = [
-            'id',
-            'product',
-            'product_name',
-            'product_image',
-            'quantity',
-            'unit_price',
-            'total_price',
-            'notes',
-            'modifiers',
-            'modifiers_display',
-        ]
+# Shared field instance used to format datetimes exactly like ModelSerializer does
+_datetime = serializers.DateTimeField()
+
+
+def _money(value):
+    """Same output as DecimalField(decimal_places=2) for the numeric(12, 2) columns"""
+    return f'{value:.2f}'
+
+URGENT_AFTER_MINUTES = 15
+
+
+def product_image_map(product_ids):
+    """
+    Relative image URLs of the given products, in one query
+    Returns: dict of product_id -> URL (products without an image are left out)
+    """
+    product_ids = {product_id for product_id in product_ids if product_id}
+    if not product_ids:
+        return {}
+    rows = Product.all_objects.filter(id__in=product_ids).exclude(image='').exclude(
+        image__isnull=True
+    ).values_list('id', 'image')
+    return {product_id: default_storage.url(image) for product_id, image in rows}
+
+
+def _item_product_ids(orders):
+    """Product ids of the (prefetched) items of these orders"""
+    return {item.product_id for order in orders for item in order.items.all()}
+
+
+def wait_minutes(order, now):
+    """Minutes an order has waited (until completion for finished orders)"""
+    if order.status in ['completed', 'served', 'cancelled']:
+        if order.completed_at:
+            return int((order.completed_at - order.created_at).total_seconds() / 60)
+        return 0
+    return int((now - order.created_at).total_seconds() / 60)
+
+
+class KitchenOrderItemSerializer(serializers.BaseSerializer):
+    """
+    Serializer for order items in kitchen display (read-only)
+    Built from the snapshot columns of OrderItem; product images come from
+    the image map of the ticket's products instead of joining products
+    """
     
     def get_product_image(self, obj):
-        if obj.product and obj.product.image:
-            request = self.context.get('request')
-            if request:
-                return request.build_absolute_uri(obj.product.image.url)
+        images = self.context.get('product_images')
+        if images is None:
+            images = product_image_map([obj.product_id])
+        url = images.get(obj.product_id)
+        if url:
+            base_url = self.context.get('base_url')
+            if base_url is None:
+                request = self.context.get('request')
+                # Relative when pre-serialized for the live board
+                base_url = request.build_absolute_uri('/')[:-1] if request else ''
+            return base_url + url
         return None
     
     def get_modifiers_display(self, obj):
@@ -44,70 +78,127 @@ class KitchenOrderItemSerializer(serializers.ModelSerializer):
                 'quantity': mod.get('quantity', 1),
             })
         return modifiers_list
+    
+    def to_representation(self, obj):
+        return {
+            'id': obj.id,
+            'product': obj.product_id,
+            'product_name': obj.product_name,
+            'product_image': self.get_product_image(obj),
+            'quantity': obj.quantity,
+            'unit_price': _money(obj.unit_price),
+            'total_price': _money(obj.total_price),
+            'notes': obj.notes,
+            'modifiers': obj.modifiers,
+            'modifiers_display': self.get_modifiers_display(obj),
+            'kitchen_station_code': obj.kitchen_station_code,
+            'kitchen_status': obj.kitchen_status,
+        }
 
 
-class KitchenOrderSerializer(serializers.ModelSerializer):
-    """Serializer for kitchen order display"""
-    items = KitchenOrderItemSerializer(many=True, read_only=True)
-    outlet_name = serializers.CharField(source='outlet.name', read_only=True)
-    store_name = serializers.CharField(source='store.name', read_only=True)
-    tenant_name = serializers.CharField(source='tenant.name', read_only=True)
+class KitchenOrderListSerializer(serializers.ListSerializer):
+    """
+    Prepares what every ticket of a list shares once: the image map of all
+    products on the tickets, the absolute URL base and the current time
+    """
     
-    # Time tracking
-    wait_time = serializers.SerializerMethodField()
-    is_urgent = serializers.SerializerMethodField()
+    def to_representation(self, data):
+        orders = list(data.all() if hasattr(data, 'all') else data)
+        request = self.context.get('request')
+        self.context.setdefault('product_images', product_image_map(_item_product_ids(orders)))
+        self.context.setdefault('base_url', request.build_absolute_uri('/')[:-1] if request else '')
+        self.context.setdefault('now', timezone.now())
+        return [self.child.to_representation(order) for order in orders]
+
+
+class KitchenOrderSerializer(serializers.BaseSerializer):
+    """
+    Serializer for kitchen order display (read-only)
+    Plain dict build from the order, its outlet / store / tenant
+    (select_related) and its prefetched items
+    """
     
     class Meta:
-        model = Order
-        fields = [
-            'id',
-            'order_number',
-            'order_group_id',
-            'status',
-            'tenant',
-            'tenant_name',
-            'outlet',
-            'outlet_name',
-            'store',
-            'store_name',
-            'customer_name',
-            'customer_phone',
-            'table_number',
-            'notes',
-            'subtotal',
-            'tax_amount',
-            'service_charge_amount',
-            'total_amount',
-            'source',
-            'device_id',
-            'created_at',
-            'updated_at',
-            'completed_at',
-            'items',
-            'wait_time',
-            'is_urgent',
-        ]
+        list_serializer_class = KitchenOrderListSerializer
     
-    def get_wait_time(self, obj):
-        """Calculate wait time in minutes"""
-        from datetime import datetime
-        from django.utils import timezone
-        
-        if obj.status in ['completed', 'served', 'cancelled']:
-            if obj.completed_at:
-                delta = obj.completed_at - obj.created_at
-                return int(delta.total_seconds() / 60)
-            return 0
+    def to_representation(self, obj):
+        """Wait time is computed once per order"""
+        context = self.context
+        if 'product_images' not in context:
+            # Single order (detail / transition responses)
+            request = context.get('request')
+            context = dict(
+                context,
+                product_images=product_image_map(_item_product_ids([obj])),
+                base_url=request.build_absolute_uri('/')[:-1] if request else ''
+            )
+        item_serializer = KitchenOrderItemSerializer(context=context)
         
-        # For pending/preparing orders
-        now = timezone.now()
-        delta = now - obj.created_at
-        return int(delta.total_seconds() / 60)
+        wait_time = wait_minutes(obj, context.get('now') or timezone.now())
+        data = {
+            'id': obj.id,
+            'order_number': obj.order_number,
+            'queue_number': obj.queue_number,
+            'order_group_id': obj.order_group_id,
+            'status': obj.status,
+            'tenant': obj.tenant_id,
+            'tenant_name': obj.tenant.name,
+            'outlet': obj.outlet_id,
+            'outlet_name': obj.outlet.name,
+            'store': obj.store_id,
+            'customer_name': obj.customer_name,
+            'customer_phone': obj.customer_phone,
+            'table_number': obj.table_number,
+            'notes': obj.notes,
+            'subtotal': _money(obj.subtotal),
+            'tax_amount': _money(obj.tax_amount),
+            'service_charge_amount': _money(obj.service_charge_amount),
+            'total_amount': _money(obj.total_amount),
+            'source': obj.source,
+            'device_id': obj.device_id,
+            'created_at': _datetime.to_representation(obj.created_at),
+            'updated_at': _datetime.to_representation(obj.updated_at),
+            'completed_at': _datetime.to_representation(obj.completed_at) if obj.completed_at else None,
+            'items': [item_serializer.to_representation(item) for item in obj.items.all()],
+            'wait_time': wait_time,
+            'is_urgent': wait_time > URGENT_AFTER_MINUTES,
+        }
+        if obj.store_id:
+            # Omitted without a store, as the former store.name field did
+            data['store_name'] = obj.store.name
+        return data
+
+
+class KitchenStationItemSerializer(serializers.BaseSerializer):
+    """
+    One item on a station screen, with just enough of its order to find
+    the ticket (read-only, built from select_related('order'))
+    """
     
-    def get_is_urgent(self, obj):
-        """Mark order as urgent if wait time > 15 minutes"""
-        wait_time = self.get_wait_time(obj)
-        return wait_time > 15
+    def to_representation(self, obj):
+        order = obj.order
+        now = self.context.get('now') or timezone.now()
+        return {
+            'id': obj.id,
+            'order_id': order.id,
+            'order_number': order.order_number,
+            'queue_number': order.queue_number,
+            'table_number': order.table_number,
+            'customer_name': order.customer_name,
+            'order_status': order.status,
+            'product_name': obj.product_name,
+            'quantity': obj.quantity,
+            'notes': obj.notes,
+            'modifiers_display': [
+                {'name': mod.get('name', ''), 'quantity': mod.get('quantity', 1)}
+                for mod in obj.modifiers or []
+            ],
+            'kitchen_station_code': obj.kitchen_station_code,
+            'kitchen_status': obj.kitchen_status,
+            'kitchen_status_at': _datetime.to_representation(obj.kitchen_status_at) if obj.kitchen_status_at else None,
+            'created_at': _datetime.to_representation(order.created_at),
+            'wait_time': wait_minutes(order, now),
+        }
 
 
 class KitchenOrderStatusUpdateSerializer(serializers.Serializer):
@@ -123,6 +214,83 @@ class KitchenOrderStatusUpdateSerializer(serializers.Serializer):
     notes = serializers.CharField(required=False, allow_blank=True)
 
 
+class KitchenBulkTransitionSerializer(serializers.Serializer):
+    """Serializer for bumping many orders with one transition"""
+    action = serializers.ChoiceField(choices=ACTION_CHOICES)
+    order_ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=200
+    )
+    notes = serializers.CharField(required=False, allow_blank=True)
+
+
+class KitchenItemTransitionSerializer(serializers.Serializer):
+    """
+    Serializer for station bumps: move items by id, or every item of the
+    given orders at one station
+    """
+    action = serializers.ChoiceField(choices=ITEM_ACTION_CHOICES)
+    item_ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        required=False,
+        max_length=500
+    )
+    order_ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        required=False,
+        max_length=200
+    )
+    station = serializers.CharField(required=False, allow_blank=True, max_length=20)
+    
+    def validate(self, attrs):
+        if not attrs.get('item_ids') and not attrs.get('order_ids'):
+            raise serializers.ValidationError('Provide item_ids or order_ids')
+        if attrs.get('order_ids') and not attrs.get('item_ids') and not attrs.get('station'):
+            raise serializers.ValidationError('station is required when bumping by order_ids')
+        return attrs
+
+
+class PrintJobSerializer(serializers.ModelSerializer):
+    """Print job without its ticket bytes (monitoring, reprint results)"""
+    order_number = serializers.CharField(source='order.order_number', read_only=True)
+    
+    class Meta:
+        model = PrintJob
+        fields = [
+            'id', 'order', 'order_number', 'outlet', 'station', 'reprint_of',
+            'status', 'attempts', 'available_at', 'leased_by', 'last_error',
+            'created_at', 'printed_at'
+        ]
+        read_only_fields = fields
+
+
+class PrintJobLeaseSerializer(serializers.Serializer):
+    """Print agent asking for due tickets of its stations"""
+    outlet_id = serializers.IntegerField(min_value=1)
+    stations = serializers.ListField(
+        child=serializers.CharField(max_length=20),
+        min_length=1,
+        max_length=50
+    )
+    agent_id = serializers.CharField(required=False, allow_blank=True, max_length=50, default='')
+    limit = serializers.IntegerField(required=False, min_value=1, max_value=50, default=10)
+    lease_seconds = serializers.IntegerField(required=False, min_value=5, max_value=600)
+
+
+class PrintJobAckSerializer(serializers.Serializer):
+    """Print agent reporting the outcome of a leased job"""
+    lease_token = serializers.CharField(max_length=32)
+    success = serializers.BooleanField(default=True)
+    error = serializers.CharField(required=False, allow_blank=True, default='')
+
+
+class PrintJobReprintSerializer(serializers.Serializer):
+    """Reprint an order's tickets (every station, or one)"""
+    order_id = serializers.IntegerField(min_value=1)
+    station = serializers.CharField(required=False, allow_blank=True, max_length=20)
+
+
 class KitchenStatsSerializer(serializers.Serializer):
     """Serializer for kitchen statistics"""
     pending_count = serializers.IntegerField()
@@ -130,4 +298,6 @@ class KitchenStatsSerializer(serializers.Serializer):
     ready_count = serializers.IntegerField()
     completed_today = serializers.IntegerField()
     avg_prep_time = serializers.FloatField()
+    p50_prep_time = serializers.FloatField()
+    p90_prep_time = serializers.FloatField()
     total_orders_today = serializers.IntegerField()
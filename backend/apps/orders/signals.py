@@ -1,66 +1,59 @@
 """
 Django signals for Order model
-Emit Socket.IO events to Local Sync Server for real-time updates
+Record order events in the transactional outbox; the outbox dispatcher
+delivers them to the Local Sync Server and Channels after commit
 """
+import copy
 import logging
-import requests
-from django.db.models.signals import post_save, pre_save
-from django.dispatch import receiver
-from .models import Order
+from collections import namedtuple
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import Signal, receiver
+from django.utils import timezone
+from .models import Order, OrderStatusEvent
+from apps.core.transactions import collect_on_commit
+from apps.tenants.models import KitchenStation
+from . import kitchen_board, printing, routing, sla, tracking, wait_times
+from .outbox import enqueue_event, enqueue_events
 
 logger = logging.getLogger(__name__)
 
-# Local Sync Server URL
-SYNC_SERVER_URL = 'http://host.docker.internal:3001'  # From Docker to host machine
+# One record per order whose status moved
+StatusChange = namedtuple('StatusChange', [
+    'order_id', 'order_number', 'outlet_id', 'store_id', 'old_status', 'status', 'changed_at'
+])
 
+# Sent with changes=[StatusChange, ...] by Order.save() and by the kitchen
+# state machine (which updates rows without save(), so post_save never fires)
+order_status_changed = Signal()
 
-def emit_socket_event(event_name, data):
-    """
-    Emit socket event to Local Sync Server via HTTP API
-    """
-    try:
-        url = f"{SYNC_SERVER_URL}/emit"
-        payload = {
-            'event': event_name,
-            'data': data
-        }
-        response = requests.post(url, json=payload, timeout=2)
-        
-        if response.status_code == 200:
-            logger.info(f"✅ Socket event '{event_name}' emitted for order {data.get('order_number')}")
-        else:
-            logger.warning(f"⚠️ Failed to emit socket event: {response.status_code}")
-            
-    except requests.exceptions.RequestException as e:
-        logger.error(f"❌ Socket event emission error: {e}")
-        # Don't fail the request if socket emission fails
+# One record per order item whose kitchen status moved
+ItemStatusChange = namedtuple('ItemStatusChange', [
+    'item_id', 'order_id', 'order_number', 'outlet_id', 'station', 'old_status', 'status', 'changed_at'
+])
 
+# Sent with changes=[ItemStatusChange, ...] by the item state machine
+order_items_changed = Signal()
 
-@receiver(post_save, sender=Order)
-def order_created_handler(sender, instance, created, **kwargs):
+
+def build_new_order_payload(order, items):
     """
-    Emit 'new_order' event when order is created
+    Build the 'new_order' event payload for an order and its items
     """
-    if created and instance.status in ['pending', 'confirmed']:
-        # Serialize order data
-        order_data = {
-            'id': instance.id,
-            'order_number': instance.order_number,
-            'outlet_id': instance.outlet_id,
-            'outlet_name': instance.outlet.name if instance.outlet else '',
-            'tenant_id': instance.tenant_id,
-            'status': instance.status,
-            'total_amount': float(instance.total_amount),
-            'customer_name': instance.customer_name,
-            'table_number': instance.table_number,
-            'notes': instance.notes,
-            'created_at': instance.created_at.isoformat() if instance.created_at else None,
-            'items': []
-        }
-        
-        # Add order items
-        for item in instance.items.all():
-            order_data['items'].append({
+    return {
+        'id': order.id,
+        'order_number': order.order_number,
+        'outlet_id': order.outlet_id,
+        'outlet_name': order.outlet.name if order.outlet else '',
+        'tenant_id': order.tenant_id,
+        'status': order.status,
+        'total_amount': float(order.total_amount),
+        'customer_name': order.customer_name,
+        'table_number': order.table_number,
+        'notes': order.notes,
+        'created_at': order.created_at.isoformat() if order.created_at else None,
+        'items': [
+            {
                 'product_name': item.product_name,
                 'quantity': item.quantity,
                 'unit_price': float(item.unit_price),
@@ -68,36 +61,217 @@ def order_created_handler(sender, instance, created, **kwargs):
                 'modifiers': item.modifiers,
                 'notes': item.notes,
                 'kitchen_station_code': item.kitchen_station_code
-            })
-        
-        # Emit socket event
-        emit_socket_event('new_order', order_data)
+            }
+            for item in items
+        ]
+    }
+
+
+def record_creation_events(orders):
+    """
+    Log the initial status of newly created orders (from_status is empty)
+    """
+    OrderStatusEvent.objects.bulk_create([
+        OrderStatusEvent(
+            order_id=order.id, outlet_id=order.outlet_id,
+            from_status='', to_status=order.status, at=order.created_at
+        )
+        for order in orders
+    ])
+
+
+def notify_orders_created(orders):
+    """
+    Record 'new_order' for orders written with bulk_create (post_save does not fire).
+    Items are read from the prefetch cache, so this costs one INSERT for
+    the outbox and one for the status event log.
+    """
+    record_creation_events(orders)
+    enqueue_events(
+        ('new_order', build_new_order_payload(order, order.items.all()))
+        for order in orders
+        if order.status in ['pending', 'confirmed']
+    )
+    kitchen_board.schedule_refresh(order.id for order in orders)
+    tracking.schedule_refresh(order.id for order in orders)
+    wait_times.schedule_refresh({order.outlet_id for order in orders})
+    printing.schedule_tickets(order.id for order in orders if order.payment_status == 'paid')
+
+
+@receiver(post_save, sender=Order)
+def order_created_handler(sender, instance, created, **kwargs):
+    """
+    Record 'new_order' event when order is created
+    Items are attached by the dispatcher once the transaction has committed
+    """
+    if created:
+        record_creation_events([instance])
+        wait_times.schedule_refresh([instance.outlet_id])
+        if instance.payment_status == 'paid':
+            printing.schedule_tickets([instance.id])
+    if created and instance.status in ['pending', 'confirmed']:
+        enqueue_event('new_order', build_new_order_payload(instance, []))
         logger.info(f"🔔 New order signal: {instance.order_number}")
 
 
 @receiver(pre_save, sender=Order)
 def order_status_changed_handler(sender, instance, **kwargs):
     """
-    Emit 'order_updated' event when order status changes
-    """
-    if instance.pk:  # Only for existing orders
-        try:
-            old_instance = Order.objects.get(pk=instance.pk)
-            
-            # Check if status changed
-            if old_instance.status != instance.status:
-                order_data = {
-                    'id': instance.id,
-                    'order_number': instance.order_number,
-                    'outlet_id': instance.outlet_id,
-                    'old_status': old_instance.status,
-                    'status': instance.status,
-                    'updated_at': instance.updated_at.isoformat() if instance.updated_at else None
-                }
-                
-                # Emit socket event
-                emit_socket_event('order_updated', order_data)
-                logger.info(f"🔄 Order status changed: {instance.order_number} ({old_instance.status} → {instance.status})")
-                
-        except Order.DoesNotExist:
-            pass
+    Remember the stored status and payment status so post_save can record
+    'order_updated' and print tickets once paid
+    Orders loaded from the database track their fields, so this only
+    queries for instances that were built by hand with a primary key
+    """
+    if instance.is_tracked or instance._state.adding or not instance.pk:
+        instance._previous_status = instance.previous_value('status')
+        instance._previous_payment_status = instance.previous_value('payment_status')
+        return
+    instance._previous_status, instance._previous_payment_status = (
+        Order.objects.filter(pk=instance.pk).values_list('status', 'payment_status').first()
+        or (None, None)
+    )
+
+
+@receiver(post_save, sender=Order)
+def order_status_saved_handler(sender, instance, created, **kwargs):
+    """
+    Send order_status_changed when a saved order has a new status
+    """
+    old_status = instance._previous_status
+    if created or old_status is None or old_status == instance.status:
+        return
+
+    change = StatusChange(
+        instance.id, instance.order_number, instance.outlet_id, instance.store_id,
+        old_status, instance.status, instance.updated_at
+    )
+    order_status_changed.send(sender=Order, changes=[change])
+
+
+@receiver(post_save, sender=Order)
+def order_paid_handler(sender, instance, created, **kwargs):
+    """
+    Print kitchen tickets when a saved order becomes paid
+    """
+    old_payment_status = getattr(instance, '_previous_payment_status', None)
+    if created or old_payment_status is None or old_payment_status == instance.payment_status:
+        return
+    if instance.payment_status == 'paid':
+        printing.schedule_tickets([instance.id])
+
+
+@receiver(order_status_changed, sender=Order)
+def record_status_changes(sender, changes, **kwargs):
+    """
+    Record 'order_updated' events and status log rows for status changes
+    """
+    OrderStatusEvent.objects.bulk_create([
+        OrderStatusEvent(
+            order_id=change.order_id, outlet_id=change.outlet_id,
+            from_status=change.old_status, to_status=change.status,
+            at=change.changed_at or timezone.now()
+        )
+        for change in changes
+    ])
+    enqueue_events(
+        ('order_updated', {
+            'id': change.order_id,
+            'order_number': change.order_number,
+            'outlet_id': change.outlet_id,
+            'old_status': change.old_status,
+            'status': change.status,
+            'updated_at': change.changed_at.isoformat() if change.changed_at else None
+        })
+        for change in changes
+    )
+    kitchen_board.schedule_refresh(change.order_id for change in changes)
+    tracking.schedule_refresh(change.order_id for change in changes)
+    wait_times.schedule_refresh({change.outlet_id for change in changes})
+    transaction.on_commit(lambda: wait_times.learn(changes))
+    for change in changes:
+        logger.info(f"🔄 Order status changed: {change.order_number} ({change.old_status} → {change.status})")
+
+
+def _schedule_sla_samples(transitions):
+    from apps.orders.tasks import record_kitchen_sla
+    try:
+        record_kitchen_sla.delay(transitions)
+    except Exception as e:
+        # Broker down: `manage.py rebuild_kitchen_sla` recomputes from the status log
+        logger.warning(f"Could not schedule kitchen SLA samples: {e}")
+
+
+@receiver(order_status_changed, sender=Order)
+def record_sla_samples(sender, changes, **kwargs):
+    """
+    Feed kitchen SLA sketches once the transition has committed
+    """
+    transitions = [
+        [change.order_id, change.status, (change.changed_at or timezone.now()).isoformat()]
+        for change in changes
+        if change.status in sla.SAMPLED_STATUSES
+    ]
+    if transitions:
+        transaction.on_commit(lambda: _schedule_sla_samples(transitions))
+
+
+@receiver(order_items_changed, sender=Order)
+def record_item_changes(sender, changes, **kwargs):
+    """
+    Record one 'order_items_updated' event per order and station, so each
+    station screen only receives its own items
+    """
+    grouped = {}
+    for change in changes:
+        grouped.setdefault((change.order_id, change.station), []).append(change)
+
+    enqueue_events(
+        ('order_items_updated', {
+            'id': order_id,
+            'order_number': group[0].order_number,
+            'outlet_id': group[0].outlet_id,
+            'station': station,
+            'items': [
+                {'id': change.item_id, 'old_status': change.old_status, 'status': change.status}
+                for change in group
+            ],
+            'updated_at': group[0].changed_at.isoformat() if group[0].changed_at else None
+        })
+        for (order_id, station), group in grouped.items()
+    )
+    kitchen_board.schedule_refresh(order_id for order_id, _ in grouped)
+    tracking.schedule_refresh(order_id for order_id, _ in grouped)
+    wait_times.schedule_refresh({change.outlet_id for change in changes})
+
+
+@receiver(post_save, sender=Order)
+def order_board_handler(sender, instance, **kwargs):
+    """
+    Refresh the order on the live kitchen board and the public tracking
+    read model after commit
+    """
+    kitchen_board.schedule_refresh([instance.id])
+    tracking.schedule_refresh([instance.id])
+
+
+@receiver(post_delete, sender=Order)
+def order_deleted_handler(sender, instance, **kwargs):
+    """
+    Drop a deleted order from the live kitchen board and public tracking
+    once the delete commits (a rolled back delete leaves both untouched)
+    """
+    # Django clears the pk of the deleted instance; keep a copy that still has it
+    order = copy.copy(instance)
+    collect_on_commit(kitchen_board.remove_orders, [order], ordered=True)
+    collect_on_commit(tracking.remove_orders, [order], ordered=True)
+
+
+@receiver(post_save, sender=KitchenStation)
+@receiver(post_delete, sender=KitchenStation)
+def kitchen_station_changed_handler(sender, instance, **kwargs):
+    """
+    Re-read the outlet's station pools on the next routed order and
+    re-check its pressure against the new limits
+    """
+    routing.forget_outlet(instance.outlet_id)
+    wait_times.schedule_refresh([instance.outlet_id])
@@ -0,0 +1,116 @@
+"""
+Mergeable quantile sketch (DDSketch) for kitchen SLA analytics
+
+A DDSketch keeps log-spaced bins, so any quantile it reports is within
+RELATIVE_ACCURACY of the true value, and two sketches merge by adding
+their bin counts. That lets hourly buckets be stored once and combined
+over any time range without going back to the orders.
+
+    sketch = DDSketch()
+    sketch.add(312.5)                     # seconds
+    sketch.merge(DDSketch.from_dict(row)) # another bucket
+    sketch.quantile(0.9)
+
+With 1% accuracy, values from one second to a week fit in ~700 bins.
+"""
+import math
+
+RELATIVE_ACCURACY = 0.01
+GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+LOG_GAMMA = math.log(GAMMA)
+
+# Values below this (seconds) are counted in the zero bin
+MIN_VALUE = 1.0
+
+
+class DDSketch:
+    """Sparse DDSketch over non-negative values"""
+
+    __slots__ = ('bins', 'zero_count', 'count', 'sum', 'min', 'max')
+
+    def __init__(self):
+        self.bins = {}
+        self.zero_count = 0
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    @staticmethod
+    def _index(value):
+        return math.ceil(math.log(value) / LOG_GAMMA)
+
+    @staticmethod
+    def _value(index):
+        # Midpoint (in relative terms) of the bin (gamma^(i-1), gamma^i]
+        return 2 * GAMMA ** index / (GAMMA + 1)
+
+    def add(self, value, count=1):
+        value = max(float(value), 0.0)
+        if value < MIN_VALUE:
+            self.zero_count += count
+        else:
+            index = self._index(value)
+            self.bins[index] = self.bins.get(index, 0) + count
+        self.count += count
+        self.sum += value * count
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        return self
+
+    def merge(self, other):
+        if not other.count:
+            return self
+        for index, count in other.bins.items():
+            self.bins[index] = self.bins.get(index, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.sum += other.sum
+        self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = other.max if self.max is None else max(self.max, other.max)
+        return self
+
+    def quantile(self, q):
+        """Value at quantile q (0..1), or None for an empty sketch"""
+        if not self.count:
+            return None
+        if not 0 <= q <= 1:
+            raise ValueError('quantile must be between 0 and 1')
+
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if seen > rank:
+            return 0.0
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if seen > rank:
+                return min(max(self._value(index), self.min), self.max)
+        return self.max
+
+    @property
+    def mean(self):
+        return self.sum / self.count if self.count else None
+
+    def to_dict(self):
+        """JSON-friendly form (bin indexes become string keys)"""
+        return {
+            'n': self.count,
+            'z': self.zero_count,
+            's': self.sum,
+            'min': self.min,
+            'max': self.max,
+            'b': {str(index): count for index, count in self.bins.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls()
+        if not data:
+            return sketch
+        sketch.count = data.get('n', 0)
+        sketch.zero_count = data.get('z', 0)
+        sketch.sum = data.get('s', 0.0)
+        sketch.min = data.get('min')
+        sketch.max = data.get('max')
+        sketch.bins = {int(index): count for index, count in data.get('b', {}).items()}
+        return sketch
@@ -0,0 +1,305 @@
+"""
+Kitchen SLA analytics: hourly quantile sketches per outlet and station
+
+Every time an order starts preparing or becomes ready, its timings are
+added to DDSketch buckets (KitchenSLABucket) keyed by outlet, metric,
+hour and station:
+
+    wait    placed -> preparing
+    prep    preparing -> ready
+    total   placed -> ready
+
+Each order is counted under its own outlet with station '' (whole order),
+from its status changes. Every kitchen station it has items at is counted
+too, from that station's own items: wait until its first item started
+cooking, prep until its last item was done. Station samples are taken when
+the order becomes ready and filed under that hour. Reading p50/p90/p99
+over any range merges the buckets in that range, so dashboards never scan
+orders. Samples are recorded by a Celery task after the transition commits
+(see signals.py); `rebuild()` recomputes a range from the status event log.
+
+The task may run twice for the same transitions (broker redelivery, a
+manual retry). record_once() claims each transition in Redis first, so a
+second run adds nothing.
+"""
+import logging
+from collections import defaultdict
+from datetime import timezone as dt_timezone
+
+from django.db import transaction
+from django.db.models import Max, Min, Q
+from django.utils import timezone
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+
+from apps.orders.models import KitchenSLABucket, Order, OrderItem, OrderStatusEvent
+from apps.orders.sketches import DDSketch
+
+logger = logging.getLogger(__name__)
+
+# Transitions that produce samples
+SAMPLED_STATUSES = ('preparing', 'ready')
+
+DEFAULT_QUANTILES = (0.5, 0.9, 0.99)
+
+# Transitions folded per statement when rebuilding
+REBUILD_CHUNK_SIZE = 2000
+
+# How long a recorded transition is remembered against repeated task runs
+RECORDED_KEY_PREFIX = 'pos:sla:recorded'
+RECORDED_TTL = 60 * 60 * 24
+
+
+def hour_of(moment):
+    """Start of the (UTC) hour a datetime falls in"""
+    return moment.astimezone(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+def _seconds(end, start):
+    if end is None or start is None or end < start:
+        return None
+    return (end - start).total_seconds()
+
+
+def _station_times(order_ids):
+    """
+    Start and ready time of each station's share of these orders, from its
+    own items: first item started cooking, last item done
+    Returns: dict of order_id -> {station: (started_at, ready_at)}
+    """
+    times = defaultdict(dict)
+    for order_id, station, started_at, ready_at in (
+        OrderItem.objects.filter(order_id__in=order_ids, kitchen_status='done')
+        .values('order_id', 'kitchen_station_code')
+        .annotate(started_at=Min('kitchen_started_at'), ready_at=Max('kitchen_status_at'))
+        .values_list('order_id', 'kitchen_station_code', 'started_at', 'ready_at')
+    ):
+        times[order_id][station] = (started_at, ready_at)
+    return times
+
+
+def collect_samples(transitions):
+    """
+    Turn transitions into sketches
+    Args: transitions: iterable of (order_id, to_status, at)
+    Returns: dict of (outlet_id, metric, hour, station) -> DDSketch
+    """
+    transitions = [t for t in transitions if t[1] in SAMPLED_STATUSES]
+    if not transitions:
+        return {}
+    order_ids = {order_id for order_id, _, _ in transitions}
+
+    orders = dict(
+        (order_id, (outlet_id, created_at))
+        for order_id, outlet_id, created_at in Order.objects.filter(id__in=order_ids)
+        .values_list('id', 'outlet_id', 'created_at')
+    )
+    started = dict(
+        OrderStatusEvent.objects.filter(order_id__in=order_ids, to_status='preparing')
+        .values('order_id').annotate(at=Max('at')).values_list('order_id', 'at')
+    )
+    stations = _station_times(
+        {order_id for order_id, to_status, _ in transitions if to_status == 'ready'}
+    )
+
+    sketches = defaultdict(DDSketch)
+    for order_id, to_status, at in transitions:
+        if order_id not in orders:
+            continue
+        outlet_id, created_at = orders[order_id]
+        hour = hour_of(at)
+        if to_status == 'preparing':
+            samples = [('', {'wait': _seconds(at, created_at)})]
+        else:
+            samples = [('', {
+                'prep': _seconds(at, started.get(order_id)),
+                'total': _seconds(at, created_at),
+            })]
+            samples.extend(
+                (station, {
+                    'wait': _seconds(station_started, created_at),
+                    'prep': _seconds(station_ready, station_started),
+                    'total': _seconds(station_ready, created_at),
+                })
+                for station, (station_started, station_ready) in stations[order_id].items()
+            )
+        for station, values in samples:
+            for metric, value in values.items():
+                if value is not None:
+                    sketches[(outlet_id, metric, hour, station)].add(value)
+    return sketches
+
+
+def store_samples(sketches):
+    """
+    Merge sketches into their buckets
+    Rows are locked, so concurrent workers cannot lose each other's samples
+    """
+    if not sketches:
+        return
+    keys = list(sketches)
+    with transaction.atomic():
+        KitchenSLABucket.objects.bulk_create(
+            [
+                KitchenSLABucket(outlet_id=outlet_id, metric=metric, hour=hour, station=station)
+                for outlet_id, metric, hour, station in keys
+            ],
+            ignore_conflicts=True,
+        )
+        # One statement in id order, so workers with overlapping keys
+        # take their row locks in the same order and cannot deadlock
+        lookup = {}
+        for outlet_id, metric, hour, station in keys:
+            lookup.setdefault((outlet_id, metric), set()).add(hour)
+        condition = Q()
+        for (outlet_id, metric), hours in lookup.items():
+            condition |= Q(outlet_id=outlet_id, metric=metric, hour__in=hours)
+        buckets = KitchenSLABucket.objects.select_for_update().filter(condition).order_by('id')
+
+        now = timezone.now()
+        updated = []
+        for bucket in buckets:
+            sketch = sketches.get((bucket.outlet_id, bucket.metric, bucket.hour, bucket.station))
+            if sketch is None:
+                continue
+            merged = DDSketch.from_dict(bucket.sketch).merge(sketch)
+            bucket.sketch = merged.to_dict()
+            bucket.count = merged.count
+            bucket.updated_at = now
+            updated.append(bucket)
+        KitchenSLABucket.objects.bulk_update(updated, ['sketch', 'count', 'updated_at'])
+
+
+def record_transitions(transitions):
+    """Add samples for (order_id, to_status, at) transitions"""
+    store_samples(collect_samples(transitions))
+
+
+def _recorded_key(order_id, to_status, at):
+    return f'{RECORDED_KEY_PREFIX}:{order_id}:{to_status}:{at.timestamp()}'
+
+
+def record_once(transitions):
+    """
+    Add samples for transitions not recorded before (Celery task)
+    Transitions are claimed in Redis before their samples are stored and
+    released if storing fails. Without Redis every transition is recorded.
+    """
+    transitions = [t for t in transitions if t[1] in SAMPLED_STATUSES]
+    if not transitions:
+        return
+    keys = [_recorded_key(*transition) for transition in transitions]
+    try:
+        conn = get_redis_connection('default')
+        pipe = conn.pipeline(transaction=False)
+        for key in keys:
+            pipe.set(key, 1, nx=True, ex=RECORDED_TTL)
+        claimed = pipe.execute()
+    except RedisError as e:
+        logger.warning(f"Kitchen SLA dedupe unavailable, recording anyway: {e}")
+        record_transitions(transitions)
+        return
+
+    new = [transition for transition, ok in zip(transitions, claimed) if ok]
+    try:
+        record_transitions(new)
+    except Exception:
+        try:
+            conn.delete(*[key for key, ok in zip(keys, claimed) if ok])
+        except RedisError:
+            pass
+        raise
+
+
+def rebuild(start, end, outlet_id=None):
+    """
+    Recompute buckets for hours in [start, end) from the status event log
+    Returns: number of transitions folded in
+    """
+    start, end = hour_of(start), hour_of(end)
+    events = OrderStatusEvent.objects.filter(
+        to_status__in=SAMPLED_STATUSES, at__gte=start, at__lt=end
+    )
+    buckets = KitchenSLABucket.objects.filter(hour__gte=start, hour__lt=end)
+    if outlet_id:
+        events = events.filter(outlet_id=outlet_id)
+        buckets = buckets.filter(outlet_id=outlet_id)
+
+    total = 0
+    with transaction.atomic():
+        buckets.delete()
+        chunk = []
+        for row in events.order_by('id').values_list('order_id', 'to_status', 'at').iterator(
+            chunk_size=REBUILD_CHUNK_SIZE
+        ):
+            chunk.append(row)
+            if len(chunk) >= REBUILD_CHUNK_SIZE:
+                record_transitions(chunk)
+                total += len(chunk)
+                chunk = []
+        record_transitions(chunk)
+        total += len(chunk)
+
+    logger.info(f"⏱ Kitchen SLA rebuilt: {start:%Y-%m-%d %H}:00 → {end:%Y-%m-%d %H}:00 ({total} transitions)")
+    return total
+
+
+# ============================================================================
+# Reads
+# ============================================================================
+
+def _minutes(seconds):
+    return None if seconds is None else round(seconds / 60, 2)
+
+
+def percentiles(outlet_ids, start, end, metric=None, station=None, group_by=None,
+                quantiles=DEFAULT_QUANTILES):
+    """
+    Merge buckets of [start, end) and report percentiles in minutes
+
+    Args:
+        outlet_ids: Outlets to include (merged together)
+        start / end: Aware datetimes; whole hours are used
+        metric: 'wait', 'prep' or 'total' (default: all)
+        station: Station code, '' for whole orders (default: all, reported separately)
+        group_by: None, 'day' (local date) or 'hour' (local hour of day, 0-23)
+        quantiles: Quantiles to report, e.g. (0.5, 0.9, 0.99)
+
+    Returns: list of dicts sorted by metric, station, group
+    """
+    rows = KitchenSLABucket.objects.filter(
+        outlet_id__in=outlet_ids, hour__gte=hour_of(start), hour__lt=end
+    )
+    if metric:
+        rows = rows.filter(metric=metric)
+    if station is not None:
+        rows = rows.filter(station=station)
+
+    merged = defaultdict(DDSketch)
+    for row_metric, row_station, hour, data in rows.values_list('metric', 'station', 'hour', 'sketch'):
+        local = timezone.localtime(hour)
+        if group_by == 'day':
+            group = local.date().isoformat()
+        elif group_by == 'hour':
+            group = local.hour
+        else:
+            group = None
+        merged[(row_metric, row_station, group)].merge(DDSketch.from_dict(data))
+
+    results = []
+    for (row_metric, row_station, group), sketch in sorted(
+        merged.items(), key=lambda item: (item[0][0], item[0][1], item[0][2] is None, item[0][2] or 0)
+    ):
+        result = {
+            'metric': row_metric,
+            'station': row_station or None,
+            'count': sketch.count,
+            'mean': _minutes(sketch.mean),
+            'max': _minutes(sketch.max),
+        }
+        if group_by:
+            result[group_by] = group
+        for q in quantiles:
+            result[f'p{q * 100:g}'] = _minutes(sketch.quantile(q))
+        results.append(result)
+    return results
@@ -0,0 +1,271 @@
+"""
+Order status state machine for kitchen transitions
+
+Every transition is one conditional UPDATE: the row only changes if it is
+still in one of the expected source statuses, so two kitchen screens
+bumping the same ticket cannot both win. The statement returns the rows it
+changed with their previous status, which feeds the status-change signal
+(outbox events etc.) without reading the orders first.
+
+    transition('start', [order_id])              # pending -> preparing
+    transition('complete', ids, outlet_id=3)     # bump bar, many tickets at once
+
+Order items have their own kitchen status per station (queued -> cooking ->
+done). Item transitions roll up to the order: the first item a station
+starts moves the order to preparing, and the order becomes ready once
+every item is done. Completing the order itself marks its items done.
+
+    transition_items('bump', order_ids=ids, station='GRILL')  # grill bump bar
+"""
+from django.db import connection, transaction
+from django.db.models import F, Q, Value
+from django.db.models.functions import Coalesce, Concat
+from django.utils import timezone
+
+from apps.orders.models import Order, OrderItem
+from apps.orders.signals import ItemStatusChange, StatusChange, order_items_changed, order_status_changed
+
+# action -> (source statuses, target status)
+TRANSITIONS = {
+    'start': (('pending',), 'preparing'),
+    'complete': (('preparing',), 'ready'),
+    'serve': (('ready',), 'served'),
+    'cancel': (('pending', 'confirmed', 'preparing', 'ready'), 'cancelled'),
+}
+
+ACTION_CHOICES = tuple(TRANSITIONS)
+
+# item action -> (source item statuses, target item status)
+ITEM_TRANSITIONS = {
+    'start': (('queued',), 'cooking'),
+    'bump': (('queued', 'cooking'), 'done'),
+    'recall': (('done',), 'cooking'),
+}
+
+ITEM_ACTION_CHOICES = tuple(ITEM_TRANSITIONS)
+
+# Orders whose items stations may still move (ready orders are recalled as a whole)
+ITEM_ORDER_STATUSES = ('pending', 'preparing')
+
+
+def _cancel_note(note):
+    return f"\nCancelled: {note}" if note else ''
+
+
+def _transition_postgres(ids, sources, target, now, note, filters):
+    """
+    UPDATE ... FROM (snapshot of matching rows) ... RETURNING
+
+    The snapshot keeps the previous status; if another transaction changes
+    a row first, Postgres re-checks `status = prev.status` against the new
+    row version and skips it
+    """
+    table = connection.ops.quote_name(Order._meta.db_table)
+    assignments = ['status = %s', 'updated_at = %s']
+    params = [target, now]
+
+    if target == 'ready':
+        assignments.append('completed_at = %s')
+        params.append(now)
+    elif target == 'served':
+        assignments.append(f'completed_at = COALESCE({table}.completed_at, %s)')
+        params.append(now)
+
+    cancel_note = _cancel_note(note) if target == 'cancelled' else ''
+    if cancel_note:
+        assignments.append(f'notes = {table}.notes || %s')
+        params.append(cancel_note)
+
+    conditions = ['id = ANY(%s)', 'status = ANY(%s)']
+    params += [list(ids), list(sources)]
+    for column, value in filters.items():
+        conditions.append(f'{column} = %s')
+        params.append(value)
+
+    sql = f"""
+        UPDATE {table} SET {', '.join(assignments)}
+        FROM (SELECT id, status FROM {table} WHERE {' AND '.join(conditions)}) AS prev
+        WHERE {table}.id = prev.id AND {table}.status = prev.status
+        RETURNING {table}.id, {table}.order_number, {table}.outlet_id, {table}.store_id, prev.status
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+
+    return [
+        StatusChange(order_id, order_number, outlet_id, store_id, old_status, target, now)
+        for order_id, order_number, outlet_id, store_id, old_status in rows
+    ]
+
+
+def _transition_generic(ids, sources, target, now, note, filters):
+    """Lock-then-update fallback for databases without UPDATE ... RETURNING"""
+    queryset = Order.objects.filter(id__in=ids, status__in=sources, **filters)
+    rows = list(
+        queryset.select_for_update()
+        .values_list('id', 'order_number', 'outlet_id', 'store_id', 'status')
+    )
+    if not rows:
+        return []
+
+    updates = {'status': target, 'updated_at': now}
+    if target == 'ready':
+        updates['completed_at'] = now
+    elif target == 'served':
+        updates['completed_at'] = Coalesce(F('completed_at'), Value(now))
+
+    cancel_note = _cancel_note(note) if target == 'cancelled' else ''
+    if cancel_note:
+        updates['notes'] = Concat(F('notes'), Value(cancel_note))
+
+    Order.objects.filter(id__in=[row[0] for row in rows]).update(**updates)
+
+    return [
+        StatusChange(order_id, order_number, outlet_id, store_id, old_status, target, now)
+        for order_id, order_number, outlet_id, store_id, old_status in rows
+    ]
+
+
+def transition(action, order_ids, note='', outlet_id=None, store_id=None):
+    """
+    Apply a kitchen transition to one or many orders in a single statement
+
+    Args:
+        action: 'start', 'complete', 'serve' or 'cancel'
+        order_ids: Iterable of order ids
+        note: Cancellation note appended to order notes (cancel only)
+        outlet_id / store_id: Optional scope; orders outside it are not touched
+
+    Returns: list of StatusChange for the orders that moved (orders that
+    were not in a source status are left alone and omitted)
+    """
+    if action not in TRANSITIONS:
+        raise ValueError(f"Unknown transition: {action}")
+
+    ids = sorted({int(order_id) for order_id in order_ids})
+    if not ids:
+        return []
+
+    sources, target = TRANSITIONS[action]
+    filters = {}
+    if outlet_id:
+        filters['outlet_id'] = int(outlet_id)
+    if store_id:
+        filters['store_id'] = int(store_id)
+
+    apply = _transition_postgres if connection.vendor == 'postgresql' else _transition_generic
+    with transaction.atomic():
+        now = timezone.now()
+        changes = apply(ids, sources, target, now, note, filters)
+        if changes:
+            order_status_changed.send(sender=Order, changes=changes)
+            if target in ('ready', 'served'):
+                _finish_items(changes, now)
+    return changes
+
+
+def _finish_items(order_changes, now):
+    """
+    Mark the remaining items of orders completed as a whole as done
+    (the orders' updated_at was set by the transition itself)
+    """
+    orders = {change.order_id: change for change in order_changes}
+    items = OrderItem.objects.filter(order_id__in=orders).exclude(kitchen_status='done')
+    rows = list(items.values_list('id', 'order_id', 'kitchen_station_code', 'kitchen_status'))
+    if not rows:
+        return
+    OrderItem.objects.filter(id__in=[row[0] for row in rows]).update(
+        kitchen_status='done', kitchen_status_at=now, updated_at=now
+    )
+    order_items_changed.send(sender=Order, changes=[
+        ItemStatusChange(
+            item_id, order_id, orders[order_id].order_number, orders[order_id].outlet_id,
+            station, old_status, 'done', now
+        )
+        for item_id, order_id, station, old_status in rows
+    ])
+
+
+def transition_items(action, item_ids=None, order_ids=None, station=None, outlet_id=None, store_id=None):
+    """
+    Move order items between kitchen statuses and roll the orders up
+
+    Args:
+        action: 'start', 'bump' or 'recall'
+        item_ids: Items to move, and/or
+        order_ids: Orders whose items to move (usually with station)
+        station: Only items routed to this kitchen station
+        outlet_id / store_id: Optional scope; orders outside it are not touched
+
+    Returns: (item changes, order changes) - lists of ItemStatusChange for the
+    items that moved and StatusChange for orders that rolled up
+    """
+    if action not in ITEM_TRANSITIONS:
+        raise ValueError(f"Unknown item transition: {action}")
+    item_ids = sorted({int(item_id) for item_id in item_ids or ()})
+    order_ids = sorted({int(order_id) for order_id in order_ids or ()})
+    if not item_ids and not order_ids:
+        return [], []
+
+    sources, target = ITEM_TRANSITIONS[action]
+    items = OrderItem.objects.filter(
+        kitchen_status__in=sources, order__status__in=ITEM_ORDER_STATUSES
+    )
+    if item_ids and order_ids:
+        items = items.filter(Q(id__in=item_ids) | Q(order_id__in=order_ids))
+    elif item_ids:
+        items = items.filter(id__in=item_ids)
+    else:
+        items = items.filter(order_id__in=order_ids)
+    if station:
+        items = items.filter(kitchen_station_code=station)
+    if outlet_id:
+        items = items.filter(order__outlet_id=int(outlet_id))
+    if store_id:
+        items = items.filter(order__store_id=int(store_id))
+
+    with transaction.atomic():
+        # Lock orders before items, like order transitions do, so a station
+        # bump and a whole-order bump of the same ticket cannot deadlock
+        candidate_orders = sorted(set(items.values_list('order_id', flat=True)))
+        if not candidate_orders:
+            return [], []
+        orders = {
+            order_id: (order_number, order_outlet_id)
+            for order_id, order_number, order_outlet_id in Order.objects.select_for_update()
+            .filter(id__in=candidate_orders, status__in=ITEM_ORDER_STATUSES)
+            .order_by('id').values_list('id', 'order_number', 'outlet_id')
+        }
+        rows = list(
+            items.filter(order_id__in=orders).select_for_update(of=('self',))
+            .order_by('id').values_list('id', 'order_id', 'kitchen_station_code', 'kitchen_status')
+        )
+        if not rows:
+            return [], []
+
+        now = timezone.now()
+        started = {}
+        if target == 'cooking':
+            # Recalls keep the first start
+            started['kitchen_started_at'] = Coalesce('kitchen_started_at', Value(now))
+        OrderItem.objects.filter(id__in=[row[0] for row in rows]).update(
+            kitchen_status=target, kitchen_status_at=now, updated_at=now, **started
+        )
+        # Item statuses are part of the ticket: the changes feed pages on
+        # Order.updated_at, so orders that do not roll up must move too
+        Order.objects.filter(id__in={row[1] for row in rows}).update(updated_at=now)
+        item_changes = [
+            ItemStatusChange(item_id, order_id, *orders[order_id], station, old_status, target, now)
+            for item_id, order_id, station, old_status in rows
+        ]
+        order_items_changed.send(sender=Order, changes=item_changes)
+
+        touched = sorted({change.order_id for change in item_changes})
+        order_changes = transition('start', touched)
+        if target == 'done':
+            unfinished = set(
+                OrderItem.objects.filter(order_id__in=touched).exclude(kitchen_status='done')
+                .values_list('order_id', flat=True)
+            )
+            order_changes += transition('complete', [order_id for order_id in touched if order_id not in unfinished])
+    return item_changes, order_changes
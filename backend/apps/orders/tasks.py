@@ -0,0 +1,57 @@
+"""
+Celery tasks for orders
+"""
+from celery import shared_task
+from django.utils.dateparse import parse_datetime
+
+from apps.orders import outbox, printing, sla, wait_times
+
+# Upper bound of batches per run, so one run cannot hog a worker forever
+MAX_BATCHES_PER_RUN = 20
+
+
+@shared_task(ignore_result=True)
+def dispatch_order_outbox():
+    """
+    Deliver pending outbox events
+    Triggered after every commit that writes events, and every few seconds by beat
+    """
+    for _ in range(MAX_BATCHES_PER_RUN):
+        counts = outbox.dispatch_pending()
+        if sum(counts.values()) == 0:
+            break
+
+
+@shared_task(ignore_result=True)
+def purge_order_outbox():
+    """Delete old delivered outbox events"""
+    return outbox.purge_delivered()
+
+
+@shared_task(ignore_result=True)
+def record_kitchen_sla(transitions):
+    """
+    Add kitchen SLA samples for committed transitions (once, if run again)
+    Args: transitions: list of [order_id, to_status, at (ISO 8601)]
+    """
+    sla.record_once(
+        (order_id, to_status, parse_datetime(at)) for order_id, to_status, at in transitions
+    )
+
+
+@shared_task(ignore_result=True)
+def recompute_wait_times(outlet_id):
+    """Refresh an outlet's station backlog and wait-time estimates (debounced, see wait_times)"""
+    wait_times.recompute_scheduled(outlet_id)
+
+
+@shared_task(ignore_result=True)
+def create_print_jobs(order_ids):
+    """Render kitchen tickets for orders that were just paid"""
+    return printing.create_jobs(order_ids)
+
+
+@shared_task(ignore_result=True)
+def sweep_print_jobs():
+    """Create tickets for recently paid orders that have none (missed tasks)"""
+    return printing.sweep()
@@ -0,0 +1,335 @@
+"""
+Public order tracking and pickup boards, materialized in Redis
+
+Customers' phones and the pickup screens poll far more often than orders
+change, so what they read is written once per change instead of being
+queried per request:
+
+    pos:track:order:<order number>       STRING tracking document (JSON)
+    pos:track:group:<group number>       SET order numbers of the group
+    pos:track:missing:<number>           marker for unknown numbers (short TTL)
+    pos:pickup:store:<id>                HASH order number -> board entry (JSON)
+    pos:pickup:store:<id>:built          marker, set when the board was rebuilt
+    pos:pickup:store:<id>:version        counter, bumped by every write to the board
+
+Orders are refreshed after every commit that creates them, saves them or
+moves their (item) status, from the same signal points as the kitchen board.
+A pickup board is rebuilt from Postgres when first read and again once its
+marker expires (PICKUP_BOARD_REBUILD_INTERVAL), which heals writes made
+around the ORM. A rebuild WATCHes the board's version while it reads
+Postgres, so a refresh landing in between is not overwritten with the older
+rows; the rebuild reads again instead. Tracking documents missing from
+Redis are read from the database once and written back.
+"""
+import json
+import logging
+import time
+
+from django.conf import settings
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError, WatchError
+from rest_framework import serializers
+from rest_framework.utils.encoders import JSONEncoder
+
+from apps.core.transactions import collect_on_commit
+from apps.orders import wait_times
+from apps.orders.models import Order, OrderGroup
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'pos:track'
+PICKUP_PREFIX = 'pos:pickup'
+
+# Statuses listed on pickup boards
+PICKUP_STATUSES = ('preparing', 'ready')
+
+KEY_TTL = 60 * 60 * 24
+MISSING_TTL = 30
+REBUILD_LOCK_TTL = 10
+REBUILD_ATTEMPTS = 5  # WATCH retries before leaving the board to the next rebuild
+
+
+def _redis():
+    return get_redis_connection('default')
+
+
+def _order_key(order_number):
+    return f'{KEY_PREFIX}:order:{order_number}'
+
+
+def _group_key(group_number):
+    return f'{KEY_PREFIX}:group:{group_number}'
+
+
+def _missing_key(number):
+    return f'{KEY_PREFIX}:missing:{number}'
+
+
+def _board_key(store_id):
+    return f'{PICKUP_PREFIX}:store:{store_id}'
+
+
+def _built_key(store_id):
+    return f'{_board_key(store_id)}:built'
+
+
+def _lock_key(store_id):
+    return f'{_board_key(store_id)}:lock'
+
+
+def _version_key(store_id):
+    return f'{_board_key(store_id)}:version'
+
+
+def _queryset():
+    return Order.objects.select_related('outlet', 'order_group').prefetch_related('items')
+
+
+# Formats timestamps exactly like the order APIs
+_datetime = serializers.DateTimeField()
+
+
+def _iso(value):
+    return _datetime.to_representation(value) if value else None
+
+
+def build_document(order):
+    """Tracking document of an order (outlet, group and items loaded)"""
+    return {
+        'id': order.id,
+        'order_number': order.order_number,
+        'group_number': order.order_group.group_number if order.order_group_id else None,
+        'queue_number': order.queue_number,
+        'status': order.status,
+        'outlet_name': order.outlet.brand_name or order.outlet.name,
+        'store_id': order.store_id,
+        'items': [
+            {'name': item.product_name, 'quantity': item.quantity, 'status': item.kitchen_status}
+            for item in order.items.all()
+        ],
+        'created_at': _iso(order.created_at),
+        'ready_at': _iso(order.completed_at),
+        'updated_at': _iso(order.updated_at),
+    }
+
+
+def board_entry(order):
+    """Pickup board entry of an order (outlet loaded)"""
+    since = order.completed_at if order.status == 'ready' else order.updated_at
+    return {
+        'queue_number': order.queue_number,
+        'order_number': order.order_number,
+        'outlet_name': order.outlet.brand_name or order.outlet.name,
+        'status': order.status,
+        'since': int(since.timestamp() if since else time.time()),
+    }
+
+
+def _write_orders(pipe, orders):
+    for order in orders:
+        pipe.set(_order_key(order.order_number), json.dumps(build_document(order), cls=JSONEncoder), ex=KEY_TTL)
+        if order.order_group_id:
+            key = _group_key(order.order_group.group_number)
+            pipe.sadd(key, order.order_number)
+            pipe.expire(key, KEY_TTL)
+        if not order.store_id:
+            continue
+        if order.status in PICKUP_STATUSES:
+            pipe.hset(_board_key(order.store_id), order.order_number, json.dumps(board_entry(order)))
+            pipe.expire(_board_key(order.store_id), KEY_TTL)
+        else:
+            pipe.hdel(_board_key(order.store_id), order.order_number)
+    _bump_versions(pipe, orders)
+
+
+def _bump_versions(pipe, orders):
+    """Mark the orders' boards as written, so a rebuild in progress re-reads"""
+    for store_id in {order.store_id for order in orders} - {None}:
+        pipe.incr(_version_key(store_id))
+        pipe.expire(_version_key(store_id), KEY_TTL)
+
+
+# ============================================================================
+# Writes
+# ============================================================================
+
+def refresh_orders(order_ids):
+    """Re-read orders from the database and rewrite what the public sees"""
+    order_ids = set(order_ids)
+    if not order_ids:
+        return
+    orders = list(_queryset().filter(id__in=order_ids))
+    try:
+        pipe = _redis().pipeline(transaction=False)
+        _write_orders(pipe, orders)
+        pipe.execute()
+    except RedisError as e:
+        logger.warning(f"Order tracking refresh failed: {e}")
+
+
+def remove_orders(orders):
+    """Forget deleted orders"""
+    try:
+        pipe = _redis().pipeline(transaction=False)
+        for order in orders:
+            pipe.delete(_order_key(order.order_number))
+            if order.store_id:
+                pipe.hdel(_board_key(order.store_id), order.order_number)
+        _bump_versions(pipe, orders)
+        pipe.execute()
+    except RedisError as e:
+        logger.warning(f"Order tracking removal failed: {e}")
+
+
+def schedule_refresh(order_ids):
+    """Refresh these orders once the current transaction commits"""
+    collect_on_commit(refresh_orders, order_ids)
+
+
+def rebuild_board(store_id):
+    """
+    Rebuild a store's pickup board from Postgres
+    Returns: True if rebuilt, False if another process is already rebuilding
+    it (or refreshes kept landing while it read the database)
+    """
+    conn = _redis()
+    if not conn.set(_lock_key(store_id), 1, nx=True, ex=REBUILD_LOCK_TTL):
+        return False
+    try:
+        with conn.pipeline(transaction=True) as pipe:
+            for _ in range(REBUILD_ATTEMPTS):
+                try:
+                    pipe.watch(_version_key(store_id))
+                    orders = list(
+                        Order.objects.select_related('outlet').filter(store_id=store_id, status__in=PICKUP_STATUSES)
+                    )
+                    pipe.multi()
+                    pipe.delete(_board_key(store_id))
+                    if orders:
+                        pipe.hset(_board_key(store_id), mapping={
+                            order.order_number: json.dumps(board_entry(order)) for order in orders
+                        })
+                        pipe.expire(_board_key(store_id), KEY_TTL)
+                    pipe.set(_built_key(store_id), int(time.time()), ex=settings.PICKUP_BOARD_REBUILD_INTERVAL)
+                    pipe.execute()
+                    break
+                except WatchError:
+                    continue
+            else:
+                logger.warning(f"Pickup board rebuild of store {store_id} kept conflicting with refreshes")
+                return False
+    finally:
+        conn.delete(_lock_key(store_id))
+    logger.info(f"📣 Pickup board rebuilt: store {store_id} ({len(orders)} orders)")
+    return True
+
+
+# ============================================================================
+# Reads
+# ============================================================================
+
+def _with_estimates(documents):
+    """Add estimated_ready_at to open orders (one HMGET)"""
+    open_ids = [doc['id'] for doc in documents if doc['status'] in wait_times.OPEN_ORDER_STATUSES]
+    estimates = wait_times.estimates_by_id(open_ids) if open_ids else {}
+    for doc in documents:
+        if doc['status'] in wait_times.OPEN_ORDER_STATUSES:
+            value = estimates.get(doc['id'])
+            doc['estimated_ready_at'] = _iso(value)
+        else:
+            doc['estimated_ready_at'] = doc['ready_at']
+    return documents
+
+
+def _from_database(number):
+    """
+    Look a number up in Postgres and write its documents back
+    Returns: list of tracking documents, or None if the number is unknown
+    """
+    orders = list(_queryset().filter(order_number=number))
+    if not orders:
+        group = OrderGroup.objects.filter(group_number=number).only('id').first()
+        orders = list(_queryset().filter(order_group=group)) if group else []
+    if not orders:
+        return None
+    try:
+        pipe = _redis().pipeline(transaction=False)
+        _write_orders(pipe, orders)
+        pipe.execute()
+    except RedisError as e:
+        logger.warning(f"Order tracking write-back failed: {e}")
+    return [build_document(order) for order in orders]
+
+
+def track(number):
+    """
+    Public view of an order or order group number
+
+    Returns: dict with 'number', 'queue_number' and 'orders' (tracking
+    documents with estimated_ready_at), or None if the number is unknown
+    """
+    try:
+        conn = _redis()
+        pipe = conn.pipeline(transaction=False)
+        pipe.get(_order_key(number))
+        pipe.smembers(_group_key(number))
+        pipe.exists(_missing_key(number))
+        raw, members, missing = pipe.execute()
+        if raw is not None:
+            documents = [json.loads(raw)]
+        elif members:
+            documents = [json.loads(value) for value in conn.mget(
+                [_order_key(member.decode()) for member in sorted(members)]
+            ) if value is not None]
+        elif missing:
+            return None
+        else:
+            documents = None
+    except RedisError as e:
+        logger.warning(f"Order tracking unavailable: {e}")
+        conn, documents = None, None
+
+    if not documents:
+        documents = _from_database(number)
+        if documents is None:
+            if conn is not None:
+                try:
+                    conn.set(_missing_key(number), 1, ex=MISSING_TTL)
+                except RedisError:
+                    pass
+            return None
+
+    return {
+        'number': number,
+        'queue_number': documents[0]['queue_number'],
+        'orders': _with_estimates(documents),
+    }
+
+
+def pickup_board(store_id):
+    """
+    Queue numbers on a store's pickup board
+    Ready orders drop off PICKUP_READY_MAX_AGE_MINUTES after they became ready
+
+    Returns: dict with 'preparing' and 'ready' lists (oldest first), or None
+    if the board is unavailable (Redis down, rebuild in progress elsewhere)
+    """
+    try:
+        conn = _redis()
+        if not conn.exists(_built_key(store_id)) and not rebuild_board(store_id):
+            return None
+        raw = conn.hgetall(_board_key(store_id))
+    except RedisError as e:
+        logger.warning(f"Pickup board unavailable: {e}")
+        return None
+
+    cutoff = time.time() - settings.PICKUP_READY_MAX_AGE_MINUTES * 60
+    board = {status: [] for status in PICKUP_STATUSES}
+    for value in raw.values():
+        entry = json.loads(value)
+        if entry['status'] == 'ready' and entry['since'] < cutoff:
+            continue
+        board[entry['status']].append(entry)
+    for entries in board.values():
+        entries.sort(key=lambda entry: entry['since'])
+    return {'store_id': store_id, **board}
@@ -8,6 +8,8 @@ from apps.orders.views_admin import OrderManagementViewSet
 from apps.orders.views_reports import ReportsViewSet
 from apps.orders.views_order_group import PublicOrderGroupViewSet, OrderGroupAdminViewSet
 from apps.orders.views_kitchen import KitchenOrderViewSet
+from apps.orders.views_print import PrintJobViewSet
+from apps.orders.views_public import pickup_board, track_order
 
 # Public/Kiosk router
 public_router = DefaultRouter()
@@ -17,6 +19,7 @@ public_router.register(r'order-groups', PublicOrderGroupViewSet, basename='order
 # Kitchen router
 kitchen_router = DefaultRouter()
 kitchen_router.register(r'kitchen/orders', KitchenOrderViewSet, basename='kitchen-order')
+kitchen_router.register(r'kitchen/print-jobs', PrintJobViewSet, basename='kitchen-print-job')
 
 # Admin router
 admin_router = DefaultRouter()
@@ -25,6 +28,11 @@ admin_router.register(r'admin/order-groups', OrderGroupAdminViewSet, basename='a
 admin_router.register(r'admin/reports', ReportsViewSet, basename='admin-report')
 
 urlpatterns = [
+    # Public tracking and pickup boards (Redis read model, no DB reads)
+    path('public/track/<str:number>/', track_order, name='public-track'),
+    path('public/pickup-board/<int:store_id>/', pickup_board, name='public-pickup-board'),
+    # Expo all-day view, also routed as kitchen/orders/all-day/
+    path('kitchen/all-day/', KitchenOrderViewSet.as_view({'get': 'all_day'}), name='kitchen-all-day'),
     path('', include(public_router.urls)),
     path('', include(kitchen_router.urls)),
     path('', include(admin_router.urls)),
@@ -10,6 +10,7 @@ from django.db.models import Sum, Count, Q, F
 from django.utils import timezone
 from datetime import timedelta, datetime
 from decimal import Decimal
+from apps.orders import kitchen_board, wait_times
 from apps.orders.models import Order, OrderItem
 from apps.payments.models import Payment
 from apps.orders.serializers import (
@@ -17,6 +18,8 @@ from apps.orders.serializers import (
     MultiTenantCheckoutResponseSerializer
 )
 from apps.tenants.models import Outlet
+from apps.core.dates import date_span_range, start_of_day
+from apps.core.idempotency import idempotent
 
 
 class OrderViewSet(viewsets.ReadOnlyModelViewSet):
@@ -54,11 +57,15 @@ class OrderViewSet(viewsets.ReadOnlyModelViewSet):
         return queryset.order_by('-created_at')
     
     @action(detail=False, methods=['post'], permission_classes=[AllowAny])
+    @idempotent('checkout')
     def checkout(self, request):
         """
         Multi-tenant checkout endpoint
         Split cart by tenant and create separate orders
         
+        Send an `Idempotency-Key` header (unique per cart) to make retries safe:
+        a retried request gets the original 201 response back.
+        
         Request body:
         {
             "items": [
@@ -82,6 +89,7 @@ class OrderViewSet(viewsets.ReadOnlyModelViewSet):
             "payments": [...],  # Array of payments (one per tenant)
             "total_amount": 150000,
             "payment_method": "cash",
+            "estimated_ready_at": "...",  # Latest estimate of the orders (also per order)
             "message": "Checkout successful. 3 orders created."
         }
         """
@@ -115,17 +123,22 @@ class OrderViewSet(viewsets.ReadOnlyModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
+        # Get source from header or body
+        source = request.headers.get('X-Source') or request.data.get('source', 'web')
+        device_id = request.headers.get('X-Device-ID') or request.data.get('device_id')
+        
+        # Validate source
+        valid_sources = ['kiosk', 'web', 'cashier']
+        if source not in valid_sources:
+            source = 'web'
+        
+        # Only failures before the commit are the client's 400: on_commit
+        # callbacks run inside atomic()'s exit too, and once the orders are
+        # committed the response must be 201 so the idempotency key stores it
+        committed = []
         try:
             with transaction.atomic():
-                # Get source from header or body
-                source = request.headers.get('X-Source') or request.data.get('source', 'web')
-                device_id = request.headers.get('X-Device-ID') or request.data.get('device_id')
-                
-                # Validate source
-                valid_sources = ['kiosk', 'web', 'cashier']
-                if source not in valid_sources:
-                    source = 'web'
-                
+                transaction.on_commit(lambda: committed.append(True))
                 # Create orders grouped by tenant
                 orders_and_payments = serializer.create_orders(
                     serializer.validated_data,
@@ -133,52 +146,87 @@ class OrderViewSet(viewsets.ReadOnlyModelViewSet):
                     source=source,
                     device_id=device_id
                 )
-                
-                orders = [op[0] for op in orders_and_payments]
-                payments = [op[1] for op in orders_and_payments]
-                
-                # Calculate total
-                total_amount = sum(order.total_amount for order in orders)
-                
-                # Process payment (for now, just mark as success for cash)
-                payment_method = serializer.validated_data['payment_method']
-                if payment_method == 'cash':
-                    for payment in payments:
-                        payment.status = 'success'
-                        payment.save()
-                    
-                    for order in orders:
-                        order.payment_status = 'paid'
-                        # Keep status as 'pending' for kitchen to process
-                        # order.status = 'confirmed'  # OLD: Changed to confirmed
-                        order.status = 'pending'  # NEW: Keep pending for kitchen display
-                        order.save()
-                
-                # Serialize response
-                response_data = {
-                    'orders': OrderSerializer(orders, many=True).data,
-                    'payments': [
-                        {
-                            'id': p.id,
-                            'transaction_id': p.transaction_id,
-                            'order_id': p.order_id,
-                            'payment_method': p.payment_method,
-                            'amount': str(p.amount),
-                            'status': p.status
-                        } for p in payments
-                    ],
-                    'total_amount': str(total_amount),
-                    'payment_method': payment_method,
-                    'message': f'Checkout successful. {len(orders)} order(s) created.'
-                }
-                
-                return Response(response_data, status=status.HTTP_201_CREATED)
+        except Exception as e:
+            if not committed:
+                return Response(
+                    {'error': str(e)},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            logger.exception(f"Checkout committed but an after-commit step failed: {e}")
+        
+        orders = [op[0] for op in orders_and_payments]
+        payments = [op[1] for op in orders_and_payments]
+        
+        # Calculate total
+        total_amount = sum(order.total_amount for order in orders)
+        
+        # Cash payments are settled when the orders are written
+        payment_method = serializer.validated_data['payment_method']
         
+        payment_rows = [
+            {
+                'id': p.id,
+                'transaction_id': p.transaction_id,
+                'order_id': p.order_id,
+                'payment_method': p.payment_method,
+                'amount': str(p.amount),
+                'status': p.status
+            } for p in payments
+        ]
+        
+        # Serialize response
+        try:
+            order_rows = OrderSerializer(orders, many=True).data
+            estimated_ready_at = wait_times.add_estimates(order_rows, orders)
         except Exception as e:
-            return Response(
-                {'error': str(e)},
-                status=status.HTTP_400_BAD_REQUEST
-            )
+            # The orders exist: answer with their numbers rather than an error
+            logger.exception(f"Checkout response serialization failed: {e}")
+            order_rows = [
+                {
+                    'id': order.id,
+                    'order_number': order.order_number,
+                    'queue_number': order.queue_number,
+                    'outlet_id': order.outlet_id,
+                    'status': order.status,
+                    'total_amount': str(order.total_amount),
+                } for order in orders
+            ]
+            estimated_ready_at = None
+        
+        response_data = {
+            'orders': order_rows,
+            'payments': payment_rows,
+            'total_amount': str(total_amount),
+            'payment_method': payment_method,
+            'estimated_ready_at': estimated_ready_at,
+            'message': f'Checkout successful. {len(orders)} order(s) created.'
+        }
+        
+        return Response(response_data, status=status.HTTP_201_CREATED)
+    
+    @action(detail=True, methods=['get'], permission_classes=[AllowAny])
+    def track(self, request, pk=None):
+        """
+        Order tracking for kiosk and pickup screens
+        One primary-key lookup plus the cached wait-time estimate
+        
+        GET /api/orders/{id}/track/
+        """
+        order = Order.objects.filter(pk=pk).only(
+            'id', 'order_number', 'queue_number', 'outlet_id', 'status', 'created_at', 'completed_at'
+        ).first()
+        if order is None:
+            return Response({'error': 'Order not found'}, status=status.HTTP_404_NOT_FOUND)
+        
+        data = {
+            'id': order.id,
+            'order_number': order.order_number,
+            'queue_number': order.queue_number,
+            'outlet_id': order.outlet_id,
+            'status': order.status,
+        }
+        wait_times.add_estimates([data], [order])
+        return Response(data)
     
     @action(detail=False, methods=['get'], permission_classes=[AllowAny])
     def kitchen_display(self, request):
@@ -194,6 +242,12 @@ class OrderViewSet(viewsets.ReadOnlyModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
+        board = kitchen_board.read_board(
+            'tenant', tenant_id, statuses=['pending', 'preparing', 'ready'], representation='order'
+        )
+        if board is not None:
+            return Response(board)
+        
         orders = Order.objects.filter(
             tenant_id=tenant_id,
             status__in=['pending', 'preparing', 'ready']  # Updated: changed from 'confirmed' to 'pending'
@@ -244,7 +298,7 @@ class OrderViewSet(viewsets.ReadOnlyModelViewSet):
         now = timezone.now()
         
         if period == 'today':
-            start_date = now.replace(hour=0, minute=0, second=0, microsecond=0)
+            start_date = start_of_day(timezone.localdate())
             end_date = now
         elif period == 'week':
             start_date = now - timedelta(days=7)
@@ -254,21 +308,23 @@ class OrderViewSet(viewsets.ReadOnlyModelViewSet):
             end_date = now
         elif period == 'custom' and start_date_str and end_date_str:
             try:
-                start_date = timezone.make_aware(datetime.strptime(start_date_str, '%Y-%m-%d'))
-                end_date = timezone.make_aware(datetime.strptime(end_date_str, '%Y-%m-%d'))
-                end_date = end_date.replace(hour=23, minute=59, second=59)
+                # Half-open [start, end): end is midnight after the last day
+                start_date, end_date = date_span_range(
+                    datetime.strptime(start_date_str, '%Y-%m-%d').date(),
+                    datetime.strptime(end_date_str, '%Y-%m-%d').date()
+                )
             except ValueError:
                 return Response(
                     {'error': 'Invalid date format. Use YYYY-MM-DD'},
                     status=status.HTTP_400_BAD_REQUEST
                 )
         else:
-            start_date = now.replace(hour=0, minute=0, second=0, microsecond=0)
+            start_date = start_of_day(timezone.localdate())
             end_date = now
         
         # Base queryset
         orders_queryset = Order.objects.filter(
-            created_at__range=[start_date, end_date]
+            created_at__gte=start_date, created_at__lt=end_date
         )
         
         # Filter by tenant if provided
@@ -296,7 +352,7 @@ class OrderViewSet(viewsets.ReadOnlyModelViewSet):
         prev_end = start_date
         
         prev_orders_queryset = Order.objects.filter(
-            created_at__range=[prev_start, prev_end]
+            created_at__gte=prev_start, created_at__lt=prev_end
         )
         if tenant_id:
             prev_orders_queryset = prev_orders_queryset.filter(tenant_id=tenant_id)
@@ -400,7 +456,7 @@ class OrderViewSet(viewsets.ReadOnlyModelViewSet):
                 hour_end = hour_start + timedelta(hours=1)
                 
                 revenue = queryset.filter(
-                    created_at__range=[hour_start, hour_end],
+                    created_at__gte=hour_start, created_at__lt=hour_end,
                     payment_status='paid'
                 ).aggregate(Sum('total_amount'))['total_amount__sum'] or Decimal('0')
                 
@@ -411,13 +467,13 @@ class OrderViewSet(viewsets.ReadOnlyModelViewSet):
         
         elif period in ['week', 'month']:
             # Daily breakdown
-            current_date = start_date.replace(hour=0, minute=0, second=0, microsecond=0)
+            current_date = start_of_day(timezone.localdate(start_date))
             
-            while current_date <= end_date:
+            while current_date < end_date:
                 day_end = current_date + timedelta(days=1)
                 
                 revenue = queryset.filter(
-                    created_at__range=[current_date, day_end],
+                    created_at__gte=current_date, created_at__lt=day_end,
                     payment_status='paid'
                 ).aggregate(Sum('total_amount'))['total_amount__sum'] or Decimal('0')
                 
@@ -430,13 +486,13 @@ class OrderViewSet(viewsets.ReadOnlyModelViewSet):
         
         else:
             # Custom period - daily breakdown
-            current_date = start_date.replace(hour=0, minute=0, second=0, microsecond=0)
+            current_date = start_of_day(timezone.localdate(start_date))
             
-            while current_date <= end_date:
+            while current_date < end_date:
                 day_end = current_date + timedelta(days=1)
                 
                 revenue = queryset.filter(
-                    created_at__range=[current_date, day_end],
+                    created_at__gte=current_date, created_at__lt=day_end,
                     payment_status='paid'
                 ).aggregate(Sum('total_amount'))['total_amount__sum'] or Decimal('0')
                 
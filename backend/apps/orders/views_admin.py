@@ -10,8 +10,11 @@ from django_filters.rest_framework import DjangoFilterBackend
 from django.utils import timezone
 from django.db.models import Q, Count, Sum
 from datetime import datetime, timedelta
-from apps.orders.models import Order, OrderItem
+from redis.exceptions import RedisError
+from apps.orders.models import Order, OrderItem, OrderStatusEvent
 from apps.orders.serializers import OrderSerializer, OrderItemSerializer
+from apps.core.dates import date_span_range
+from apps.core.idempotency import get_metrics as get_idempotency_metrics
 from apps.core.permissions import (
     IsAdminOrTenantOwnerOrManager,
     CanManageOrders,
@@ -26,13 +29,12 @@ class OrderFilter:
     
     @staticmethod
     def filter_by_date_range(queryset, start_date=None, end_date=None):
-        """Filter by date range"""
-        if start_date:
-            queryset = queryset.filter(created_at__gte=start_date)
-        if end_date:
-            # Include end date by adding 23:59:59
-            end_datetime = datetime.combine(end_date, datetime.max.time())
-            queryset = queryset.filter(created_at__lte=end_datetime)
+        """Filter by date range (whole local days, end date inclusive)"""
+        range_start, range_end = date_span_range(start_date, end_date)
+        if range_start:
+            queryset = queryset.filter(created_at__gte=range_start)
+        if range_end:
+            queryset = queryset.filter(created_at__lt=range_end)
         return queryset
     
     @staticmethod
@@ -81,6 +83,17 @@ class OrderManagementViewSet(viewsets.ModelViewSet):
     ordering_fields = ['created_at', 'total_amount', 'status']
     ordering = ['-created_at']
     
+    # (status, label) steps shown on the order timeline
+    TIMELINE_STEPS = (
+        ('draft', 'Draft'),
+        ('pending', 'Order Placed'),
+        ('confirmed', 'Confirmed'),
+        ('preparing', 'Preparing'),
+        ('ready', 'Ready to Serve'),
+        ('served', 'Served'),
+        ('completed', 'Completed'),
+    )
+    
     def get_queryset(self):
         """
         Get orders based on user role and outlet context:
@@ -214,57 +227,50 @@ class OrderManagementViewSet(viewsets.ModelViewSet):
         try:
             order = self.get_object()
             
+            # Last time the order entered each status, from the status event log
+            entered = {
+                to_status: at
+                for to_status, at in OrderStatusEvent.objects.filter(order_id=order.id)
+                .order_by('at', 'id').values_list('to_status', 'at')
+            }
+            # Orders placed before the event log existed only have created_at
+            entered.setdefault('pending', order.created_at)
+            if order.completed_at:
+                entered.setdefault('completed', order.completed_at)
+            
+            reached = {
+                'draft': order.status != 'draft',
+                'pending': True,
+                'confirmed': order.status in ['confirmed', 'preparing', 'ready', 'served', 'completed'],
+                'preparing': order.status in ['preparing', 'ready', 'served', 'completed'],
+                'ready': order.status in ['ready', 'served', 'completed'],
+                'served': order.status in ['served', 'completed'],
+                'completed': order.status == 'completed',
+            }
+            
+            def timestamp(status_name):
+                at = entered.get(status_name)
+                return at.isoformat() if at else None
+            
             timeline = [
                 {
-                    'status': 'draft',
-                    'label': 'Draft',
-                    'timestamp': order.created_at.isoformat() if order.status != 'draft' else None,
-                    'completed': True if order.status != 'draft' else False
-                },
-                {
-                    'status': 'pending',
-                    'label': 'Order Placed',
-                    'timestamp': order.created_at.isoformat() if order.created_at else None,
-                    'completed': True
-                },
-                {
-                    'status': 'confirmed',
-                    'label': 'Confirmed',
-                    'timestamp': order.updated_at.isoformat() if order.status in ['confirmed', 'preparing', 'ready', 'served', 'completed'] and order.updated_at else None,
-                    'completed': order.status in ['confirmed', 'preparing', 'ready', 'served', 'completed']
-                },
-                {
-                    'status': 'preparing',
-                    'label': 'Preparing',
-                    'timestamp': order.updated_at.isoformat() if order.status in ['preparing', 'ready', 'served', 'completed'] and order.updated_at else None,
-                    'completed': order.status in ['preparing', 'ready', 'served', 'completed']
-                },
-                {
-                    'status': 'ready',
-                    'label': 'Ready to Serve',
-                    'timestamp': order.updated_at.isoformat() if order.status in ['ready', 'served', 'completed'] and order.updated_at else None,
-                    'completed': order.status in ['ready', 'served', 'completed']
-                },
-                {
-                    'status': 'served',
-                    'label': 'Served',
-                    'timestamp': order.updated_at.isoformat() if order.status in ['served', 'completed'] and order.updated_at else None,
-                    'completed': order.status in ['served', 'completed']
-                },
-                {
-                    'status': 'completed',
-                    'label': 'Completed',
-                    'timestamp': order.completed_at.isoformat() if order.status == 'completed' and order.completed_at else None,
-                    'completed': order.status == 'completed'
+                    'status': status_name,
+                    'label': label,
+                    'timestamp': timestamp(status_name) if reached[status_name] else None,
+                    'completed': reached[status_name]
                 }
+                for status_name, label in self.TIMELINE_STEPS
             ]
+            # Draft orders are placed without passing through a logged draft state
+            if timeline[0]['completed'] and not timeline[0]['timestamp']:
+                timeline[0]['timestamp'] = order.created_at.isoformat() if order.created_at else None
             
             # If cancelled, add cancelled status
             if order.status == 'cancelled':
                 timeline.append({
                     'status': 'cancelled',
                     'label': 'Cancelled',
-                    'timestamp': order.updated_at.isoformat() if order.updated_at else None,
+                    'timestamp': timestamp('cancelled') or (order.updated_at.isoformat() if order.updated_at else None),
                     'completed': True
                 })
             
@@ -334,6 +340,28 @@ class OrderManagementViewSet(viewsets.ModelViewSet):
         
         return Response(receipt_data)
     
+    @action(detail=False, methods=['get'])
+    def idempotency_metrics(self, request):
+        """
+        Get idempotency key counters per endpoint (how often kiosks retry)
+        
+        Returns: { "checkout": { "processed": 120, "replayed": 7, "replay_rate": 0.0551 } }
+        """
+        if not is_admin_user(request.user):
+            return Response(
+                {'error': 'Only admin users can view idempotency metrics'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        try:
+            return Response(get_idempotency_metrics())
+        except RedisError as e:
+            logger.error(f"Error reading idempotency metrics: {str(e)}")
+            return Response(
+                {'error': 'Metrics store unavailable'},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
+    
     @action(detail=False, methods=['get'])
     def statistics(self, request):
         """
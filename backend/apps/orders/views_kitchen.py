@@ -2,18 +2,46 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
+from django.conf import settings
+from django.core.cache import cache
 from django.utils import timezone
-from django.db.models import Q, Count, Avg
-from datetime import datetime, timedelta
+from django.db.models import Q, Count, Avg, Sum
+from datetime import datetime, timedelta, timezone as dt_timezone
 
+from apps.orders.aggregates import PercentileCont, duration_minutes, prep_time_expression
+from apps.core.dates import day_range
+from apps.orders import kitchen_board
 from apps.orders.models import Order, OrderItem
 from apps.orders.serializers_kitchen import (
     KitchenOrderSerializer,
     KitchenOrderStatusUpdateSerializer,
+    KitchenBulkTransitionSerializer,
+    KitchenItemTransitionSerializer,
+    KitchenStationItemSerializer,
     KitchenStatsSerializer
 )
+from apps.orders.state_machine import ITEM_ORDER_STATUSES, transition, transition_items
 from apps.tenants.models import Outlet, Store
 
+# Statuses that take an order off the kitchen board
+REMOVED_STATUSES = ('draft', 'cancelled')
+
+
+def encode_cursor(updated_at, order_id):
+    """Cursor for the changes feed: '<updated_at epoch microseconds>_<order id>'"""
+    micros = int(updated_at.timestamp() * 1_000_000)
+    return f"{micros}_{order_id}"
+
+
+def decode_cursor(cursor):
+    """
+    Parse a changes cursor
+    Returns: (updated_at, order_id); raises ValueError on malformed input
+    """
+    micros, order_id = cursor.split('_', 1)
+    updated_at = datetime.fromtimestamp(int(micros) / 1_000_000, tz=dt_timezone.utc)
+    return updated_at, int(order_id)
+
 
 class KitchenOrderViewSet(viewsets.ReadOnlyModelViewSet):
     """
@@ -23,6 +51,11 @@ class KitchenOrderViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = KitchenOrderSerializer
     permission_classes = [AllowAny]  # TODO: Add authentication for production
     
+    def _base_queryset(self):
+        return Order.objects.select_related(
+            'tenant', 'outlet', 'store', 'order_group'
+        ).prefetch_related('items')
+    
     def get_queryset(self):
         """
         Filter orders based on query params:
@@ -31,11 +64,7 @@ class KitchenOrderViewSet(viewsets.ReadOnlyModelViewSet):
         - status: Filter by order status
         - station: Filter by kitchen station (via product category)
         """
-        queryset = Order.objects.select_related(
-            'tenant', 'outlet', 'store', 'order_group'
-        ).prefetch_related(
-            'items__product'
-        ).exclude(
+        queryset = self._base_queryset().exclude(
             status__in=['draft', 'cancelled']
         )
         
@@ -57,87 +86,215 @@ class KitchenOrderViewSet(viewsets.ReadOnlyModelViewSet):
         # Filter by today only (disabled by default for development)
         today_only = self.request.query_params.get('today_only', 'false')
         if today_only.lower() == 'true':
-            today = timezone.now().date()
-            queryset = queryset.filter(created_at__date=today)
+            day_start, day_end = day_range()
+            queryset = queryset.filter(created_at__gte=day_start, created_at__lt=day_end)
         
         return queryset.order_by('created_at')
     
     @action(detail=False, methods=['get'])
-    def pending(self, request):
-        """Get all pending orders (new orders waiting to be prepared)"""
-        queryset = self.get_queryset().filter(status='pending')
+    def changes(self, request):
+        """
+        Incremental sync for kitchen displays
+        
+        GET /api/kitchen/orders/changes/?outlet=<id>&since=<cursor>
+        
+        Without `since` returns the current board and a cursor. With `since`
+        returns only orders created or changed after the cursor: orders still
+        on the board in `orders`, cancelled/draft ones as ids in `removed`.
+        Keep polling with the returned cursor; `has_more` means call again
+        right away.
+        
+        Rows are read in (updated_at, id) order up to a few seconds before
+        now, so an order saved by a transaction that has not committed yet
+        is picked up by the next poll instead of being skipped.
+        """
+        page_size = settings.KITCHEN_CHANGES_PAGE_SIZE
+        upper = timezone.now() - timedelta(seconds=settings.KITCHEN_CHANGES_SETTLE_SECONDS)
+        since = request.query_params.get('since')
+        
+        if not since:
+            serializer = self.get_serializer(self.get_queryset(), many=True)
+            return Response({
+                'orders': serializer.data,
+                'removed': [],
+                'cursor': encode_cursor(upper, 0),
+                'has_more': False,
+            })
+        
+        try:
+            since_at, since_id = decode_cursor(since)
+        except (TypeError, ValueError, OverflowError):
+            return Response({'error': 'Invalid cursor'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        queryset = self._base_queryset()
+        outlet_id = request.query_params.get('outlet')
+        if outlet_id:
+            queryset = queryset.filter(outlet_id=outlet_id)
+        store_id = request.query_params.get('store')
+        if store_id:
+            queryset = queryset.filter(store_id=store_id)
+        
+        changed = list(
+            queryset.filter(
+                Q(updated_at__gt=since_at) | Q(updated_at=since_at, id__gt=since_id),
+                updated_at__lte=upper
+            ).order_by('updated_at', 'id')[:page_size + 1]
+        )
+        has_more = len(changed) > page_size
+        changed = changed[:page_size]
+        
+        if changed:
+            last = changed[-1]
+            cursor = encode_cursor(last.updated_at, last.id)
+        else:
+            cursor = since
+        
+        orders = [order for order in changed if order.status not in REMOVED_STATUSES]
+        removed = [order.id for order in changed if order.status in REMOVED_STATUSES]
+        
+        serializer = self.get_serializer(orders, many=True)
+        return Response({
+            'orders': serializer.data,
+            'removed': removed,
+            'cursor': cursor,
+            'has_more': has_more,
+        })
+    
+    def _board_scope(self):
+        """
+        Live board scope for this request, or None when the request needs
+        filters the board does not keep (both outlet and store, today_only)
+        """
+        params = self.request.query_params
+        if params.get('today_only', 'false').lower() == 'true':
+            return None
+        outlet_id = params.get('outlet')
+        store_id = params.get('store')
+        if outlet_id and store_id:
+            return None
+        if outlet_id:
+            return ('outlet', outlet_id)
+        if store_id:
+            return ('store', store_id)
+        return None
+    
+    def _absolutize_images(self, tickets):
+        """Board tickets store relative image URLs; build absolute ones once per request"""
+        base = self.request.build_absolute_uri('/')[:-1]
+        for ticket in tickets:
+            for item in ticket['items']:
+                if (item.get('product_image') or '').startswith('/'):
+                    item['product_image'] = base + item['product_image']
+        return tickets
+    
+    def _orders_with_status(self, status_name):
+        """Orders in one status, from the live board when possible"""
+        scope = self._board_scope()
+        if scope:
+            tickets = kitchen_board.read_board(*scope, statuses=[status_name])
+            if tickets is not None:
+                return Response(self._absolutize_images(tickets))
+        
+        queryset = self.get_queryset().filter(status=status_name)
         serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
     
+    @action(detail=False, methods=['get'])
+    def pending(self, request):
+        """Get all pending orders (new orders waiting to be prepared)"""
+        return self._orders_with_status('pending')
+    
     @action(detail=False, methods=['get'])
     def preparing(self, request):
         """Get all orders being prepared"""
-        queryset = self.get_queryset().filter(status='preparing')
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+        return self._orders_with_status('preparing')
     
     @action(detail=False, methods=['get'])
     def ready(self, request):
         """Get all orders ready for pickup/serving"""
-        queryset = self.get_queryset().filter(status='ready')
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+        return self._orders_with_status('ready')
     
-    @action(detail=True, methods=['post'])
-    def start(self, request, pk=None):
+    @action(detail=False, methods=['get'], url_path='all-day')
+    def all_day(self, request):
         """
-        Start preparing an order
-        Transition: pending → preparing
+        Outstanding item quantities per station across open tickets (expo view)
+        e.g. 14 × Ayam Geprek on GRILL
+        
+        GET /api/kitchen/all-day/?store=&station=
+        Served from the live board when scoped to one outlet or store,
+        otherwise one aggregate over the open orders
         """
-        order = self.get_object()
+        station = request.query_params.get('station') or None
+        scope = self._board_scope()
+        if scope:
+            rows = kitchen_board.read_all_day(*scope, station=station)
+            if rows is not None:
+                return Response(rows)
         
-        if order.status != 'pending':
+        items = OrderItem.objects.filter(
+            order__status__in=kitchen_board.ALL_DAY_STATUSES
+        ).exclude(kitchen_status='done')
+        outlet_id = request.query_params.get('outlet')
+        if outlet_id:
+            items = items.filter(order__outlet_id=outlet_id)
+        store_id = request.query_params.get('store')
+        if store_id:
+            items = items.filter(order__store_id=store_id)
+        if station:
+            items = items.filter(kitchen_station_code=station)
+        
+        rows = items.values('kitchen_station_code', 'product_name').annotate(
+            quantity=Sum('quantity')
+        ).order_by('kitchen_station_code', '-quantity', 'product_name')
+        return Response([
+            {'station': row['kitchen_station_code'], 'product_name': row['product_name'], 'quantity': row['quantity']}
+            for row in rows
+        ])
+    
+    def _transition_one(self, action_name, pk, message, note=''):
+        """
+        Run one state machine transition and respond with the updated order
+        The order is only loaded after the conditional UPDATE succeeded
+        """
+        changes = transition(
+            action_name, [pk], note=note,
+            outlet_id=self.request.query_params.get('outlet'),
+            store_id=self.request.query_params.get('store')
+        )
+        if not changes:
+            current_status = self.get_queryset().filter(pk=pk).values_list('status', flat=True).first()
+            if current_status is None:
+                return Response({'detail': 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
             return Response(
-                {'error': f'Cannot start order with status: {order.status}'},
+                {'error': f'Cannot {action_name} order with status: {current_status}'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        order.status = 'preparing'
-        order.save()
-        
+        # Cancelled orders drop out of get_queryset(), so load without its filters
+        order = self._base_queryset().get(pk=pk)
         serializer = self.get_serializer(order)
         
-        # TODO: Broadcast to Socket.IO
-        # emit_order_update(order, 'started')
-        
         return Response({
-            'message': 'Order started',
+            'message': message,
             'order': serializer.data
         })
     
+    @action(detail=True, methods=['post'])
+    def start(self, request, pk=None):
+        """
+        Start preparing an order
+        Transition: pending → preparing
+        """
+        return self._transition_one('start', pk, 'Order started')
+    
     @action(detail=True, methods=['post'])
     def complete(self, request, pk=None):
         """
         Mark order as ready
         Transition: preparing → ready
         """
-        order = self.get_object()
-        
-        if order.status != 'preparing':
-            return Response(
-                {'error': f'Cannot complete order with status: {order.status}'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        order.status = 'ready'
-        order.completed_at = timezone.now()
-        order.save()
-        
-        serializer = self.get_serializer(order)
-        
-        # TODO: Broadcast to Socket.IO
-        # emit_order_update(order, 'ready')
         # TODO: Send customer notification
-        
-        return Response({
-            'message': 'Order marked as ready',
-            'order': serializer.data
-        })
+        return self._transition_one('complete', pk, 'Order marked as ready')
     
     @action(detail=True, methods=['post'])
     def serve(self, request, pk=None):
@@ -145,105 +302,183 @@ class KitchenOrderViewSet(viewsets.ReadOnlyModelViewSet):
         Mark order as served (picked up by customer)
         Transition: ready → served
         """
-        order = self.get_object()
+        return self._transition_one('serve', pk, 'Order marked as served')
+    
+    @action(detail=True, methods=['post'])
+    def cancel(self, request, pk=None):
+        """Cancel an order"""
+        serializer_input = KitchenOrderStatusUpdateSerializer(data=request.data)
+        if not serializer_input.is_valid():
+            return Response(serializer_input.errors, status=status.HTTP_400_BAD_REQUEST)
         
-        if order.status != 'ready':
-            return Response(
-                {'error': f'Cannot serve order with status: {order.status}'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
+        return self._transition_one(
+            'cancel', pk, 'Order cancelled',
+            note=serializer_input.validated_data.get('notes', '')
+        )
+    
+    @action(detail=False, methods=['post'])
+    def bulk_transition(self, request):
+        """
+        Apply one transition to many orders in a single statement (bump bar)
         
-        order.status = 'served'
-        if not order.completed_at:
-            order.completed_at = timezone.now()
-        order.save()
+        Body: {"action": "complete", "order_ids": [1, 2, 3], "notes": ""}
+        Orders that are no longer in a valid source status are skipped and
+        reported with their current status.
+        """
+        serializer_input = KitchenBulkTransitionSerializer(data=request.data)
+        if not serializer_input.is_valid():
+            return Response(serializer_input.errors, status=status.HTTP_400_BAD_REQUEST)
         
-        serializer = self.get_serializer(order)
+        data = serializer_input.validated_data
+        order_ids = set(data['order_ids'])
+        changes = transition(
+            data['action'], order_ids, note=data.get('notes', ''),
+            outlet_id=request.query_params.get('outlet'),
+            store_id=request.query_params.get('store')
+        )
         
-        # TODO: Broadcast to Socket.IO
-        # emit_order_update(order, 'served')
+        moved = {change.order_id for change in changes}
+        skipped = []
+        if len(moved) < len(order_ids):
+            current = dict(
+                Order.objects.filter(id__in=order_ids - moved).values_list('id', 'status')
+            )
+            skipped = [
+                {'id': order_id, 'status': current.get(order_id)}
+                for order_id in sorted(order_ids - moved)
+            ]
         
         return Response({
-            'message': 'Order marked as served',
-            'order': serializer.data
+            'action': data['action'],
+            'transitioned': [
+                {'id': change.order_id, 'order_number': change.order_number,
+                 'old_status': change.old_status, 'status': change.status}
+                for change in changes
+            ],
+            'skipped': skipped,
         })
     
-    @action(detail=True, methods=['post'])
-    def cancel(self, request, pk=None):
-        """Cancel an order"""
-        order = self.get_object()
+    @action(detail=False, methods=['get'])
+    def station_items(self, request):
+        """
+        Items a station still has to make, oldest ticket first
         
-        if order.status in ['completed', 'served', 'cancelled']:
-            return Response(
-                {'error': f'Cannot cancel order with status: {order.status}'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
+        GET /api/kitchen/orders/station_items/?station=GRILL&outlet=1
+        Params:
+        - station: Kitchen station code (required)
+        - outlet / store: Scope
+        - kitchen_status: Comma-separated item statuses (default: queued,cooking)
+        """
+        station = request.query_params.get('station')
+        if not station:
+            return Response({'error': 'station is required'}, status=status.HTTP_400_BAD_REQUEST)
+        statuses = (request.query_params.get('kitchen_status') or 'queued,cooking').split(',')
         
-        serializer_input = KitchenOrderStatusUpdateSerializer(data=request.data)
-        if serializer_input.is_valid():
-            order.status = 'cancelled'
-            if serializer_input.validated_data.get('notes'):
-                order.notes = (order.notes or '') + '\n' + f"Cancelled: {serializer_input.validated_data['notes']}"
-            order.save()
-            
-            serializer = self.get_serializer(order)
-            
-            # TODO: Broadcast to Socket.IO
-            # emit_order_update(order, 'cancelled')
-            
-            return Response({
-                'message': 'Order cancelled',
-                'order': serializer.data
-            })
+        items = OrderItem.objects.select_related('order').filter(
+            order__status__in=ITEM_ORDER_STATUSES,
+            kitchen_station_code=station,
+            kitchen_status__in=statuses,
+        )
+        outlet_id = request.query_params.get('outlet')
+        if outlet_id:
+            items = items.filter(order__outlet_id=outlet_id)
+        store_id = request.query_params.get('store')
+        if store_id:
+            items = items.filter(order__store_id=store_id)
         
-        return Response(serializer_input.errors, status=status.HTTP_400_BAD_REQUEST)
+        items = items.order_by('order__created_at', 'id')
+        serializer = KitchenStationItemSerializer(items, many=True, context={'now': timezone.now()})
+        return Response(serializer.data)
+    
+    @action(detail=False, methods=['post'])
+    def item_transition(self, request):
+        """
+        Station bump: move items between queued, cooking and done
+        
+        Body: {"action": "bump", "order_ids": [1, 2], "station": "GRILL"}
+           or {"action": "start", "item_ids": [10, 11]}
+        Orders roll up automatically: preparing once a station starts an
+        item, ready once every item is done.
+        """
+        serializer_input = KitchenItemTransitionSerializer(data=request.data)
+        if not serializer_input.is_valid():
+            return Response(serializer_input.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        data = serializer_input.validated_data
+        item_changes, order_changes = transition_items(
+            data['action'],
+            item_ids=data.get('item_ids'),
+            order_ids=data.get('order_ids'),
+            station=data.get('station') or None,
+            outlet_id=request.query_params.get('outlet'),
+            store_id=request.query_params.get('store')
+        )
+        
+        return Response({
+            'action': data['action'],
+            'transitioned': [
+                {'id': change.item_id, 'order_id': change.order_id, 'station': change.station,
+                 'old_status': change.old_status, 'status': change.status}
+                for change in item_changes
+            ],
+            'orders': [
+                {'id': change.order_id, 'order_number': change.order_number,
+                 'old_status': change.old_status, 'status': change.status}
+                for change in order_changes
+            ],
+        })
     
     @action(detail=False, methods=['get'])
     def stats(self, request):
-        """Get kitchen statistics for today"""
+        """
+        Get kitchen statistics for today
+        One aggregate query, cached for KITCHEN_STATS_CACHE_TTL seconds per
+        outlet/store so every screen polling stats shares the result
+        """
         outlet_id = request.query_params.get('outlet')
         store_id = request.query_params.get('store')
         
-        today = timezone.now().date()
-        queryset = Order.objects.filter(created_at__date=today)
+        today = timezone.localdate()
+        cache_key = f"kitchen:stats:{today:%Y%m%d}:{outlet_id or '-'}:{store_id or '-'}"
+        try:
+            data = cache.get(cache_key)
+        except Exception:
+            data = None
+        
+        if data is None:
+            data = self._compute_stats(today, outlet_id, store_id)
+            try:
+                cache.set(cache_key, data, settings.KITCHEN_STATS_CACHE_TTL)
+            except Exception:
+                pass  # Cache down: serve the fresh numbers anyway
+        
+        serializer = KitchenStatsSerializer(data)
+        return Response(serializer.data)
+    
+    def _compute_stats(self, today, outlet_id=None, store_id=None):
+        day_start, day_end = day_range(today)
+        queryset = Order.objects.filter(created_at__gte=day_start, created_at__lt=day_end)
         
         if outlet_id:
             queryset = queryset.filter(outlet_id=outlet_id)
         if store_id:
             queryset = queryset.filter(store_id=store_id)
         
-        # Calculate stats
-        pending_count = queryset.filter(status='pending').count()
-        preparing_count = queryset.filter(status='preparing').count()
-        ready_count = queryset.filter(status='ready').count()
-        completed_today = queryset.filter(
-            status__in=['completed', 'served']
-        ).count()
-        total_orders_today = queryset.exclude(status='cancelled').count()
-        
-        # Calculate average prep time (for completed orders)
-        completed_orders = queryset.filter(
-            status__in=['completed', 'served'],
-            completed_at__isnull=False
-        )
-        
-        if completed_orders.exists():
-            total_time = sum([
-                (order.completed_at - order.created_at).total_seconds() / 60
-                for order in completed_orders
-            ])
-            avg_prep_time = total_time / completed_orders.count()
-        else:
-            avg_prep_time = 0.0
+        finished = Q(status__in=['completed', 'served'])
+        timed = finished & Q(completed_at__isnull=False)
+        prep_time = prep_time_expression()
         
-        data = {
-            'pending_count': pending_count,
-            'preparing_count': preparing_count,
-            'ready_count': ready_count,
-            'completed_today': completed_today,
-            'avg_prep_time': round(avg_prep_time, 2),
-            'total_orders_today': total_orders_today,
-        }
+        totals = queryset.aggregate(
+            pending_count=Count('id', filter=Q(status='pending')),
+            preparing_count=Count('id', filter=Q(status='preparing')),
+            ready_count=Count('id', filter=Q(status='ready')),
+            completed_today=Count('id', filter=finished),
+            total_orders_today=Count('id', filter=~Q(status='cancelled')),
+            avg_prep_time=Avg(prep_time, filter=timed),
+            p50_prep_time=PercentileCont(prep_time, 0.5, filter=timed),
+            p90_prep_time=PercentileCont(prep_time, 0.9, filter=timed),
+        )
         
-        serializer = KitchenStatsSerializer(data)
-        return Response(serializer.data)
+        for key in ('avg_prep_time', 'p50_prep_time', 'p90_prep_time'):
+            totals[key] = duration_minutes(totals[key])
+        return totals
@@ -10,6 +10,9 @@ from django.shortcuts import get_object_or_404
 from decimal import Decimal
 
 from apps.orders.models import OrderGroup, Order, OrderItem
+from apps.orders import wait_times
+from apps.orders.pressure import check_available
+from apps.orders.routing import route_items
 from apps.orders.serializers import (
     OrderGroupSerializer, 
     OrderGroupCreateSerializer,
@@ -18,14 +21,7 @@ from apps.orders.serializers import (
 from apps.tenants.models import Outlet, Store
 from apps.products.models import Product
 from apps.core.permissions import IsManagerOrAbove
-
-# Real-time broadcasting
-try:
-    from apps.realtime.utils import broadcast_new_order
-    REALTIME_ENABLED = True
-except ImportError:
-    REALTIME_ENABLED = False
-    print('[WARNING] apps.realtime not available - real-time broadcasting disabled')
+from apps.core.idempotency import idempotent
 
 
 class PublicOrderGroupViewSet(viewsets.ModelViewSet):
@@ -46,6 +42,7 @@ class PublicOrderGroupViewSet(viewsets.ModelViewSet):
             return OrderGroupCreateSerializer
         return OrderGroupSerializer
     
+    @idempotent('order-group')
     @transaction.atomic
     def create(self, request, *args, **kwargs):
         """
@@ -53,6 +50,10 @@ class PublicOrderGroupViewSet(viewsets.ModelViewSet):
         
         POST /api/public/order-groups/
         
+        Headers:
+        - Idempotency-Key: unique per cart; retries replay the original 201 response
+        - X-Device-ID: kiosk device (idempotency keys are scoped per device)
+        
         Request body:
         {
             "store_id": 1,
@@ -116,6 +117,7 @@ class PublicOrderGroupViewSet(viewsets.ModelViewSet):
             )
             
             # Create Order Items
+            items = []
             for item_data in cart['items']:
                 # Use all_objects to bypass tenant filtering for public API
                 product = get_object_or_404(
@@ -131,7 +133,7 @@ class PublicOrderGroupViewSet(viewsets.ModelViewSet):
                 for mod in modifiers:
                     modifiers_price += Decimal(str(mod.get('price', 0)))
                 
-                OrderItem.objects.create(
+                items.append(OrderItem(
                     order=order,
                     product=product,
                     product_name=product.name,
@@ -140,49 +142,35 @@ class PublicOrderGroupViewSet(viewsets.ModelViewSet):
                     unit_price=product.price,
                     modifiers=modifiers,
                     modifiers_price=modifiers_price,
-                    kitchen_station_code=product.kitchen_station_code,  # Snapshot
+                    kitchen_station_code=product.kitchen_station_code,  # Station type; routed below
                     notes=item_data.get('notes', '')
-                )
+                ))
+            
+            # Stations past their pause limit take no new work
+            check_available(outlet.id, [item.product for item in items])
+
+            # Spread items over duplicate stations by queue load
+            route_items(outlet.id, items)
+            wait_times.quote_orders(outlet.id, [(order, items)])
+            for item in items:
+                item.save()
             
             # Calculate order totals
             order.calculate_totals()
             created_orders.append(order)
             
-            # Broadcast new order to real-time channels
-            if REALTIME_ENABLED:
-                try:
-                    order_data = {
-                        'id': order.id,
-                        'order_number': order.order_number,
-                        'outlet_id': outlet.id,
-                        'tenant_id': outlet.tenant.id,
-                        'status': order.status,
-                        'customer_name': order.customer_name,
-                        'customer_phone': order.customer_phone,
-                        'total_amount': str(order.total_amount),
-                        'created_at': order.created_at.isoformat(),
-                        'items': [
-                            {
-                                'product_name': item.product_name,
-                                'quantity': item.quantity,
-                                'unit_price': str(item.unit_price),
-                                'kitchen_station_code': item.kitchen_station_code,
-                            }
-                            for item in order.items.all()
-                        ]
-                    }
-                    broadcast_new_order(order_data)
-                    print(f'[Broadcast] New order {order.order_number} to outlet {outlet.id}')
-                except Exception as e:
-                    print(f'[ERROR] Failed to broadcast order: {e}')
+            # new_order is recorded in the outbox by the post_save signal and
+            # delivered to Channels / sync server after commit
         
         # Calculate order group total
         order_group.calculate_total()
         
         # Return created order group with all orders
         response_serializer = OrderGroupSerializer(order_group)
+        data = response_serializer.data
+        data['estimated_ready_at'] = wait_times.add_estimates(data['orders'], created_orders)
         return Response(
-            response_serializer.data,
+            data,
             status=status.HTTP_201_CREATED
         )
     
@@ -0,0 +1,135 @@
+"""
+Kitchen ticket printing API for print agents
+
+Agents next to the station printers pull tickets rendered as ESC/POS:
+
+    POST /api/kitchen/print-jobs/lease/      due tickets of some stations
+    POST /api/kitchen/print-jobs/{id}/ack/   printed / failed
+    GET  /api/kitchen/print-jobs/{id}/raw/   ticket bytes (application/octet-stream)
+    POST /api/kitchen/print-jobs/reprint/    copy an order's tickets
+
+Leased tickets come with their bytes base64-encoded, so a lease is one
+round trip. See apps.orders.printing for the job lifecycle.
+"""
+import base64
+
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
+from rest_framework import status, viewsets
+from rest_framework.decorators import action
+from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
+
+from apps.orders import printing
+from apps.orders.models import Order, PrintJob
+from apps.orders.serializers_kitchen import (
+    PrintJobAckSerializer,
+    PrintJobLeaseSerializer,
+    PrintJobReprintSerializer,
+    PrintJobSerializer
+)
+
+
+class PrintJobViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Print jobs of kitchen stations
+    List filters: ?outlet=<id>&station=<code>&status=<status>
+    """
+    serializer_class = PrintJobSerializer
+    permission_classes = [AllowAny]  # TODO: Add authentication for production
+    
+    def get_queryset(self):
+        queryset = PrintJob.objects.select_related('order').defer('content').order_by('-id')
+        outlet_id = self.request.query_params.get('outlet')
+        if outlet_id:
+            queryset = queryset.filter(outlet_id=outlet_id)
+        station = self.request.query_params.get('station')
+        if station:
+            queryset = queryset.filter(station=station)
+        job_status = self.request.query_params.get('status')
+        if job_status:
+            queryset = queryset.filter(status=job_status)
+        return queryset
+    
+    @action(detail=False, methods=['post'])
+    def lease(self, request):
+        """
+        Lease due tickets
+        
+        Body: {"outlet_id": 1, "stations": ["GRILL-1", "GRILL-2"], "agent_id": "printer-grill"}
+        Each job must be acked with its lease_token before the lease runs out
+        (lease_seconds, default PRINT_LEASE_SECONDS) or it is handed out again.
+        """
+        serializer_input = PrintJobLeaseSerializer(data=request.data)
+        if not serializer_input.is_valid():
+            return Response(serializer_input.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        data = serializer_input.validated_data
+        jobs = printing.lease(
+            data['outlet_id'], data['stations'],
+            agent_id=data['agent_id'],
+            limit=data['limit'],
+            lease_seconds=data.get('lease_seconds')
+        )
+        return Response({
+            'jobs': [
+                {
+                    'id': job.id,
+                    'order_id': job.order_id,
+                    'order_number': job.order.order_number,
+                    'station': job.station,
+                    'reprint': job.reprint_of_id is not None,
+                    'lease_token': job.lease_token,
+                    'lease_expires_at': job.available_at,
+                    'content': base64.b64encode(bytes(job.content)).decode('ascii'),
+                }
+                for job in jobs
+            ]
+        })
+    
+    @action(detail=True, methods=['post'])
+    def ack(self, request, pk=None):
+        """
+        Report a leased ticket as printed or failed
+        
+        Body: {"lease_token": "...", "success": false, "error": "paper out"}
+        409 if the lease ran out and the job was handed to another agent.
+        """
+        serializer_input = PrintJobAckSerializer(data=request.data)
+        if not serializer_input.is_valid():
+            return Response(serializer_input.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        data = serializer_input.validated_data
+        job = printing.ack(pk, data['lease_token'], success=data['success'], error=data['error'])
+        if job is None:
+            return Response({'error': 'Lease expired or unknown'}, status=status.HTTP_409_CONFLICT)
+        return Response(PrintJobSerializer(job).data)
+    
+    @action(detail=True, methods=['get'])
+    def raw(self, request, pk=None):
+        """Ticket bytes, for agents that stream straight to the printer"""
+        job = get_object_or_404(PrintJob.objects.only('id', 'content'), pk=pk)
+        return HttpResponse(bytes(job.content), content_type='application/octet-stream')
+    
+    @action(detail=False, methods=['post'])
+    def reprint(self, request):
+        """
+        Queue copies of an order's tickets from the stored bytes
+        
+        Body: {"order_id": 1, "station": "GRILL"}  (station optional)
+        """
+        serializer_input = PrintJobReprintSerializer(data=request.data)
+        if not serializer_input.is_valid():
+            return Response(serializer_input.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        data = serializer_input.validated_data
+        order = get_object_or_404(Order, pk=data['order_id'])
+        jobs = printing.reprint(order, station=data.get('station') or None)
+        if not jobs:
+            return Response(
+                {'error': 'No tickets printed for this order yet'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        for job in jobs:
+            job.order = order
+        return Response(PrintJobSerializer(jobs, many=True).data, status=status.HTTP_201_CREATED)
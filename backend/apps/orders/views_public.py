@@ -0,0 +1,53 @@
+"""
+Public order tracking and pickup board endpoints
+
+    GET /api/public/track/<order or group number>/
+    GET /api/public/pickup-board/<store id>/
+
+Both are served from the Redis read model in apps.orders.tracking, as plain
+Django views (no DRF negotiation or authentication), with a short shared
+cache lifetime and an ETag so pollers and CDNs can revalidate cheaply.
+"""
+import hashlib
+import json
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified, JsonResponse
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import require_GET
+from rest_framework.utils.encoders import JSONEncoder
+
+from apps.orders import tracking
+
+
+def _cacheable(request, data):
+    """JSON response with Cache-Control and ETag; 304 when the client is current"""
+    body = json.dumps(data, cls=JSONEncoder, separators=(',', ':'))
+    etag = f'"{hashlib.md5(body.encode()).hexdigest()}"'
+    if request.headers.get('If-None-Match') == etag:
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(body, content_type='application/json')
+    response['ETag'] = etag
+    patch_cache_control(response, public=True, max_age=settings.PUBLIC_TRACK_MAX_AGE)
+    return response
+
+
+@require_GET
+def track_order(request, number):
+    """Status, items and estimated ready time of an order or order group"""
+    data = tracking.track(number)
+    if data is None:
+        response = JsonResponse({'error': 'Order not found'}, status=404)
+        patch_cache_control(response, public=True, max_age=settings.PUBLIC_TRACK_MAX_AGE)
+        return response
+    return _cacheable(request, data)
+
+
+@require_GET
+def pickup_board(request, store_id):
+    """Queue numbers being prepared and ready for pickup at a store"""
+    data = tracking.pickup_board(store_id)
+    if data is None:
+        return JsonResponse({'error': 'Pickup board temporarily unavailable'}, status=503)
+    return _cacheable(request, data)
@@ -12,8 +12,10 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 
-from apps.orders.models import Order, OrderItem
+from apps.orders import sla
+from apps.orders.models import KitchenSLABucket, Order, OrderItem
 from apps.products.models import Product, Category
+from apps.tenants.models import Outlet
 from apps.users.models import User
 from apps.core.permissions import IsAdminOrTenantOwnerOrManager
 
@@ -35,6 +37,7 @@ class ReportsViewSet(viewsets.ViewSet):
     - GET /api/admin/reports/revenue_trend/ - Revenue trend over time
     - GET /api/admin/reports/payment_methods/ - Payment method breakdown
     - GET /api/admin/reports/hourly_sales/ - Sales by hour of day
+    - GET /api/admin/reports/kitchen_sla/ - Kitchen wait/prep time percentiles
     """
     permission_classes = [IsAuthenticated, IsAdminOrTenantOwnerOrManager]
     
@@ -484,3 +487,43 @@ class ReportsViewSet(viewsets.ViewSet):
             }
         
         return Response({'data': results})
+    
+    @action(detail=False, methods=['get'])
+    def kitchen_sla(self, request):
+        """
+        Kitchen wait/prep time percentiles (minutes) per station
+        Merges hourly SLA sketches, so long ranges cost no more than a day
+        
+        GET /api/admin/reports/kitchen_sla/?period=90days&metric=prep&group_by=day
+        Params:
+        - outlet: Restrict to one outlet (default: all accessible outlets, merged)
+        - metric: wait | prep | total (default: all)
+        - station: Kitchen station code (default: every station plus whole orders)
+        - group_by: day | hour (hour of day) (default: whole range)
+        """
+        start_date, end_date = self.get_date_range(request)
+        
+        metric = request.query_params.get('metric') or None
+        if metric and metric not in dict(KitchenSLABucket.METRIC_CHOICES):
+            return Response({'error': f'Invalid metric: {metric}'}, status=status.HTTP_400_BAD_REQUEST)
+        group_by = request.query_params.get('group_by') or None
+        if group_by not in (None, 'day', 'hour'):
+            return Response({'error': f'Invalid group_by: {group_by}'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        outlets = self.get_queryset_for_user(Outlet)
+        outlet_id = request.query_params.get('outlet')
+        if outlet_id:
+            outlets = outlets.filter(id=outlet_id)
+        
+        results = sla.percentiles(
+            list(outlets.values_list('id', flat=True)), start_date, end_date,
+            metric=metric,
+            station=request.query_params.get('station'),
+            group_by=group_by,
+        )
+        
+        return Response({
+            'start_date': start_date.isoformat(),
+            'end_date': end_date.isoformat(),
+            'data': results
+        })
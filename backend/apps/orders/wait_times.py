@@ -0,0 +1,325 @@
+"""
+Wait-time estimates for kiosk and pickup screens
+
+Each outlet's open work is kept in Redis as a nominal backlog per kitchen
+station: minutes of Product.preparation_time still queued or cooking.
+Observed kitchen speed is learnt as a ratio of actual to nominal time
+(exponentially weighted, per outlet), so:
+
+    estimated ready = now + ratio * max over the order's stations of
+                      (backlog ahead at that station + the order's own work)
+
+    pos:eta:orders                     HASH order id -> estimated ready (epoch)
+    pos:eta:nominal                    HASH order id -> nominal minutes when quoted
+    pos:eta:ratio                      HASH outlet id -> actual / nominal
+    pos:eta:outlet:<id>:stations       HASH station code -> nominal backlog, '_at' -> epoch
+
+The backlog and the estimate of every open order of an outlet are
+recomputed by a Celery task (one aggregate over the outlet's open items),
+and the new backlog is checked against station limits (see pressure.py).
+Commits that create or move an outlet's orders or items schedule that task
+KITCHEN_ETA_RECOMPUTE_DELAY seconds ahead; commits arriving before it runs
+ride along with it, so a busy outlet is aggregated about once per delay
+instead of once per bump. Quotes add their own work to the station backlog
+right away, so orders placed in between are not quoted against a stale
+queue. Quoting a new order and reading an estimate only touch these hashes.
+
+    pos:eta:outlet:<id>:scheduled      recompute task pending (debounce)
+"""
+import logging
+import math
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+from rest_framework import serializers
+
+from apps.core.transactions import collect_on_commit
+from apps.orders import pressure
+from apps.orders.models import OrderItem
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'pos:eta'
+ORDERS_KEY = f'{KEY_PREFIX}:orders'
+NOMINAL_KEY = f'{KEY_PREFIX}:nominal'
+RATIO_KEY = f'{KEY_PREFIX}:ratio'
+
+KEY_TTL = 60 * 60 * 24
+
+# Orders and items that still hold kitchen time
+OPEN_ORDER_STATUSES = ('pending', 'preparing')
+OPEN_ITEM_STATUSES = ('queued', 'cooking')
+FINISHED_STATUSES = ('ready', 'served', 'completed')
+
+# Learning the actual / nominal ratio
+RATIO_ALPHA = 0.2
+RATIO_MIN = 0.25
+RATIO_MAX = 4.0
+DEFAULT_RATIO = 1.0
+
+# A scheduled recompute whose task never ran stops holding back new ones after this long
+SCHEDULED_GRACE = 30
+
+
+# Formats estimates exactly like the declared datetime fields
+_datetime = serializers.DateTimeField()
+
+
+def _redis():
+    return get_redis_connection('default')
+
+
+def _stations_key(outlet_id):
+    return f'{KEY_PREFIX}:outlet:{outlet_id}:stations'
+
+
+def _scheduled_key(outlet_id):
+    return f'{KEY_PREFIX}:outlet:{outlet_id}:scheduled'
+
+
+def _ratio(conn, outlet_id):
+    value = conn.hget(RATIO_KEY, outlet_id)
+    return float(value) if value is not None else DEFAULT_RATIO
+
+
+def _to_datetime(epoch):
+    return datetime.fromtimestamp(epoch, tz=dt_timezone.utc)
+
+
+# ============================================================================
+# Recompute (after commit)
+# ============================================================================
+
+def recompute_outlet(outlet_id):
+    """
+    Rebuild the station backlog and the estimates of an outlet's open orders
+    Stations work first come, first served; cooking items count what is left
+    """
+    now = time.time()
+    rows = OrderItem.objects.filter(
+        order__outlet_id=outlet_id,
+        order__status__in=OPEN_ORDER_STATUSES,
+        kitchen_status__in=OPEN_ITEM_STATUSES,
+    ).order_by('order__created_at', 'order_id', 'id').values_list(
+        'order_id', 'kitchen_station_code', 'kitchen_status', 'kitchen_status_at',
+        'quantity', 'product__preparation_time'
+    )
+
+    conn = _redis()
+    ratio = _ratio(conn, outlet_id)
+    backlog = {}
+    finish = {}
+    for order_id, station, item_status, status_at, quantity, prep_time in rows:
+        work = quantity * (prep_time or 0)
+        if item_status == 'cooking' and status_at:
+            work = max(work - (now - status_at.timestamp()) / 60 / ratio, 0)
+        backlog[station] = backlog.get(station, 0) + work
+        finish[order_id] = max(finish.get(order_id, 0), backlog[station])
+
+    pipe = conn.pipeline(transaction=False)
+    if finish:
+        pipe.hset(ORDERS_KEY, mapping={
+            order_id: round(now + ratio * minutes * 60) for order_id, minutes in finish.items()
+        })
+        pipe.expire(ORDERS_KEY, KEY_TTL)
+    pipe.delete(_stations_key(outlet_id))
+    pipe.hset(_stations_key(outlet_id), mapping={**{code: round(work, 2) for code, work in backlog.items()}, '_at': now})
+    pipe.expire(_stations_key(outlet_id), KEY_TTL)
+    pipe.execute()
+
+    pressure.evaluate(outlet_id, backlog, ratio)
+
+
+def _recompute_outlets(outlet_ids):
+    for outlet_id in outlet_ids:
+        try:
+            recompute_outlet(outlet_id)
+        except RedisError as e:
+            logger.warning(f"Wait-time refresh failed for outlet {outlet_id}: {e}")
+
+
+def recompute_scheduled(outlet_id):
+    """
+    Run a scheduled recompute (Celery task)
+    The schedule is cleared first, so commits made while it runs schedule the next one
+    """
+    _redis().delete(_scheduled_key(outlet_id))
+    recompute_outlet(outlet_id)
+
+
+def _schedule_recompute(outlet_ids):
+    """Schedule a recompute for each outlet that has none pending"""
+    from apps.orders.tasks import recompute_wait_times
+
+    outlet_ids = sorted(outlet_ids)
+    delay = settings.KITCHEN_ETA_RECOMPUTE_DELAY
+    try:
+        conn = _redis()
+        pipe = conn.pipeline(transaction=False)
+        for outlet_id in outlet_ids:
+            pipe.set(_scheduled_key(outlet_id), 1, nx=True, ex=math.ceil(delay) + SCHEDULED_GRACE)
+        claimed = [outlet_id for outlet_id, new in zip(outlet_ids, pipe.execute()) if new]
+    except RedisError as e:
+        logger.warning(f"Wait-time refresh skipped for outlets {outlet_ids}: {e}")
+        return
+
+    for outlet_id in claimed:
+        try:
+            recompute_wait_times.apply_async([outlet_id], countdown=delay)
+        except Exception as e:
+            # Broker down: refresh in this process rather than leave the outlet stale
+            logger.warning(f"Could not schedule wait-time refresh for outlet {outlet_id}: {e}")
+            conn.delete(_scheduled_key(outlet_id))
+            _recompute_outlets([outlet_id])
+
+
+def schedule_refresh(outlet_ids):
+    """Recompute estimates of these outlets shortly after the current transaction commits"""
+    collect_on_commit(_schedule_recompute, [outlet_id for outlet_id in outlet_ids if outlet_id])
+
+
+def learn(changes):
+    """
+    Fold orders that just became ready into their outlet's speed ratio and
+    drop estimates of orders that left the kitchen
+    Args: changes: StatusChange records
+    """
+    done = [change for change in changes if change.status not in OPEN_ORDER_STATUSES]
+    if not done:
+        return
+    order_ids = [change.order_id for change in done]
+    try:
+        conn = _redis()
+        quoted = dict(zip(order_ids, conn.hmget(NOMINAL_KEY, order_ids)))
+        for change in done:
+            value = quoted.get(change.order_id)
+            if change.status != 'ready' or value is None or not change.changed_at:
+                continue
+            created_ts, nominal = (float(part) for part in value.split(b':'))
+            if nominal < 1:
+                continue
+            sample = (change.changed_at.timestamp() - created_ts) / 60 / nominal
+            ratio = _ratio(conn, change.outlet_id)
+            ratio = (1 - RATIO_ALPHA) * ratio + RATIO_ALPHA * sample
+            conn.hset(RATIO_KEY, change.outlet_id, round(min(max(ratio, RATIO_MIN), RATIO_MAX), 4))
+        conn.hdel(ORDERS_KEY, *order_ids)
+        conn.hdel(NOMINAL_KEY, *order_ids)
+    except RedisError as e:
+        logger.warning(f"Wait-time learning failed: {e}")
+
+
+# ============================================================================
+# Quotes and reads (request path, constant time)
+# ============================================================================
+
+def quote_orders(outlet_id, orders_items):
+    """
+    Estimate new orders of one outlet and remember the quotes
+
+    Args:
+        outlet_id: Outlet the orders were placed at
+        orders_items: list of (order, items) in queue order; items are routed
+            OrderItems with product loaded, not yet saved; orders have ids
+    Returns: dict of order id -> estimated ready datetime (empty if Redis is down)
+    """
+    try:
+        conn = _redis()
+        raw = conn.hgetall(_stations_key(outlet_id))
+        if not raw:
+            # First order of the day (or keys expired): read the backlog once.
+            # Quote before inserting the new items so they are not counted twice.
+            recompute_outlet(outlet_id)
+            raw = conn.hgetall(_stations_key(outlet_id))
+        ratio = _ratio(conn, outlet_id)
+    except RedisError as e:
+        logger.warning(f"Wait-time quote unavailable: {e}")
+        return {}
+
+    now = time.time()
+    stored = {key.decode(): float(value) for key, value in raw.items()}
+    elapsed = (now - stored.pop('_at', now)) / 60 / ratio
+    backlog = {code: max(work - elapsed, 0) for code, work in stored.items()}
+
+    estimates = {}
+    nominal = {}
+    added = {}
+    for order, items in orders_items:
+        minutes = 0
+        for item in items:
+            station = item.kitchen_station_code
+            work = item.quantity * (item.product.preparation_time or 0)
+            backlog[station] = backlog.get(station, 0) + work
+            added[station] = added.get(station, 0) + work
+            minutes = max(minutes, backlog[station])
+        estimates[order.id] = now + ratio * minutes * 60
+        nominal[order.id] = f"{order.created_at.timestamp() if order.created_at else now}:{round(minutes, 2)}"
+
+    try:
+        pipe = conn.pipeline(transaction=False)
+        pipe.hset(ORDERS_KEY, mapping={order_id: round(epoch) for order_id, epoch in estimates.items()})
+        pipe.hset(NOMINAL_KEY, mapping=nominal)
+        # Next quotes see this work before the scheduled recompute lands
+        for station, work in added.items():
+            if work:
+                pipe.hincrbyfloat(_stations_key(outlet_id), station, round(work, 2))
+        pipe.expire(ORDERS_KEY, KEY_TTL)
+        pipe.expire(NOMINAL_KEY, KEY_TTL)
+        pipe.execute()
+    except RedisError as e:
+        logger.warning(f"Could not store wait-time quotes: {e}")
+    return {order_id: _to_datetime(epoch) for order_id, epoch in estimates.items()}
+
+
+def estimates_for(orders):
+    """
+    Estimated ready time of each order (one HMGET)
+    Finished orders report when they became ready; cancelled and draft
+    orders, and orders without an estimate, report None
+    Returns: dict of order id -> datetime or None
+    """
+    result = {}
+    pending = []
+    for order in orders:
+        if order.status in FINISHED_STATUSES:
+            result[order.id] = order.completed_at
+        elif order.status in OPEN_ORDER_STATUSES:
+            pending.append(order.id)
+        else:
+            result[order.id] = None
+    if pending:
+        result.update(estimates_by_id(pending))
+    return result
+
+
+def estimates_by_id(order_ids):
+    """
+    Stored estimates of open orders (one HMGET)
+    Returns: dict of order id -> datetime or None
+    """
+    try:
+        values = _redis().hmget(ORDERS_KEY, order_ids)
+    except RedisError as e:
+        logger.warning(f"Wait-time estimates unavailable: {e}")
+        values = [None] * len(order_ids)
+    now = time.time()
+    # Overdue orders are expected any moment, never in the past
+    return {
+        order_id: _to_datetime(max(int(value), now)) if value is not None else None
+        for order_id, value in zip(order_ids, values)
+    }
+
+
+def add_estimates(rows, orders):
+    """
+    Set 'estimated_ready_at' on serialized orders (dicts with 'id')
+    Returns: the latest estimate of the batch, formatted, or None
+    """
+    estimates = estimates_for(orders)
+    for row in rows:
+        value = estimates.get(row['id'])
+        row['estimated_ready_at'] = _datetime.to_representation(value) if value else None
+    known = [value for value in estimates.values() if value]
+    return _datetime.to_representation(max(known)) if known else None
@@ -2,11 +2,12 @@
 Payment models untuk payment processing
 """
 from django.db import models
+from apps.core.models import TrackedFieldsModel
 from apps.orders.models import Order
-import uuid
+from apps.orders.numbering import allocate_transaction_ids
 
 
-class Payment(models.Model):
+class Payment(TrackedFieldsModel):
     """
     Payment transaction
     """
@@ -70,11 +71,8 @@ class Payment(models.Model):
     
     def save(self, *args, **kwargs):
         if not self.transaction_id:
-            # Generate transaction ID: PAY-YYYYMMDDHHMMSS-XXXX
-            from datetime import datetime
-            date_str = datetime.now().strftime('%Y%m%d%H%M%S')
-            random_str = str(uuid.uuid4().hex[:4]).upper()
-            self.transaction_id = f"PAY-{date_str}-{random_str}"
+            # Generate transaction ID: PAY-YYYYMMDD-<outlet>-NNNN
+            self.transaction_id = allocate_transaction_ids(self.order.outlet_id)[0]
         super().save(*args, **kwargs)
 
 
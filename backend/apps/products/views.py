@@ -4,6 +4,7 @@ Views for Product API
 from rest_framework import viewsets, filters
 from rest_framework.permissions import AllowAny
 from django_filters.rest_framework import DjangoFilterBackend
+from apps.orders.pressure import apply_to_menu
 from .models import Category, Product
 from .serializers import CategorySerializer, ProductSerializer
 
@@ -68,3 +69,18 @@ class ProductViewSet(viewsets.ReadOnlyModelViewSet):
             queryset = queryset.filter(category_id=category_id)
         
         return queryset
+    
+    def list(self, request, *args, **kwargs):
+        """
+        Products with live kitchen pressure: items of paused stations show as
+        unavailable, busy ones carry kitchen_wait_minutes
+        """
+        response = super().list(request, *args, **kwargs)
+        rows = response.data.get('results', []) if isinstance(response.data, dict) else response.data
+        apply_to_menu(rows)
+        return response
+    
+    def retrieve(self, request, *args, **kwargs):
+        response = super().retrieve(request, *args, **kwargs)
+        apply_to_menu([response.data])
+        return response
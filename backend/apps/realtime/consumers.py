@@ -2,132 +2,401 @@
 Django Channels Consumers for Real-time Updates
 """
 import json
-from channels.generic.websocket import AsyncWebsocketConsumer
+import logging
+import time
+from collections import deque
+from urllib.parse import parse_qs
+
+import msgpack
 from channels.db import database_sync_to_async
-from django.contrib.auth.models import AnonymousUser
+from channels.generic.websocket import AsyncWebsocketConsumer
+from django.conf import settings
+
+from apps.realtime import frames, history, presence
+from apps.realtime.topics import MAX_TOPICS_PER_SOCKET, topic_group
+from apps.tenants.models import StoreOutlet
+
+logger = logging.getLogger(__name__)
+
+# Recent event ids remembered per socket to drop repeats (one event can
+# reach a socket through several of its topics)
+SEEN_EVENTS = 256
+
+
+@database_sync_to_async
+def store_of_outlet(outlet_id):
+    return StoreOutlet.objects.filter(outlet_id=outlet_id).values_list('store_id', flat=True).first()
 
 
 class OrderConsumer(AsyncWebsocketConsumer):
     """
     WebSocket consumer for real-time order updates
-    Clients subscribe to outlet-specific channels
+
+    One socket can follow several topics (see apps.realtime.topics):
+        ws/outlet/<id>/                  outlet:<id>
+        ws/outlet/<id>/station/<code>/   outlet:<id> and station:<id>:<code>
+        ws/realtime/?topics=store:1,station:3:GRILL
+
+    and change them without reconnecting:
+        {"type": "subscribe", "topics": ["store:1"]}
+        {"type": "unsubscribe", "topics": ["outlet:3"]}
+
+    Events carry their topic and its sequence number ('topic', 'seq'). An
+    event that reached the socket through several topics is sent once, with
+    'seqs': {topic: seq} for each of them (a replayed copy that was already
+    sent only moves its topic: {"type": "position", "topic", "seq"}). A
+    client that reconnects passes the last seq it saw per topic and gets
+    what it missed replayed, or a 'snapshot' frame when the gap is too large
+    (see apps.realtime.history):
+        ws/outlet/3/?resume_from=120                     first topic of the socket
+        ws/realtime/?topics=...&resume_from=outlet:3:120,station:3:GRILL:45
+        {"type": "subscribe", "topics": [...], "resume_from": {"outlet:3": 120}}
+
+    Event frames are encoded once when published (apps.realtime.frames) and
+    sent as they are. ?format=msgpack switches the socket to MessagePack
+    binary messages; what clients send stays JSON.
+
+    Kiosks and kitchen screens that identify themselves are tracked in the
+    presence registry (apps.realtime.presence) and should ping every 30s:
+        ws/outlet/3/?device_id=KDS-01&role=kitchen&app_version=2.3.1[&store_id=1]
     """
 
     async def connect(self):
         """
         Called when WebSocket connection is established
         """
-        # Get outlet_id from URL route
-        self.outlet_id = self.scope['url_route']['kwargs'].get('outlet_id')
-        
-        if not self.outlet_id:
-            await self.close(code=4000)
-            return
+        kwargs = self.scope['url_route']['kwargs']
+        self.outlet_id = kwargs.get('outlet_id')
+        self.station = kwargs.get('station')
+        self.topics = {}
+        self.group_topics = {}
+        self.positions = {}
+        self._seen = deque(maxlen=SEEN_EVENTS)
+        self.device = None
 
-        # Create room group name
-        self.room_group_name = f'outlet_{self.outlet_id}'
+        query = parse_qs(self.scope.get('query_string', b'').decode())
+        self.compact = query.get('format', ['json'])[0] == 'msgpack'
 
-        # Join room group
-        await self.channel_layer.group_add(
-            self.room_group_name,
-            self.channel_name
-        )
+        topics = []
+        if self.outlet_id:
+            topics.append(f'outlet:{self.outlet_id}')
+            if self.station:
+                topics.append(f'station:{self.outlet_id}:{self.station}')
+        for value in query.get('topics', []):
+            topics += [topic for topic in value.split(',') if topic]
 
+        if not topics:
+            await self.close(code=4000)
+            return
+
+        resume_from = self._parse_resume(query.get('resume_from', []), topics[0])
         await self.accept()
+        subscribed, invalid, starts = await self._subscribe(topics, resume_from)
+        await self._register_device(query)
 
         # Send confirmation message
-        await self.send(text_data=json.dumps({
+        await self._send_json({
             'type': 'connection.established',
-            'message': f'Connected to outlet {self.outlet_id} real-time channel',
-            'outlet_id': self.outlet_id
-        }))
-
-        print(f'[Channels] Client connected to outlet {self.outlet_id} (channel: {self.channel_name})')
+            'message': f'Connected to {len(subscribed)} real-time topic(s)',
+            'outlet_id': self.outlet_id,
+            'topics': sorted(self.topics),
+            'invalid': invalid,
+        })
+        await self._catch_up(starts)
+        logger.debug('realtime socket connected', extra={'channel': self.channel_name, 'topics': sorted(self.topics)})
 
     async def disconnect(self, close_code):
         """
         Called when WebSocket connection is closed
         """
-        # Leave room group
-        if hasattr(self, 'room_group_name'):
-            await self.channel_layer.group_discard(
-                self.room_group_name,
-                self.channel_name
+        for group in getattr(self, 'topics', {}).values():
+            await self.channel_layer.group_discard(group, self.channel_name)
+        if getattr(self, 'device', None):
+            await database_sync_to_async(presence.unregister)(
+                self.device['device_id'], self.channel_name, self.device['store_id']
+            )
+        logger.debug('realtime socket closed', extra={'channel': self.channel_name, 'code': close_code})
+
+    @staticmethod
+    def _parse_resume(values, default_topic):
+        """resume_from query values ('<seq>' or '<topic>:<seq>' lists) -> {topic: seq}"""
+        positions = {}
+        for value in values:
+            for part in value.split(','):
+                topic, _, seq = part.rpartition(':')
+                if seq.isdigit():
+                    positions[topic or default_topic] = int(seq)
+        return positions
+
+    async def _subscribe(self, topics, resume_from=None):
+        """
+        Join the groups of valid topics, up to MAX_TOPICS_PER_SOCKET
+        Returns: (topics added, topics rejected, {topic: seq to catch up from})
+
+        New topics without a resume position start from the seq read just
+        before joining, so events sent while joining are caught up too
+        """
+        resume_from = resume_from or {}
+        added, invalid = [], []
+        for topic in topics:
+            if topic in self.topics:
+                continue
+            try:
+                group = topic_group(topic)
+            except ValueError:
+                invalid.append(topic)
+                continue
+            if len(self.topics) + len(added) >= MAX_TOPICS_PER_SOCKET:
+                invalid.append(topic)
+                continue
+            added.append(topic)
+
+        groups = {topic: topic_group(topic) for topic in added}
+        current = await database_sync_to_async(history.last_seqs)(
+            [groups[topic] for topic in added if topic not in resume_from]
+        ) or {}
+        starts = {}
+        for topic in added:
+            group = groups[topic]
+            await self.channel_layer.group_add(group, self.channel_name)
+            self.topics[topic] = group
+            self.group_topics[group] = topic
+            if topic in resume_from:
+                starts[topic] = resume_from[topic]
+            elif group in current:
+                starts[topic] = current[group]
+        return added, invalid, starts
+
+    async def _unsubscribe(self, topics):
+        removed = []
+        for topic in topics:
+            group = self.topics.pop(topic, None)
+            if group:
+                await self.channel_layer.group_discard(group, self.channel_name)
+                self.group_topics.pop(group, None)
+                self.positions.pop(topic, None)
+                removed.append(topic)
+        return removed
+
+    async def _register_device(self, query):
+        """Record the device behind this socket, if it sent a device_id"""
+        device_id = query.get('device_id', [''])[0][:50]
+        if not device_id:
+            return
+        store_id = query.get('store_id', [''])[0]
+        if store_id.isdigit():
+            store_id = int(store_id)
+        else:
+            store_id = next(
+                (int(topic.split(':')[1]) for topic in self.topics if topic.startswith('store:')),
+                None
+            )
+        outlet_id = int(self.outlet_id) if self.outlet_id and self.outlet_id.isdigit() else None
+        if store_id is None and outlet_id:
+            store_id = await store_of_outlet(outlet_id)
+
+        self.device = {
+            'device_id': device_id,
+            'store_id': store_id,
+            'outlet_id': outlet_id,
+            'role': query.get('role', [''])[0][:30],
+            'app_version': query.get('app_version', [''])[0][:30],
+        }
+        self._last_heartbeat = time.monotonic()
+        await database_sync_to_async(presence.register)(
+            channel=self.channel_name, groups=list(self.topics.values()), **self.device
+        )
+
+    async def _heartbeat(self):
+        """Refresh the device's presence on ping (at most every PRESENCE_HEARTBEAT_INTERVAL)"""
+        if not self.device or time.monotonic() - self._last_heartbeat < settings.PRESENCE_HEARTBEAT_INTERVAL:
+            return
+        self._last_heartbeat = time.monotonic()
+        result = await database_sync_to_async(presence.heartbeat)(
+            self.device['device_id'], self.channel_name, self.device['store_id']
+        )
+        if result == presence.HEARTBEAT_REPLACED:
+            # A newer socket registered the same device id: leave it the
+            # registration instead of taking it back on every ping
+            logger.info(
+                'realtime device taken over by another socket',
+                extra={'channel': self.channel_name, 'device_id': self.device['device_id']}
+            )
+            self.device = None
+        elif result == presence.HEARTBEAT_EXPIRED:
+            # Expired while silent: its groups were left too, so join them again
+            for group in self.topics.values():
+                await self.channel_layer.group_add(group, self.channel_name)
+            await database_sync_to_async(presence.register)(
+                channel=self.channel_name, groups=list(self.topics.values()), **self.device
+            )
+
+    async def _groups_changed(self):
+        if self.device:
+            await database_sync_to_async(presence.update_groups)(
+                self.device['device_id'], self.channel_name, list(self.topics.values())
             )
-            print(f'[Channels] Client disconnected from outlet {self.outlet_id} (code: {close_code})')
 
-    async def receive(self, text_data):
+    async def _catch_up(self, starts):
+        """Replay what each topic missed since its start seq, or send a snapshot"""
+        for topic, seq in starts.items():
+            group = self.topics.get(topic)
+            if group is None:
+                continue
+            missed = await database_sync_to_async(history.since)(group, seq)
+            if missed is None:
+                last_seq, data = await database_sync_to_async(history.snapshot)(topic, group)
+                if last_seq is not None:
+                    self.positions[topic] = last_seq
+                head, tail = frames.frame_parts('snapshot', topic, data or 'null')
+                await self._send_frame(f"{head}{'null' if last_seq is None else last_seq}{tail}")
+                continue
+            self.positions[topic] = seq
+            for message_seq, frame, event_id in missed:
+                await self._forward({'group': group, 'seq': message_seq, 'frame': frame, 'event_id': event_id})
+
+    async def receive(self, text_data=None, bytes_data=None):
         """
         Receive message from WebSocket
         """
         try:
-            data = json.loads(text_data)
+            data = json.loads(text_data if text_data is not None else bytes_data)
             message_type = data.get('type')
 
             if message_type == 'ping':
                 # Respond to ping
-                await self.send(text_data=json.dumps({
+                await self._send_json({
                     'type': 'pong',
                     'timestamp': data.get('timestamp')
-                }))
+                })
+                await self._heartbeat()
 
             elif message_type == 'subscribe':
-                # Client wants to subscribe (already done in connect)
-                await self.send(text_data=json.dumps({
+                topics = data.get('topics') or []
+                resume_from = data.get('resume_from') or {}
+                if not isinstance(resume_from, dict):
+                    resume_from = {}
+                _, invalid, starts = await self._subscribe(
+                    topics if isinstance(topics, list) else [],
+                    {topic: seq for topic, seq in resume_from.items() if isinstance(seq, int)}
+                )
+                await self._send_json({
                     'type': 'subscribed',
                     'outlet_id': self.outlet_id,
-                    'room': self.room_group_name
-                }))
+                    'topics': sorted(self.topics),
+                    'invalid': invalid,
+                })
+                await self._catch_up(starts)
+                await self._groups_changed()
+
+            elif message_type == 'unsubscribe':
+                topics = data.get('topics') or []
+                await self._unsubscribe(topics if isinstance(topics, list) else [])
+                await self._send_json({
+                    'type': 'unsubscribed',
+                    'topics': sorted(self.topics),
+                })
+                await self._groups_changed()
 
-        except json.JSONDecodeError:
-            await self.send(text_data=json.dumps({
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            await self._send_json({
                 'type': 'error',
                 'message': 'Invalid JSON'
-            }))
+            })
+
+    async def _forward(self, event):
+        """
+        Send a group event to the socket, once even if several topics carried
+        it, and skip events already covered by a replay or snapshot
+        """
+        topic = self.group_topics.get(event.get('group'))
+        seq = event.get('seq')
+        if topic is not None and seq is not None and seq <= self.positions.get(topic, 0):
+            return
+
+        event_id = event.get('event_id')
+        if event_id is not None:
+            # Replayed ids come back from Redis as strings
+            event_id = str(event_id)
+            if event_id in self._seen:
+                if topic is not None and seq is not None:
+                    # Sent already through another topic (replay): only tell
+                    # the client how far this one got
+                    self.positions[topic] = seq
+                    await self._send_json({'type': 'position', 'topic': topic, 'seq': seq})
+                return
+            self._seen.append(event_id)
+
+        # Positions of every topic of this socket the event was appended to,
+        # so the client can resume all of them, not just the one it came by
+        seqs = {name: value for name, value in (event.get('seqs') or {}).items() if name in self.topics}
+        if topic is not None and seq is not None:
+            seqs[topic] = seq
+        for name, value in seqs.items():
+            if value > self.positions.get(name, 0):
+                self.positions[name] = value
+
+        frame = event.get('frame')
+        if frame is None:
+            # group_send from elsewhere with a plain payload
+            frame = frames.plain_frame(event['type'], frames.encode(event['data']))
+        elif len(seqs) > 1:
+            frame = frames.with_seqs(frame, seqs)
+        await self._send_frame(frame)
+
+    async def _send_frame(self, frame):
+        """Send an encoded frame in the socket's format"""
+        if self.compact:
+            await self.send(bytes_data=frames.to_msgpack(frame))
+        else:
+            await self.send(text_data=frame)
 
-    # Receive message from room group (broadcasted events)
+    async def _send_json(self, payload):
+        """Send a reply built for this socket (confirmations, pong, errors)"""
+        if self.compact:
+            await self.send(bytes_data=msgpack.packb(payload, use_bin_type=True))
+        else:
+            await self.send(text_data=json.dumps(payload))
+
+    # Receive message from topic groups (broadcasted events)
     async def new_order(self, event):
         """
         Called when new order is created
         """
-        # Send message to WebSocket
-        await self.send(text_data=json.dumps({
-            'type': 'new_order',
-            'data': event['data']
-        }))
+        await self._forward(event)
 
     async def order_updated(self, event):
         """
         Called when order is updated
         """
-        await self.send(text_data=json.dumps({
-            'type': 'order_updated',
-            'data': event['data']
-        }))
+        await self._forward(event)
 
     async def order_completed(self, event):
         """
         Called when order is completed
         """
-        await self.send(text_data=json.dumps({
-            'type': 'order_completed',
-            'data': event['data']
-        }))
+        await self._forward(event)
 
     async def order_cancelled(self, event):
         """
         Called when order is cancelled
         """
-        await self.send(text_data=json.dumps({
-            'type': 'order_cancelled',
-            'data': event['data']
-        }))
+        await self._forward(event)
 
     async def kitchen_status_changed(self, event):
         """
         Called when kitchen status changes
         """
-        await self.send(text_data=json.dumps({
-            'type': 'kitchen_status_changed',
-            'data': event['data']
-        }))
+        await self._forward(event)
+
+    async def order_items_updated(self, event):
+        """
+        Called when items of a station change kitchen status
+        """
+        await self._forward(event)
+
+    async def kitchen_pressure(self, event):
+        """
+        Called when a station type becomes busy, paused or open again
+        """
+        await self._forward(event)
@@ -0,0 +1,58 @@
+"""
+WebSocket frames, encoded once per event instead of once per socket
+
+An event is JSON-encoded when it is published (apps.realtime.utils.send_batch):
+its payload once, and the frame around it once per topic. The Channels
+message then carries the finished frame and consumers send it as is:
+
+    {"type":"order_updated","topic":"outlet:3","seq":120,"data":{...}}
+
+An event that reached a socket through several of its topics is sent once,
+with the sequence number of each of them added (with_seqs):
+
+    {"seqs":{"outlet:3":120,"store:1":45},"type":"order_updated",...}
+
+Sockets that asked for the compact format (?format=msgpack) get the same
+frame as a MessagePack map in a binary message. Each frame is converted
+once per server process, however many of its sockets want it.
+"""
+import json
+from functools import lru_cache
+
+import msgpack
+from rest_framework.utils.encoders import JSONEncoder
+
+FORMATS = ('json', 'msgpack')
+
+COMPACT_CACHE_SIZE = 512
+
+
+def encode(value):
+    """Compact JSON text of a value (Decimal, datetime... as the APIs render them)"""
+    return json.dumps(value, cls=JSONEncoder, separators=(',', ':'))
+
+
+def frame_parts(event_type, topic, data):
+    """
+    Frame of an event around its sequence number: head + str(seq) + tail
+    Args: data: The payload, already encoded
+    """
+    head = f'{{"type":{encode(event_type)},"topic":{encode(topic)},"seq":'
+    tail = f',"data":{data}}}'
+    return head, tail
+
+
+def with_seqs(frame, seqs):
+    """Frame with a {topic: seq} map added, without decoding it"""
+    return f'{{"seqs":{encode(seqs)},{frame[1:]}'
+
+
+def plain_frame(event_type, data):
+    """Frame of an event without topic or sequence number (history unavailable)"""
+    return f'{{"type":{encode(event_type)},"data":{data}}}'
+
+
+@lru_cache(maxsize=COMPACT_CACHE_SIZE)
+def to_msgpack(frame):
+    """MessagePack bytes of a JSON frame"""
+    return msgpack.packb(json.loads(frame), use_bin_type=True)
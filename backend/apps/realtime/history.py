@@ -0,0 +1,212 @@
+"""
+Per-topic event history, so reconnecting sockets can catch up
+
+Every message sent to a topic group gets the next sequence number of that
+group and its frame (apps.realtime.frames) is kept in a capped Redis
+stream whose entry ids are the sequence numbers themselves:
+
+    pos:rt:stream:<group>    STREAM "<seq>-0" -> {'f': frame, 'e': event id}
+                             (last REALTIME_HISTORY_LENGTH entries)
+    pos:rt:snapshot:<group>:<seq>   cached snapshot (REALTIME_SNAPSHOT_TTL)
+
+A socket that comes back with the last sequence number it saw gets the
+missed events replayed from the stream. When the gap is larger than
+REALTIME_REPLAY_MAX, or the events were already trimmed, it gets a
+snapshot of the topic's open orders from the kitchen board instead.
+Snapshots are cached per sequence number, so a reconnect storm builds
+each one once.
+
+A topic's stream expires after REALTIME_HISTORY_TTL without events. A new
+stream starts from the current Unix time x 1000 rather than 1, so
+sequence numbers never go backwards: sockets that stayed connected keep
+receiving, and positions from an older stream get a snapshot.
+"""
+import logging
+
+from django.conf import settings
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+
+from apps.realtime import frames
+from apps.realtime.topics import topic_scope
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'pos:rt'
+
+# Next sequence number of the stream (one after its last entry, or a
+# time-based start for new streams), then append the frame with it:
+# ARGV = max length, TTL, frame head, frame tail, event id
+APPEND_LUA = """
+    local last = redis.call('XREVRANGE', KEYS[1], '+', '-', 'COUNT', 1)
+    local seq = tonumber(redis.call('TIME')[1]) * 1000
+    if #last > 0 then
+        seq = tonumber(string.match(last[1][1], '^(%d+)')) + 1
+    end
+    seq = string.format('%d', seq)
+    redis.call('XADD', KEYS[1], 'MAXLEN', '~', ARGV[1], seq .. '-0', 'f', ARGV[3] .. seq .. ARGV[4], 'e', ARGV[5])
+    redis.call('EXPIRE', KEYS[1], ARGV[2])
+    return seq
+"""
+
+# Current sequence number of the stream. Empty streams get a marker entry
+# (empty frame) at a time-based start, so sockets joining them hold a real
+# position and later events follow it without a gap
+CURRENT_LUA = """
+    local last = redis.call('XREVRANGE', KEYS[1], '+', '-', 'COUNT', 1)
+    if #last > 0 then
+        return string.match(last[1][1], '^(%d+)')
+    end
+    local seq = string.format('%d', tonumber(redis.call('TIME')[1]) * 1000)
+    redis.call('XADD', KEYS[1], seq .. '-0', 'f', '', 'e', '')
+    redis.call('EXPIRE', KEYS[1], ARGV[1])
+    return seq
+"""
+
+_append_script = None
+_current_script = None
+
+
+def _redis():
+    return get_redis_connection('default')
+
+
+def _stream_key(group):
+    return f'{KEY_PREFIX}:stream:{group}'
+
+
+def _snapshot_key(group, seq):
+    return f'{KEY_PREFIX}:snapshot:{group}:{seq}'
+
+
+def _seq(entry_id):
+    return int(entry_id.split(b'-')[0])
+
+
+def record(entries):
+    """
+    Number frames and append them to their groups' history (one pipelined
+    round trip)
+    Args: entries: (group, frame head, frame tail, event id) tuples; the
+        frame is head + str(seq) + tail
+
+    Returns: list of sequence numbers (all None when Redis is unavailable)
+    """
+    global _append_script
+    if not entries:
+        return []
+    try:
+        conn = _redis()
+        if _append_script is None:
+            _append_script = conn.register_script(APPEND_LUA)
+        pipe = conn.pipeline(transaction=False)
+        for group, head, tail, event_id in entries:
+            _append_script(
+                keys=[_stream_key(group)],
+                args=[settings.REALTIME_HISTORY_LENGTH, settings.REALTIME_HISTORY_TTL,
+                      head, tail, '' if event_id is None else event_id],
+                client=pipe
+            )
+        return [int(seq) for seq in pipe.execute()]
+    except RedisError as e:
+        logger.warning(f"Realtime history unavailable, sending without sequence numbers: {e}")
+        return [None] * len(entries)
+
+
+def last_seqs(groups):
+    """
+    Current sequence number of each group (starting its history if it has none)
+    Returns: dict of group -> seq, or None when Redis is unavailable
+    """
+    global _current_script
+    if not groups:
+        return {}
+    try:
+        conn = _redis()
+        if _current_script is None:
+            _current_script = conn.register_script(CURRENT_LUA)
+        pipe = conn.pipeline(transaction=False)
+        for group in groups:
+            _current_script(keys=[_stream_key(group)], args=[settings.REALTIME_HISTORY_TTL], client=pipe)
+        results = pipe.execute()
+    except RedisError as e:
+        logger.warning(f"Realtime history unavailable: {e}")
+        return None
+    return {group: int(seq) for group, seq in zip(groups, results)}
+
+
+def since(group, seq):
+    """
+    Frames of a group after sequence number `seq`, oldest first
+
+    Returns: list of (seq, frame, event id), or None when they cannot be replayed
+    (gap over REALTIME_REPLAY_MAX, already trimmed, unknown position or
+    Redis unavailable)
+    """
+    limit = settings.REALTIME_REPLAY_MAX
+    try:
+        pipe = _redis().pipeline(transaction=False)
+        pipe.xrevrange(_stream_key(group), count=1)
+        pipe.xrange(_stream_key(group), min=f'{seq + 1}-0', count=limit + 1)
+        last, entries = pipe.execute()
+    except RedisError as e:
+        logger.warning(f"Realtime history unavailable: {e}")
+        return None
+
+    last_seq = _seq(last[0][0]) if last else 0
+    if seq == last_seq:
+        return []
+    if seq > last_seq or len(entries) > limit:
+        return None
+    if not entries or _seq(entries[0][0]) != seq + 1:
+        return None  # Trimmed
+    return [
+        (_seq(entry_id), fields[b'f'].decode(), fields[b'e'].decode() or None)
+        for entry_id, fields in entries
+        if fields[b'f']  # Start marker
+    ]
+
+
+def _build_snapshot(topic):
+    """Open orders of a topic from the kitchen board (None if unavailable)"""
+    from apps.orders import kitchen_board
+
+    scope, scope_id, station = topic_scope(topic)
+    tickets = kitchen_board.read_board(scope, scope_id)
+    if tickets is None:
+        return None
+    if station:
+        for ticket in tickets:
+            ticket['items'] = [item for item in ticket['items'] if item['kitchen_station_code'] == station]
+        tickets = [ticket for ticket in tickets if ticket['items']]
+    return {'orders': tickets}
+
+
+def snapshot(topic, group):
+    """
+    State of a topic for sockets that cannot be caught up by replay
+
+    Returns: (seq, data) where seq is the sequence number the snapshot is
+    current as of and data is {'orders': [...kitchen tickets]} encoded as
+    JSON, or (None, None) when neither history nor the board is available
+    (the client then reloads over the REST API)
+    """
+    seqs = last_seqs([group])
+    if seqs is None:
+        return None, None
+    seq = seqs[group]
+    key = _snapshot_key(group, seq)
+    try:
+        conn = _redis()
+        cached = conn.get(key)
+        if cached is not None:
+            return seq, cached.decode()
+        data = _build_snapshot(topic)
+        if data is None:
+            return None, None
+        data = frames.encode(data)
+        conn.set(key, data, ex=settings.REALTIME_SNAPSHOT_TTL)
+    except RedisError as e:
+        logger.warning(f"Realtime snapshot unavailable: {e}")
+        return None, None
+    return seq, data
@@ -0,0 +1,358 @@
+"""
+Presence of kiosks and kitchen screens, kept in Redis
+
+Sockets that identify themselves (?device_id=KIOSK-001&role=kiosk&
+app_version=2.3.1) are registered when they connect and refreshed by
+their pings. Nothing is written to the database:
+
+    pos:presence:store:<id>            ZSET device id -> last seen (epoch), connected devices
+    pos:presence:store:<id>:offline    ZSET device id -> disconnected at (epoch)
+    pos:presence:device:<device id>    HASH role, app_version, store_id, outlet_id,
+                                       channel, groups, connected_at, last_seen...
+    pos:presence:connects:<device id>  connects in the current PRESENCE_FLAP_WINDOW
+    pos:presence:stores                SET store ids with registered devices
+
+A connected device is online while it keeps pinging within
+PRESENCE_STALE_SECONDS, stale after that, and expired after
+PRESENCE_EXPIRE_SECONDS. The expire_device_presence task drops expired
+devices and takes their channels out of the topic groups, so realtime
+messages stop piling up for sockets that died without closing. A device
+whose pings arrive after it expired is registered again; a socket whose
+device id was taken over by a newer socket stops being tracked. Devices
+that connect PRESENCE_FLAP_CONNECTS times within the window are flagged
+as flapping. Counts and pages per status are score-range queries,
+O(log n).
+"""
+import json
+import logging
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'pos:presence'
+STORES_KEY = f'{KEY_PREFIX}:stores'
+
+# Devices not tied to a store (tenant-wide screens)
+NO_STORE = 0
+
+STATUSES = ('online', 'stale', 'offline')
+
+# heartbeat() results
+HEARTBEAT_REFRESHED = 'refreshed'
+HEARTBEAT_EXPIRED = 'expired'
+HEARTBEAT_REPLACED = 'replaced'
+HEARTBEAT_RESULTS = {1: HEARTBEAT_REFRESHED, 0: HEARTBEAT_EXPIRED, -1: HEARTBEAT_REPLACED}
+
+# Refresh a device if this socket still owns its registration:
+# 1 refreshed, 0 registration gone, -1 owned by another socket
+HEARTBEAT_LUA = """
+    local owner = redis.call('HGET', KEYS[1], 'channel')
+    if not owner then
+        return 0
+    end
+    if owner ~= ARGV[1] then
+        return -1
+    end
+    redis.call('HSET', KEYS[1], 'last_seen', ARGV[2])
+    redis.call('EXPIRE', KEYS[1], ARGV[3])
+    redis.call('ZADD', KEYS[2], ARGV[2], ARGV[4])
+    return 1
+"""
+
+# Move a device to the offline set, unless a newer socket took it over
+DISCONNECT_LUA = """
+    if redis.call('HGET', KEYS[1], 'channel') ~= ARGV[1] then
+        return 0
+    end
+    redis.call('HSET', KEYS[1], 'connected', '0', 'disconnected_at', ARGV[2])
+    redis.call('ZREM', KEYS[2], ARGV[3])
+    redis.call('ZADD', KEYS[3], ARGV[2], ARGV[3])
+    return 1
+"""
+
+_scripts = {}
+
+
+def _redis():
+    return get_redis_connection('default')
+
+
+def _script(conn, source):
+    if source not in _scripts:
+        _scripts[source] = conn.register_script(source)
+    return _scripts[source]
+
+
+def _store_key(store_id):
+    return f'{KEY_PREFIX}:store:{store_id}'
+
+
+def _offline_key(store_id):
+    return f'{_store_key(store_id)}:offline'
+
+
+def _device_key(device_id):
+    return f'{KEY_PREFIX}:device:{device_id}'
+
+
+def _connects_key(device_id):
+    return f'{KEY_PREFIX}:connects:{device_id}'
+
+
+def _hash_ttl():
+    return settings.PRESENCE_EXPIRE_SECONDS * 2
+
+
+# ============================================================================
+# Writes (consumer)
+# ============================================================================
+
+def register(device_id, channel, groups, store_id=None, outlet_id=None, role='', app_version=''):
+    """
+    Record a device's connection (replaces an older socket of the same device)
+    Returns: True if recorded, False when Redis is unavailable
+    """
+    store_id = store_id or NO_STORE
+    now = time.time()
+    try:
+        conn = _redis()
+        previous_store = conn.hget(_device_key(device_id), 'store_id')
+        pipe = conn.pipeline(transaction=True)
+        if previous_store is not None and int(previous_store) != store_id:
+            pipe.zrem(_store_key(int(previous_store)), device_id)
+            pipe.zrem(_offline_key(int(previous_store)), device_id)
+        pipe.hset(_device_key(device_id), mapping={
+            'device_id': device_id,
+            'role': role or '',
+            'app_version': app_version or '',
+            'store_id': store_id,
+            'outlet_id': outlet_id or '',
+            'channel': channel,
+            'groups': json.dumps(sorted(groups)),
+            'connected': 1,
+            'connected_at': now,
+            'last_seen': now,
+        })
+        pipe.hdel(_device_key(device_id), 'disconnected_at')
+        pipe.expire(_device_key(device_id), _hash_ttl())
+        pipe.zadd(_store_key(store_id), {device_id: now})
+        pipe.zrem(_offline_key(store_id), device_id)
+        pipe.sadd(STORES_KEY, store_id)
+        pipe.set(_connects_key(device_id), 0, nx=True, ex=settings.PRESENCE_FLAP_WINDOW)
+        pipe.incr(_connects_key(device_id))
+        pipe.execute()
+    except RedisError as e:
+        logger.warning(f"Device presence unavailable: {e}")
+        return False
+    return True
+
+
+def heartbeat(device_id, channel, store_id=None):
+    """
+    Refresh a device's last-seen time
+    Returns: HEARTBEAT_REFRESHED; HEARTBEAT_EXPIRED if the registration is
+    gone (expired, or Redis lost it) and the device must register again;
+    HEARTBEAT_REPLACED if a newer socket of the same device id owns it; None
+    when Redis is unavailable
+    """
+    store_id = store_id or NO_STORE
+    try:
+        conn = _redis()
+        result = _script(conn, HEARTBEAT_LUA)(
+            keys=[_device_key(device_id), _store_key(store_id)],
+            args=[channel, time.time(), _hash_ttl(), device_id]
+        )
+    except RedisError as e:
+        logger.warning(f"Device presence unavailable: {e}")
+        return None
+    return HEARTBEAT_RESULTS[result]
+
+
+def update_groups(device_id, channel, groups):
+    """Record the topic groups a device's socket is in (if it still owns the registration)"""
+    try:
+        conn = _redis()
+        if conn.hget(_device_key(device_id), 'channel') == channel.encode():
+            conn.hset(_device_key(device_id), 'groups', json.dumps(sorted(groups)))
+    except RedisError as e:
+        logger.warning(f"Device presence unavailable: {e}")
+
+
+def unregister(device_id, channel, store_id=None):
+    """Mark a device offline after its socket closed"""
+    store_id = store_id or NO_STORE
+    try:
+        conn = _redis()
+        _script(conn, DISCONNECT_LUA)(
+            keys=[_device_key(device_id), _store_key(store_id), _offline_key(store_id)],
+            args=[channel, time.time(), device_id]
+        )
+    except RedisError as e:
+        logger.warning(f"Device presence unavailable: {e}")
+
+
+# ============================================================================
+# Reads (admin fleet view)
+# ============================================================================
+
+def _datetime(timestamp):
+    return datetime.fromtimestamp(float(timestamp), tz=dt_timezone.utc)
+
+
+def _status(device, now):
+    if device.get('connected') == '0':
+        return 'offline'
+    if now - float(device['last_seen']) <= settings.PRESENCE_STALE_SECONDS:
+        return 'online'
+    return 'stale'
+
+
+def _device(raw, connects, now):
+    device = {key.decode(): value.decode() for key, value in raw.items()}
+    row = {
+        'device_id': device['device_id'],
+        'role': device.get('role', ''),
+        'app_version': device.get('app_version', ''),
+        'store_id': int(device.get('store_id') or NO_STORE),
+        'outlet_id': int(device['outlet_id']) if device.get('outlet_id') else None,
+        'status': _status(device, now),
+        'connected_at': _datetime(device['connected_at']),
+        'last_seen': _datetime(device['last_seen']),
+        'disconnected_at': _datetime(device['disconnected_at']) if device.get('disconnected_at') else None,
+        'connects': int(connects or 0),
+        'flapping': int(connects or 0) >= settings.PRESENCE_FLAP_CONNECTS,
+    }
+    row['seconds_since_seen'] = int(now - float(device['last_seen']))
+    return row
+
+
+def _ranges(now):
+    """Score range of each status in the store sets"""
+    stale_after = now - settings.PRESENCE_STALE_SECONDS
+    expired = now - settings.PRESENCE_EXPIRE_SECONDS
+    return {
+        'online': ('live', stale_after, '+inf'),
+        'stale': ('live', expired, f'({stale_after}'),
+        'offline': ('offline', expired, '+inf'),
+    }
+
+
+def counts(store_id):
+    """
+    Devices of a store per status
+    Returns: dict status -> count, or None when Redis is unavailable
+    """
+    now = time.time()
+    try:
+        pipe = _redis().pipeline(transaction=False)
+        for status, (kind, low, high) in _ranges(now).items():
+            key = _store_key(store_id) if kind == 'live' else _offline_key(store_id)
+            pipe.zcount(key, low, high)
+        results = pipe.execute()
+    except RedisError as e:
+        logger.warning(f"Device presence unavailable: {e}")
+        return None
+    return dict(zip(STATUSES, results))
+
+
+def devices(store_id, status=None, role=None, limit=500):
+    """
+    Devices of a store, most recently seen first
+    Args:
+        status: 'online', 'stale' or 'offline' (default: all)
+        role: Only devices with this role
+    Returns: list of device dicts, or None when Redis is unavailable
+    """
+    now = time.time()
+    try:
+        conn = _redis()
+        pipe = conn.pipeline(transaction=False)
+        for name, (kind, low, high) in _ranges(now).items():
+            if status and name != status:
+                continue
+            key = _store_key(store_id) if kind == 'live' else _offline_key(store_id)
+            pipe.zrevrangebyscore(key, high, low, start=0, num=limit)
+        device_ids = list(dict.fromkeys(
+            device_id.decode() for members in pipe.execute() for device_id in members
+        ))[:limit]
+
+        pipe = conn.pipeline(transaction=False)
+        for device_id in device_ids:
+            pipe.hgetall(_device_key(device_id))
+            pipe.get(_connects_key(device_id))
+        results = pipe.execute()
+    except RedisError as e:
+        logger.warning(f"Device presence unavailable: {e}")
+        return None
+
+    rows = []
+    for index in range(len(device_ids)):
+        raw, connects = results[index * 2], results[index * 2 + 1]
+        if not raw:
+            continue  # Expired between the two reads
+        row = _device(raw, connects, now)
+        if role and row['role'] != role:
+            continue
+        rows.append(row)
+    rows.sort(key=lambda row: row['seconds_since_seen'])
+    return rows
+
+
+def device(device_id):
+    """
+    One device's presence
+    Returns: device dict, False if unknown, None when Redis is unavailable
+    """
+    try:
+        pipe = _redis().pipeline(transaction=False)
+        pipe.hgetall(_device_key(device_id))
+        pipe.get(_connects_key(device_id))
+        raw, connects = pipe.execute()
+    except RedisError as e:
+        logger.warning(f"Device presence unavailable: {e}")
+        return None
+    if not raw:
+        return False
+    return _device(raw, connects, time.time())
+
+
+# ============================================================================
+# Cleanup (Celery beat)
+# ============================================================================
+
+def expire():
+    """
+    Drop devices not seen for PRESENCE_EXPIRE_SECONDS
+    Returns: list of (channel, groups) of expired connected devices, whose
+    sockets should leave their groups
+    """
+    cutoff = time.time() - settings.PRESENCE_EXPIRE_SECONDS
+    conn = _redis()
+    dead = []
+    for store_id in conn.smembers(STORES_KEY):
+        store_id = int(store_id)
+        expired = [member.decode() for member in conn.zrangebyscore(_store_key(store_id), '-inf', cutoff)]
+        pipe = conn.pipeline(transaction=False)
+        for device_id in expired:
+            pipe.hmget(_device_key(device_id), 'channel', 'groups', 'last_seen')
+        details = pipe.execute()
+
+        pipe = conn.pipeline(transaction=False)
+        for device_id, (channel, groups, last_seen) in zip(expired, details):
+            if last_seen is not None and float(last_seen) > cutoff:
+                continue  # Heartbeat came in meanwhile
+            if channel:
+                dead.append((channel.decode(), json.loads(groups or b'[]')))
+            pipe.zrem(_store_key(store_id), device_id)
+            pipe.delete(_device_key(device_id))
+        pipe.zremrangebyscore(_offline_key(store_id), '-inf', cutoff)
+        pipe.execute()
+
+        if not conn.exists(_store_key(store_id), _offline_key(store_id)):
+            conn.srem(STORES_KEY, store_id)
+    return dead
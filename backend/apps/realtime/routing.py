@@ -6,4 +6,6 @@ from . import consumers
 
 websocket_urlpatterns = [
     re_path(r'ws/outlet/(?P<outlet_id>\w+)/$', consumers.OrderConsumer.as_asgi()),
+    re_path(r'ws/outlet/(?P<outlet_id>\w+)/station/(?P<station>[\w-]+)/$', consumers.OrderConsumer.as_asgi()),
+    re_path(r'ws/realtime/$', consumers.OrderConsumer.as_asgi()),
 ]
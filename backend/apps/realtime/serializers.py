@@ -0,0 +1,22 @@
+"""
+Serializers for realtime device presence
+"""
+from rest_framework import serializers
+
+from apps.realtime.presence import STATUSES
+
+
+class DevicePresenceSerializer(serializers.Serializer):
+    """One kiosk or kitchen screen, read from the presence registry"""
+    device_id = serializers.CharField()
+    role = serializers.CharField()
+    app_version = serializers.CharField()
+    store_id = serializers.IntegerField()
+    outlet_id = serializers.IntegerField(allow_null=True)
+    status = serializers.ChoiceField(choices=STATUSES)
+    connected_at = serializers.DateTimeField()
+    last_seen = serializers.DateTimeField()
+    disconnected_at = serializers.DateTimeField(allow_null=True)
+    seconds_since_seen = serializers.IntegerField()
+    connects = serializers.IntegerField(help_text='Connects within PRESENCE_FLAP_WINDOW')
+    flapping = serializers.BooleanField()
@@ -0,0 +1,36 @@
+"""
+Celery tasks for realtime
+"""
+import asyncio
+import logging
+
+from asgiref.sync import async_to_sync
+from celery import shared_task
+from channels.layers import get_channel_layer
+
+from apps.realtime import presence
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(ignore_result=True)
+def expire_device_presence():
+    """
+    Drop devices that stopped pinging and take their sockets out of the
+    topic groups, so events are no longer queued for them
+    """
+    dead = presence.expire()
+    channel_layer = get_channel_layer()
+    if not dead or channel_layer is None:
+        return len(dead)
+
+    async def discard_all():
+        await asyncio.gather(*[
+            channel_layer.group_discard(group, channel)
+            for channel, groups in dead
+            for group in groups
+        ], return_exceptions=True)
+
+    async_to_sync(discard_all)()
+    logger.info(f"📴 Expired {len(dead)} silent devices")
+    return len(dead)
@@ -0,0 +1,46 @@
+"""
+Tests for the channels_redis internals apps.realtime.utils relies on
+
+_pipelined_group_send talks to channels_redis below its public API. These
+fail when an upgrade moves or reshapes those internals, so the pipelined
+path is re-checked (and PIPELINED_CHANNELS_REDIS_VERSIONS updated) before
+the pin in requirements.txt changes.
+"""
+from django.test import SimpleTestCase
+
+from apps.realtime import utils
+
+
+class PipelinedGroupSendTests(SimpleTestCase):
+    def setUp(self):
+        from channels_redis.core import RedisChannelLayer
+        self.layer = RedisChannelLayer(hosts=['redis://localhost:6379/0'])
+
+    def test_installed_version_is_supported(self):
+        version = utils.channels_redis_version()
+        self.assertIsNotNone(version)
+        self.assertTrue(
+            version.startswith(utils.PIPELINED_CHANNELS_REDIS_VERSIONS),
+            f'channels_redis {version} is not in PIPELINED_CHANNELS_REDIS_VERSIONS'
+        )
+
+    def test_layer_has_internals(self):
+        for name in utils.PIPELINED_LAYER_ATTRIBUTES + ('ring_size', 'expiry', 'group_expiry'):
+            self.assertTrue(hasattr(self.layer, name), f'RedisChannelLayer.{name} is gone')
+        self.assertTrue(utils._can_pipeline(self.layer))
+
+    def test_group_key(self):
+        self.assertEqual(self.layer._group_key('outlet_3'), f'{self.layer.prefix}:group:outlet_3'.encode())
+
+    def test_map_channel_keys_to_connection(self):
+        keys_by_connection, key_messages, key_capacities = self.layer._map_channel_keys_to_connection(
+            ['specific.abc!def'], {'type': 'order_updated'}
+        )
+        keys = keys_by_connection[0]
+        self.assertEqual(len(keys), 1)
+        self.assertIsInstance(key_messages[keys[0]], bytes)
+        self.assertIsInstance(key_capacities[keys[0]], int)
+
+    def test_other_layers_do_not_pipeline(self):
+        from channels.layers import InMemoryChannelLayer
+        self.assertFalse(utils._can_pipeline(InMemoryChannelLayer()))
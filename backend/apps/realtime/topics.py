@@ -0,0 +1,102 @@
+"""
+Realtime subscription topics and the Channels groups behind them
+
+A socket can follow any mix of topics:
+
+    outlet:<id>               every order event of one outlet (brand)
+    store:<id>                every order event placed at one store (expo screens)
+    tenant:<id>               every order event of a tenant
+    station:<outlet id>:<code> one station's tickets and item bumps
+
+Order events go to the outlet, store and tenant of the order and to every
+station it has items at; item events only go to their station. Sockets
+subscribed to several topics an event touches get it once (the consumer
+drops repeats by event id).
+"""
+import re
+
+# Events about single items rather than whole orders
+ITEM_EVENTS = ('order_items_updated',)
+
+MAX_TOPICS_PER_SOCKET = 20
+
+_CODE = re.compile(r'^[\w-]{1,20}$')
+
+
+def outlet_group(outlet_id):
+    return f'outlet_{outlet_id}'
+
+
+def store_group(store_id):
+    return f'store_{store_id}'
+
+
+def tenant_group(tenant_id):
+    return f'tenant_{tenant_id}'
+
+
+def station_group(outlet_id, station):
+    return f'outlet_{outlet_id}_station_{station}'
+
+
+def topic_group(topic):
+    """
+    Channels group of a topic string
+    Raises: ValueError for malformed topics
+    """
+    kind, _, rest = str(topic).partition(':')
+    if kind == 'station':
+        outlet_id, _, station = rest.partition(':')
+        if outlet_id.isdigit() and _CODE.match(station):
+            return station_group(int(outlet_id), station)
+    elif kind in ('outlet', 'store', 'tenant') and rest.isdigit():
+        return {'outlet': outlet_group, 'store': store_group, 'tenant': tenant_group}[kind](int(rest))
+    raise ValueError(f'Invalid topic: {topic}')
+
+
+_GROUP = re.compile(r'^(?:outlet_(?P<outlet>\d+)(?:_station_(?P<station>.+))?|(?P<kind>store|tenant)_(?P<id>\d+))$')
+
+
+def group_topic(group):
+    """Topic string of a group (inverse of topic_group), None for other groups"""
+    match = _GROUP.match(group)
+    if not match:
+        return None
+    if match['kind']:
+        return f"{match['kind']}:{match['id']}"
+    if match['station']:
+        return f"station:{match['outlet']}:{match['station']}"
+    return f"outlet:{match['outlet']}"
+
+
+def topic_scope(topic):
+    """
+    Kitchen board scope of a valid topic
+    Returns: (scope, scope_id, station) - station topics read their outlet's board
+    """
+    kind, _, rest = topic.partition(':')
+    if kind == 'station':
+        outlet_id, _, station = rest.partition(':')
+        return 'outlet', int(outlet_id), station
+    return kind, int(rest), None
+
+
+def event_groups(event_type, payload, outlet_id, store_id=None, tenant_id=None, stations=()):
+    """
+    Groups an event touches
+    Args:
+        event_type / payload: The event
+        outlet_id, store_id, tenant_id: Scope of the order (or outlet) it is about
+        stations: Station codes the order has items at
+    Returns: list of group names
+    """
+    if event_type in ITEM_EVENTS and payload.get('station'):
+        return [station_group(outlet_id, payload['station'])]
+
+    groups = [outlet_group(outlet_id)]
+    if store_id:
+        groups.append(store_group(store_id))
+    if tenant_id:
+        groups.append(tenant_group(tenant_id))
+    groups += [station_group(outlet_id, station) for station in sorted(set(stations)) if station]
+    return groups
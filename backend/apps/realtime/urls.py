@@ -0,0 +1,14 @@
+"""
+Realtime URL configuration
+"""
+from django.urls import path, include
+from rest_framework.routers import DefaultRouter
+from apps.realtime.views import DevicePresenceViewSet
+
+# Admin router
+admin_router = DefaultRouter()
+admin_router.register(r'admin/devices', DevicePresenceViewSet, basename='admin-device')
+
+urlpatterns = [
+    path('', include(admin_router.urls)),
+]
@@ -1,125 +1,225 @@
 """
-Utility functions to broadcast events via Django Channels
+Broadcast events via Django Channels
+
+Events are not sent one by one. Order writes record them in the outbox
+(apps.orders.outbox), whose dispatcher hands each batch to `send_batch()`.
+It delivers a batch with a single sync->async hop and, on the Redis
+channel layer, two pipelined round trips however many events and groups
+it holds:
+
+    1. read the members of every group touched (ZREMRANGEBYSCORE + ZRANGE each)
+    2. push every message to every member channel (one EVAL per message)
+
+The pipelined path uses channels_redis internals (_group_key,
+_map_channel_keys_to_connection, connection()), so it is only taken on the
+channels_redis releases listed in PIPELINED_CHANNELS_REDIS_VERSIONS
+(checked by apps/realtime/tests.py). Other versions and other channel
+layers (in-memory, sharded Redis) get concurrent group_send calls instead,
+as does a batch whose pipelined send trips over a changed internal. Before sending, every message is encoded into the frame
+sockets receive (apps.realtime.frames), numbered and kept in its group's
+history (apps.realtime.history), one more round trip.
+
+    send_batch([('outlet_3', {'type': 'order_updated', 'data': {...}, 'event_id': 42})])
 """
-from channels.layers import get_channel_layer
+import asyncio
+import logging
+import time
+from functools import lru_cache
+from importlib import metadata
+
 from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
 
+from apps.realtime import frames, history
+from apps.realtime.topics import group_topic
 
-def broadcast_new_order(order_data):
-    """
-    Broadcast new order event to outlet channel
-    
-    Args:
-        order_data: Dict containing order information including outlet_id
-    """
-    channel_layer = get_channel_layer()
-    outlet_id = order_data.get('outlet_id')
-    
-    if not outlet_id:
-        print('[Channels] Warning: No outlet_id in order data, cannot broadcast')
-        return
-    
-    group_name = f'outlet_{outlet_id}'
-    
-    async_to_sync(channel_layer.group_send)(
-        group_name,
-        {
-            'type': 'new_order',
-            'data': order_data
-        }
-    )
-    
-    print(f'[Channels] Broadcasted new_order to {group_name}')
+logger = logging.getLogger(__name__)
 
+# Same script channels_redis runs for each group_send: add the message to
+# every member channel that is under capacity
+GROUP_SEND_LUA = """
+    local over_capacity = 0
+    local current_time = ARGV[#ARGV - 1]
+    local expiry = ARGV[#ARGV]
+    for i=1,#KEYS do
+        if redis.call('ZCOUNT', KEYS[i], '-inf', '+inf') < tonumber(ARGV[i + #KEYS]) then
+            redis.call('ZADD', KEYS[i], current_time, ARGV[i])
+            redis.call('EXPIRE', KEYS[i], expiry)
+        else
+            over_capacity = over_capacity + 1
+        end
+    end
+    return over_capacity
+"""
 
-def broadcast_order_updated(order_data):
-    """
-    Broadcast order updated event to outlet channel
-    """
-    channel_layer = get_channel_layer()
-    outlet_id = order_data.get('outlet_id')
-    
-    if not outlet_id:
-        print('[Channels] Warning: No outlet_id in order data, cannot broadcast')
-        return
-    
-    group_name = f'outlet_{outlet_id}'
-    
-    async_to_sync(channel_layer.group_send)(
-        group_name,
-        {
-            'type': 'order_updated',
-            'data': order_data
-        }
-    )
-    
-    print(f'[Channels] Broadcasted order_updated to {group_name}')
 
+# channels_redis releases whose internals _pipelined_group_send was checked against
+PIPELINED_CHANNELS_REDIS_VERSIONS = ('4.1.',)
 
-def broadcast_order_completed(order_data):
-    """
-    Broadcast order completed event to outlet channel
-    """
-    channel_layer = get_channel_layer()
-    outlet_id = order_data.get('outlet_id')
-    
-    if not outlet_id:
-        return
-    
-    group_name = f'outlet_{outlet_id}'
-    
-    async_to_sync(channel_layer.group_send)(
-        group_name,
-        {
-            'type': 'order_completed',
-            'data': order_data
-        }
+# channels_redis internals _pipelined_group_send relies on
+PIPELINED_LAYER_ATTRIBUTES = ('_group_key', '_map_channel_keys_to_connection', 'connection')
+
+
+@lru_cache(maxsize=None)
+def channels_redis_version():
+    """Installed channels_redis version, or None"""
+    try:
+        return metadata.version('channels-redis')
+    except metadata.PackageNotFoundError:
+        return None
+
+
+def _can_pipeline(channel_layer):
+    """Single-host channels_redis layer of a known release (all keys on one connection)"""
+    version = channels_redis_version()
+    return (
+        version is not None
+        and version.startswith(PIPELINED_CHANNELS_REDIS_VERSIONS)
+        and type(channel_layer).__module__ == 'channels_redis.core'
+        and getattr(channel_layer, 'ring_size', None) == 1
+        and all(callable(getattr(channel_layer, name, None)) for name in PIPELINED_LAYER_ATTRIBUTES)
     )
-    
-    print(f'[Channels] Broadcasted order_completed to {group_name}')
 
 
-def broadcast_order_cancelled(order_data):
+async def _pipelined_group_send(channel_layer, messages):
+    """group_send for many (group, message) pairs in two round trips"""
+    connection = channel_layer.connection(0)
+    now = int(time.time())
+
+    groups = list(dict.fromkeys(group for group, _ in messages))
+    pipe = connection.pipeline(transaction=False)
+    for group in groups:
+        key = channel_layer._group_key(group)
+        pipe.zremrangebyscore(key, min=0, max=now - channel_layer.group_expiry)
+        pipe.zrange(key, 0, -1)
+    results = await pipe.execute()
+    members = {
+        group: [name.decode('utf8') for name in results[index * 2 + 1]]
+        for index, group in enumerate(groups)
+    }
+
+    pipe = connection.pipeline(transaction=False)
+    queued = 0
+    for group, message in messages:
+        if not members[group]:
+            continue
+        keys_by_connection, key_messages, key_capacities = (
+            channel_layer._map_channel_keys_to_connection(members[group], message)
+        )
+        keys = keys_by_connection[0]
+        for key in keys:
+            pipe.zremrangebyscore(key, min=0, max=now - int(channel_layer.expiry))
+        pipe.eval(
+            GROUP_SEND_LUA, len(keys), *keys,
+            *[key_messages[key] for key in keys],
+            *[key_capacities[key] for key in keys],
+            time.time(), channel_layer.expiry
+        )
+        queued += 1
+    if queued:
+        await pipe.execute()
+
+
+def _encode(messages):
     """
-    Broadcast order cancelled event to outlet channel
+    Encode messages into the frames sockets receive: each payload once, the
+    frame around it once per group, numbered by the group's history
+
+    Returns: (group, message) pairs with messages of the form
+    {'type', 'event_id', 'group', 'seq', 'seqs', 'frame'}; seqs maps every
+    topic the event was appended to onto its sequence number there
     """
-    channel_layer = get_channel_layer()
-    outlet_id = order_data.get('outlet_id')
-    
-    if not outlet_id:
-        return
-    
-    group_name = f'outlet_{outlet_id}'
-    
-    async_to_sync(channel_layer.group_send)(
-        group_name,
-        {
-            'type': 'order_cancelled',
-            'data': order_data
-        }
-    )
-    
-    print(f'[Channels] Broadcasted order_cancelled to {group_name}')
+    payloads = {}
+    parts = []
+    for group, message in messages:
+        data = message['data']
+        if id(data) not in payloads:
+            payloads[id(data)] = frames.encode(data)
+        parts.append(frames.frame_parts(message['type'], group_topic(group), payloads[id(data)]))
+
+    seqs = history.record([
+        (group, head, tail, message.get('event_id'))
+        for (group, message), (head, tail) in zip(messages, parts)
+    ])
+
+    # Sequence numbers of each event in every group it was appended to
+    event_seqs = {}
+    for (group, message), seq in zip(messages, seqs):
+        if seq is not None and message.get('event_id') is not None:
+            event_seqs.setdefault(message['event_id'], {})[group_topic(group)] = seq
+
+    encoded = []
+    for (group, message), (head, tail), seq in zip(messages, parts, seqs):
+        if seq is None:
+            frame = frames.plain_frame(message['type'], payloads[id(message['data'])])
+        else:
+            frame = f'{head}{seq}{tail}'
+        encoded.append((group, {
+            'type': message['type'],
+            'event_id': message.get('event_id'),
+            'group': group,
+            'seq': seq,
+            'seqs': event_seqs.get(message.get('event_id'), {}),
+            'frame': frame,
+        }))
+    return encoded
 
 
-def broadcast_kitchen_status(kitchen_data):
+def _group_send_each(channel_layer, messages):
+    """Concurrent group_send calls; returns None or the exception per message"""
+    async def send_all():
+        return await asyncio.gather(*[
+            channel_layer.group_send(group, message) for group, message in messages
+        ], return_exceptions=True)
+    return [
+        result if isinstance(result, Exception) else None
+        for result in async_to_sync(send_all)()
+    ]
+
+
+def send_batch(messages):
     """
-    Broadcast kitchen status change to outlet channel
+    Send (group, message) pairs to the channel layer in one batch
+    message is a Channels message: {'type': <handler>, 'data': {...}}; it
+    is sent encoded, as its group's next frame (see _encode)
+
+    Returns: list with None or the exception for each message
     """
+    if not messages:
+        return []
     channel_layer = get_channel_layer()
-    outlet_id = kitchen_data.get('outlet_id')
-    
-    if not outlet_id:
-        return
-    
-    group_name = f'outlet_{outlet_id}'
-    
-    async_to_sync(channel_layer.group_send)(
-        group_name,
-        {
-            'type': 'kitchen_status_changed',
-            'data': kitchen_data
+    if channel_layer is None:
+        error = RuntimeError('no channel layer configured')
+        return [error] * len(messages)
+
+    started = time.monotonic()
+    messages = _encode(messages)
+    results = None
+    if _can_pipeline(channel_layer):
+        try:
+            async_to_sync(_pipelined_group_send)(channel_layer, messages)
+            results = [None] * len(messages)
+        except (AttributeError, TypeError) as e:
+            # channels_redis internals changed shape; nothing was queued yet
+            logger.warning(f"Pipelined group_send unavailable, sending one by one: {e!r}")
+        except Exception as e:
+            results = [e] * len(messages)
+    if results is None:
+        results = _group_send_each(channel_layer, messages)
+
+    failed = sum(1 for result in results if result is not None)
+    if failed:
+        logger.warning(
+            'realtime batch failed: %s of %s messages (%s)',
+            failed, len(messages), next(result for result in results if result is not None)
+        )
+    logger.debug(
+        'realtime batch sent',
+        extra={
+            'messages': len(messages),
+            'groups': len({group for group, _ in messages}),
+            'failed': failed,
+            'duration_ms': round((time.monotonic() - started) * 1000, 2),
         }
     )
-    
-    print(f'[Channels] Broadcasted kitchen_status_changed to {group_name}')
+    return results
@@ -0,0 +1,79 @@
+"""
+Admin views for device presence (live fleet of kiosks and kitchen screens)
+"""
+import logging
+
+from django.db.models import Q
+from rest_framework import status, viewsets
+from rest_framework.response import Response
+
+from apps.core.permissions import IsAdminOrTenantOwnerOrManager, get_accessible_tenants
+from apps.realtime import presence
+from apps.realtime.serializers import DevicePresenceSerializer
+from apps.tenants.models import Store
+
+logger = logging.getLogger(__name__)
+
+UNAVAILABLE = {'error': 'Presence registry unavailable'}
+
+
+def can_access_store(user, store_id):
+    """Admins see every store; others the stores of their tenant or with their outlets"""
+    tenant_ids = get_accessible_tenants(user)
+    if tenant_ids is None:
+        return True
+    if store_id == presence.NO_STORE:
+        return False
+    return Store.objects.filter(
+        Q(tenant_id__in=tenant_ids) | Q(store_outlets__outlet__tenant_id__in=tenant_ids),
+        id=store_id
+    ).exists()
+
+
+class DevicePresenceViewSet(viewsets.ViewSet):
+    """
+    Connected kiosks and kitchen screens, read from Redis
+
+    list:     GET /api/admin/devices/?store_id=1[&status=stale][&role=kitchen]
+    retrieve: GET /api/admin/devices/<device_id>/
+    """
+    permission_classes = [IsAdminOrTenantOwnerOrManager]
+    lookup_value_regex = r'[^/]+'
+
+    def list(self, request):
+        """
+        Devices of a store with counts per status
+
+        Returns: {"store_id": 1, "counts": {"online": 12, "stale": 1, "offline": 2}, "devices": [...]}
+        """
+        try:
+            store_id = int(request.query_params.get('store_id', ''))
+        except ValueError:
+            return Response({'error': 'store_id is required'}, status=status.HTTP_400_BAD_REQUEST)
+        device_status = request.query_params.get('status') or None
+        if device_status and device_status not in presence.STATUSES:
+            return Response(
+                {'error': f"status must be one of: {', '.join(presence.STATUSES)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not can_access_store(request.user, store_id):
+            return Response({'error': 'Store not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        counts = presence.counts(store_id)
+        devices = presence.devices(store_id, status=device_status, role=request.query_params.get('role') or None)
+        if counts is None or devices is None:
+            return Response(UNAVAILABLE, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        return Response({
+            'store_id': store_id,
+            'counts': counts,
+            'devices': DevicePresenceSerializer(devices, many=True).data,
+        })
+
+    def retrieve(self, request, pk=None):
+        """One device by id"""
+        device = presence.device(pk)
+        if device is None:
+            return Response(UNAVAILABLE, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        if device is False or not can_access_store(request.user, device['store_id']):
+            return Response({'error': 'Device not found'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(DevicePresenceSerializer(device).data)
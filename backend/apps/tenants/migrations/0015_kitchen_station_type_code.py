@@ -0,0 +1,21 @@
+# Generated by Django 4.2.9 on 2026-10-16 23:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("tenants", "0014_storeoutlet_alter_outlet_options_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="kitchenstation",
+            name="station_type",
+            field=models.CharField(
+                blank=True,
+                help_text='Station type code it serves (e.g., "GRILL" for GRILL-1 and GRILL-2); empty means its own code. Active stations of one type share its items by queue load',
+                max_length=20,
+            ),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.9 on 2026-10-16 23:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("tenants", "0015_kitchen_station_type_code"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="kitchenstation",
+            name="busy_threshold",
+            field=models.PositiveIntegerField(
+                blank=True,
+                help_text="Queue minutes after which its products are sold with a longer quoted wait",
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="kitchenstation",
+            name="pause_threshold",
+            field=models.PositiveIntegerField(
+                blank=True,
+                help_text="Queue minutes after which its products stop selling until the queue drains",
+                null=True,
+            ),
+        ),
+    ]
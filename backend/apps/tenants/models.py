@@ -349,8 +349,26 @@ class KitchenStation(models.Model):
     outlet = models.ForeignKey(Outlet, on_delete=models.CASCADE, related_name='kitchen_stations')
     name = models.CharField(max_length=100, help_text='Display name (e.g., "Food Kitchen", "Drink Bar")')
     code = models.CharField(max_length=20, help_text='Short code (e.g., "FOOD", "DRINK", "GRILL")')
+    station_type = models.CharField(
+        max_length=20,
+        blank=True,
+        help_text='Station type code it serves (e.g., "GRILL" for GRILL-1 and GRILL-2); empty means its own code. '
+                  'Active stations of one type share its items by queue load'
+    )
     description = models.TextField(blank=True)
     
+    # Back-pressure (minutes of queued work); empty = no limit
+    busy_threshold = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        help_text='Queue minutes after which its products are sold with a longer quoted wait'
+    )
+    pause_threshold = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        help_text='Queue minutes after which its products stop selling until the queue drains'
+    )
+    
     is_active = models.BooleanField(default=True)
     sort_order = models.IntegerField(default=0, help_text='Display order (lower number = first)')
     
@@ -367,3 +385,8 @@ class KitchenStation(models.Model):
     
     def __str__(self):
         return f"{self.outlet.name} - {self.name}"
+    
+    @property
+    def type_code(self):
+        """Station type this station takes items for"""
+        return self.station_type or self.code
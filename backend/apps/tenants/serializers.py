@@ -224,8 +224,8 @@ class KitchenStationSerializer(serializers.ModelSerializer):
     class Meta:
         model = KitchenStation
         fields = [
-            'id', 'outlet', 'outlet_name', 'name', 'code', 
-            'description', 'is_active', 'sort_order',
+            'id', 'outlet', 'outlet_name', 'name', 'code', 'station_type',
+            'description', 'busy_threshold', 'pause_threshold', 'is_active', 'sort_order',
             'created_at', 'updated_at'
         ]
         read_only_fields = ['id', 'created_at', 'updated_at']
@@ -0,0 +1,58 @@
+"""
+Daphne with permessage-deflate for WebSocket messages
+
+    python -m config.server -b 0.0.0.0 -p 8000 config.asgi:application
+
+Takes the same options as the daphne command. For clients that offer
+permessage-deflate (all current browsers), messages of
+WEBSOCKET_DEFLATE_MIN_SIZE bytes or more are compressed: kitchen tickets
+and snapshots. Smaller ones are sent as they are, because compressing
+them costs more CPU than it saves. Compression runs without context
+takeover, so idle sockets hold no zlib state.
+"""
+from autobahn.websocket.compress import PerMessageDeflateOffer, PerMessageDeflateOfferAccept
+from daphne.cli import CommandLineInterface
+from daphne.server import Server
+from daphne.ws_protocol import WebSocketProtocol
+from django.conf import settings
+
+
+class DeflateWebSocketProtocol(WebSocketProtocol):
+    """Compress only messages worth compressing"""
+
+    def sendMessage(self, payload, isBinary=False, fragmentSize=None, sync=False, doNotCompress=False):
+        doNotCompress = doNotCompress or len(payload) < settings.WEBSOCKET_DEFLATE_MIN_SIZE
+        super().sendMessage(payload, isBinary, fragmentSize, sync, doNotCompress)
+
+
+def accept_deflate(offers):
+    """Accept the client's first permessage-deflate offer"""
+    for offer in offers:
+        if isinstance(offer, PerMessageDeflateOffer):
+            return PerMessageDeflateOfferAccept(offer, no_context_takeover=True)
+    return None
+
+
+class DeflateServer(Server):
+    """Daphne server whose WebSocket factory negotiates permessage-deflate"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._ready_callable = self.ready_callable
+        # Called by run() once the WebSocket factory exists
+        self.ready_callable = self._enable_deflate
+
+    def _enable_deflate(self):
+        self.ws_factory.protocol = DeflateWebSocketProtocol
+        self.ws_factory.setProtocolOptions(perMessageCompressionAccept=accept_deflate)
+        if self._ready_callable:
+            self._ready_callable()
+
+
+class DeflateCommandLineInterface(CommandLineInterface):
+    description = 'Django HTTP/WebSocket server (permessage-deflate enabled)'
+    server_class = DeflateServer
+
+
+if __name__ == '__main__':
+    DeflateCommandLineInterface.entrypoint()
@@ -223,6 +223,14 @@ CORS_ALLOW_HEADERS = [
     'x-requested-with',
     'x-tenant-id',  # Custom header for tenant context
     'x-outlet-id',  # Custom header for outlet context
+    'x-device-id',  # Kiosk device identifier
+    'x-source',  # Order source (kiosk/web/cashier)
+    'idempotency-key',  # Safe retries for checkout / order-group creation
+]
+
+# Let browser clients see that a response was replayed
+CORS_EXPOSE_HEADERS = [
+    'idempotent-replayed',
 ]
 
 # Celery Configuration
@@ -233,6 +241,75 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
 CELERY_BEAT_SCHEDULER = 'django_celery_beat.schedulers:DatabaseScheduler'
+CELERY_BEAT_SCHEDULE = {
+    # Safety net for outbox events whose post-commit dispatch was missed or retried
+    'dispatch-order-outbox': {
+        'task': 'apps.orders.tasks.dispatch_order_outbox',
+        'schedule': 5.0,
+    },
+    'purge-order-outbox': {
+        'task': 'apps.orders.tasks.purge_order_outbox',
+        'schedule': 60.0 * 60,
+    },
+    'sweep-print-jobs': {
+        'task': 'apps.orders.tasks.sweep_print_jobs',
+        'schedule': 60.0,
+    },
+    'expire-device-presence': {
+        'task': 'apps.realtime.tasks.expire_device_presence',
+        'schedule': 60.0,
+    },
+}
+
+# Order event outbox (delivery to Local Sync Server and Channels)
+SYNC_SERVER_URL = env('SYNC_SERVER_URL', default='http://host.docker.internal:3001')  # From Docker to host machine
+OUTBOX_SYNC_TIMEOUT = env.float('OUTBOX_SYNC_TIMEOUT', default=2.0)  # Seconds per HTTP call
+OUTBOX_BATCH_SIZE = env.int('OUTBOX_BATCH_SIZE', default=100)
+OUTBOX_MAX_ATTEMPTS = env.int('OUTBOX_MAX_ATTEMPTS', default=10)  # Then dead-lettered
+OUTBOX_BACKOFF_BASE = env.int('OUTBOX_BACKOFF_BASE', default=2)  # Seconds, doubled per attempt
+OUTBOX_BACKOFF_MAX = env.int('OUTBOX_BACKOFF_MAX', default=300)
+# Claimed batches are hidden from other workers this long; covers a full batch of slow sync calls
+OUTBOX_LEASE = env.int('OUTBOX_LEASE', default=int(OUTBOX_BATCH_SIZE * OUTBOX_SYNC_TIMEOUT) + 60)
+OUTBOX_RETENTION = env.int('OUTBOX_RETENTION', default=60 * 60 * 24)  # Keep delivered events (seconds)
+
+# Realtime history (resumable WebSocket topics)
+REALTIME_HISTORY_LENGTH = env.int('REALTIME_HISTORY_LENGTH', default=500)  # Events kept per topic (approximate)
+REALTIME_HISTORY_TTL = env.int('REALTIME_HISTORY_TTL', default=60 * 60 * 24)  # Seconds a quiet topic keeps its history
+REALTIME_REPLAY_MAX = env.int('REALTIME_REPLAY_MAX', default=200)  # Larger gaps get a snapshot instead of a replay
+REALTIME_SNAPSHOT_TTL = env.int('REALTIME_SNAPSHOT_TTL', default=5)  # Seconds a topic snapshot is shared between sockets
+WEBSOCKET_DEFLATE_MIN_SIZE = env.int('WEBSOCKET_DEFLATE_MIN_SIZE', default=1024)  # Bytes; smaller messages skip permessage-deflate (config/server.py)
+
+# Device presence (kiosks and kitchen screens, see apps/realtime/presence.py)
+PRESENCE_STALE_SECONDS = env.int('PRESENCE_STALE_SECONDS', default=90)  # No ping for this long: stale (clients ping every 30s)
+PRESENCE_EXPIRE_SECONDS = env.int('PRESENCE_EXPIRE_SECONDS', default=600)  # Then dropped, and its socket leaves its groups
+PRESENCE_HEARTBEAT_INTERVAL = env.int('PRESENCE_HEARTBEAT_INTERVAL', default=10)  # Seconds; pings closer together are not recorded
+PRESENCE_FLAP_WINDOW = env.int('PRESENCE_FLAP_WINDOW', default=600)  # Seconds connects are counted over
+PRESENCE_FLAP_CONNECTS = env.int('PRESENCE_FLAP_CONNECTS', default=5)  # Connects within the window that flag a device as flapping
+
+# Kitchen display (changes feed, live board, stats)
+KITCHEN_CHANGES_SETTLE_SECONDS = env.float('KITCHEN_CHANGES_SETTLE_SECONDS', default=2.0)  # Let in-flight transactions commit
+KITCHEN_CHANGES_PAGE_SIZE = env.int('KITCHEN_CHANGES_PAGE_SIZE', default=200)
+KITCHEN_BOARD_REBUILD_INTERVAL = env.int('KITCHEN_BOARD_REBUILD_INTERVAL', default=300)  # Seconds between full board rebuilds from Postgres
+KITCHEN_STATS_CACHE_TTL = env.int('KITCHEN_STATS_CACHE_TTL', default=5)  # Seconds stats are shared between screens
+KITCHEN_ROUTING_CACHE_TTL = env.int('KITCHEN_ROUTING_CACHE_TTL', default=60)  # Seconds station pools are cached per outlet
+KITCHEN_ETA_RECOMPUTE_DELAY = env.float('KITCHEN_ETA_RECOMPUTE_DELAY', default=1.0)  # Seconds commits are gathered before an outlet's wait times are recomputed
+
+# Kitchen ticket printing (ESC/POS print agents)
+PRINT_TICKET_WIDTH = env.int('PRINT_TICKET_WIDTH', default=42)  # Characters per line (42 = 80mm paper, 32 = 58mm)
+PRINT_LEASE_SECONDS = env.int('PRINT_LEASE_SECONDS', default=60)  # Agent must ack within this time or the job is handed out again
+PRINT_MAX_ATTEMPTS = env.int('PRINT_MAX_ATTEMPTS', default=20)
+PRINT_RETRY_BASE = env.float('PRINT_RETRY_BASE', default=2.0)  # Seconds; doubles per failed attempt
+PRINT_RETRY_MAX = env.float('PRINT_RETRY_MAX', default=60.0)
+PRINT_SWEEP_WINDOW_MINUTES = env.int('PRINT_SWEEP_WINDOW_MINUTES', default=120)  # How far back the sweep looks for paid orders without tickets
+
+# Public order tracking and pickup boards
+PUBLIC_TRACK_MAX_AGE = env.int('PUBLIC_TRACK_MAX_AGE', default=2)  # Seconds responses may be shared by caches
+PICKUP_BOARD_REBUILD_INTERVAL = env.int('PICKUP_BOARD_REBUILD_INTERVAL', default=300)  # Seconds between full board rebuilds from Postgres
+PICKUP_READY_MAX_AGE_MINUTES = env.int('PICKUP_READY_MAX_AGE_MINUTES', default=30)  # Ready orders leave the board after this
+
+# Idempotency keys (kiosk checkout retries)
+IDEMPOTENCY_KEY_TTL = env.int('IDEMPOTENCY_KEY_TTL', default=60 * 60 * 24)  # Stored responses (seconds)
+IDEMPOTENCY_LOCK_TTL = env.int('IDEMPOTENCY_LOCK_TTL', default=30)  # In-flight lock (seconds, extended while the request runs)
 
 # Payment Gateway Settings
 MIDTRANS_SERVER_KEY = env('MIDTRANS_SERVER_KEY', default='')
@@ -35,6 +35,7 @@ urlpatterns = [
     path('api/', include('apps.orders.urls')),  # Order & Checkout
     path('api/', include('apps.promotions.urls')),  # Promotion management
     path('api/', include('apps.customers.urls')),  # Customer management
+    path('api/', include('apps.realtime.urls')),  # Device presence
     # path('api/payments/', include('apps.payments.urls')),
     # path('api/kitchen/', include('apps.kitchen.urls')),
     